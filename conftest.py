@@ -0,0 +1,338 @@
+import inspect
+import traceback
+
+import pytest
+
+import dentistry_instrumentation
+import dentistry_nodes
+import dentistry_scheduler
+import dentistry_selenium
+import dentistry_server
+import dentistry_snapshots
+import dentistry_state
+import dentistry_trace
+
+# region Константы
+INSTRUMENTATION_REPORT_PATH = 'instrumentation_report.json'
+"""Путь к отчету измерений по умолчанию."""
+# endregion
+
+
+def pytest_addoption(parser):
+    """
+    Регистрация параметров командной строки.
+    :param parser: Парсер параметров pytest.
+    """
+    parser.addoption('--instrumentation-report', default=INSTRUMENTATION_REPORT_PATH,
+                     help='путь к JSON отчету измерений помощников и команд веб-драйвера')
+    parser.addoption('--instrumentation', action='store_true',
+                     help='измерять вызовы помощников и команды веб-драйвера и записывать отчет измерений')
+    parser.addoption('--snapshots-record', default=None, metavar='DIR',
+                     help='записывать результаты помощников и страницы в хранилище снимков')
+    parser.addoption('--snapshots-replay', default=None, metavar='DIR',
+                     help='воспроизводить результаты помощников из хранилища снимков без браузера и веб-сервиса')
+    parser.addoption('--base-url', default=None, help='адрес веб-сервиса dentistry-flask')
+    parser.addoption('--standin', action='store_true',
+                     help='запускать тесты против заменителя dentistry-flask, запущенного в процессе pytest')
+    parser.addoption('--state-db', default=None, metavar='PATH',
+                     help='база данных SQLite dentistry-flask, восстанавливаемая из снимка после каждого теста')
+    parser.addoption('--driver-nodes', default=dentistry_nodes.DRIVER_NODES, metavar='URL[=N],...',
+                     help='адреса удаленных серверов WebDriver (узлов Selenium Grid или chromedriver) через запятую, '
+                          'после = - количество сессий узла')
+    parser.addoption('--trace-dir', default=dentistry_trace.TRACE_DIR,
+                     help='каталог архивов трассировки команд веб-драйвера упавших тестов')
+    parser.addoption('--no-trace', action='store_true', help='отключить трассировку команд веб-драйвера')
+    parser.addoption('--no-schedule', action='store_true',
+                     help='выполнять тесты в порядке файла, не сохраняя сессии между тестами одной роли')
+    parser.addoption('--raw-pages', action='store_true',
+                     help='хранить проверяемые страницы целиком вместо извлечения нужных строк (для отладки)')
+
+
+def pytest_configure(config):
+    """
+    Регистрация маркеров тестов и включение измерений.
+    :param config: Конфигурация pytest.
+    """
+    # Маркер регистрирует pytest-xdist, но тесты должны запускаться и без него.
+    config.addinivalue_line('markers', 'xdist_group(name): тесты группы выполняются в одном процессе pytest-xdist')
+    config.addinivalue_line('markers', 'allow_resources(*patterns): ресурсы из LEAN_BLOCKED_URLS, которые '
+                                       'загружаются во время теста')
+    config.addinivalue_line('markers', 'requires(role, page, mutates=False): роль пользователя, ключ начальной '
+                                       'страницы в LINKS и изменяет ли тест состояние веб-сервиса')
+    config.schedule_report = None
+    config.node_stats = []
+
+    config.instrumentation_tests = []
+    if config.getoption('--instrumentation'):
+        dentistry_instrumentation.enable()
+    if not config.getoption('--no-trace'):
+        dentistry_trace.enable()
+
+    if config.getoption('--state-db') and (config.getoption('numprocesses', None) or 0) > 1:
+        raise pytest.UsageError('--state-db нельзя использовать с несколькими процессами pytest-xdist: '
+                                'они используют одну базу данных')
+
+    if config.getoption('--base-url'):
+        dentistry_selenium.set_base_url(config.getoption('--base-url'))
+    if config.getoption('--raw-pages'):
+        dentistry_selenium.set_capture_mode('raw')
+
+    config.snapshot_session = None
+    replay_root = config.getoption('--snapshots-replay')
+    record_root = config.getoption('--snapshots-record')
+    if replay_root or record_root:
+        store = dentistry_snapshots.SnapshotStore(replay_root or record_root)
+        config.snapshot_session = dentistry_snapshots.install(
+            dentistry_snapshots.SnapshotSession(store, replay=bool(replay_root)))
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Упорядочивание тестов по требованиям маркера requires: тесты одной роли и страницы выполняются подряд.
+    :param config: Конфигурация pytest.
+    :param items: Тесты.
+    """
+    if config.getoption('--no-schedule'):
+        return
+    scheduled = dentistry_scheduler.schedule(items)
+    config.schedule_report = dentistry_scheduler.ScheduleReport(items, scheduled)
+    items[:] = scheduled
+
+
+def pytest_runtest_setup(item):
+    """
+    Очистка трассировки команд перед тестом.
+    :param item: Тест.
+    """
+    dentistry_trace.TRACE.start_test()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """
+    Сохранение трассировки команд, снимка экрана и DOM упавшего теста до возврата веб-драйвера в пул. Если тест не
+    выполнил ни одной команды веб-драйвера, архив не сохраняется.
+    :param item: Тест.
+    :param call: Этап теста.
+    """
+    outcome = yield
+    report = outcome.get_result()
+    for error in getattr(item, 'lost_driver_errors', ()) if report.when == 'call' else ():
+        report.sections.append(('потеря веб-драйвера, тест повторен',
+                                ''.join(traceback.format_exception(type(error), error, error.__traceback__))))
+    if not report.failed or report.when == 'teardown' or item.config.getoption('--no-trace'):
+        return
+    # Тест без трассируемого веб-драйвера (например, при воспроизведении снимков) не выполнил ни одной команды.
+    if dentistry_trace.TRACE.driver is None and not dentistry_trace.TRACE.entries:
+        return
+
+    path = dentistry_trace.artifact_path(item.config.getoption('--trace-dir'), item.nodeid, worker_id(item.config))
+    dentistry_trace.TRACE.dump(path, item.nodeid, report.longreprtext)
+    report.sections.append(('трассировка команд веб-драйвера', path))
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """
+    Вызов теста с повтором на новом веб-драйвере (с NodePool - на другом узле), если браузер или узел WebDriver
+    упал во время теста. Состояние веб-сервиса перед повтором восстанавливается, а ошибка, из-за которой тест был
+    повторен, прикрепляется к отчету теста.
+    :param pyfuncitem: Тест.
+    :return: True, если тест вызван, или None для тестов без выданного пулом веб-драйвера.
+    """
+    lease = getattr(pyfuncitem, 'driver_lease', None)
+    if lease is None:
+        return None
+
+    parameters = inspect.signature(pyfuncitem.obj).parameters
+    pyfuncitem.lost_driver_errors = []
+    while True:
+        try:
+            pyfuncitem.obj(**{name: pyfuncitem.funcargs[name] for name in parameters})
+            return True
+        except Exception as error:
+            if lease.moves >= dentistry_nodes.NODE_RETRIES or not dentistry_nodes.is_driver_lost(error):
+                raise
+            pyfuncitem.lost_driver_errors.append(error)
+
+        manager = pyfuncitem.funcargs.get('state')
+        if manager is not None:
+            manager.restore()
+        session = pyfuncitem.config.snapshot_session
+        if session is not None:
+            session.start_test(session.test, manager is not None)
+        names = [name for name, value in pyfuncitem.funcargs.items() if value is lease.driver]
+        driver = lease.move()
+        for name in names:
+            pyfuncitem.funcargs[name] = driver
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """
+    Сбор показателей узлов WebDriver процессов pytest-xdist.
+    :param node: Процесс pytest-xdist.
+    :param error: Ошибка процесса.
+    """
+    node.config.node_stats.extend(getattr(node, 'workeroutput', {}).get('node_stats', []))
+
+
+def worker_id(config):
+    """
+    Возвращает идентификатор процесса pytest-xdist.
+    :param config: Конфигурация pytest.
+    :return: Идентификатор процесса или пустая строка без pytest-xdist.
+    """
+    worker_input = getattr(config, 'workerinput', None)
+    return worker_input['workerid'] if worker_input is not None else ''
+
+
+def snapshot_key(item):
+    """
+    :param item: Тест.
+    :return: Ключ теста в хранилище снимков. Не зависит от корневого каталога pytest, который меняется в
+    зависимости от аргументов запуска.
+    """
+    return '{}::{}'.format(item.path.name, item.name)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def standin_server(request):
+    """
+    Заменитель dentistry-flask на свободном порту, если указан --standin. Каждый процесс pytest-xdist запускает свой
+    экземпляр, поэтому тесты не делят состояние веб-сервиса.
+    :param request: Запрос фикстуры.
+    :return: Заменитель веб-сервиса или None.
+    """
+    if not request.config.getoption('--standin'):
+        yield None
+        return
+
+    server = dentistry_server.DentistryStandIn().start()
+    dentistry_selenium.set_base_url(server.base_url)
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope='session')
+def state_manager(request, standin_server):
+    """
+    Снимок состояния веб-сервиса, сделанный один раз в начале сессии: состояние заменителя при --standin или база
+    данных dentistry-flask при --state-db.
+    :param request: Запрос фикстуры.
+    :param standin_server: Заменитель веб-сервиса или None.
+    :return: Менеджер состояния или None, если состояние не восстанавливается.
+    """
+    if standin_server is not None:
+        backend = dentistry_state.StandInState(standin_server)
+    elif request.config.getoption('--state-db'):
+        backend = dentistry_state.SqliteState(request.config.getoption('--state-db'))
+    else:
+        yield None
+        return
+
+    manager = dentistry_state.StateManager(backend).snapshot()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture(autouse=True)
+def state(request):
+    """
+    Восстановление состояния веб-сервиса после теста, изменяющего состояние. Тесты, получающие фикстуру, могут не
+    удалять созданные ими данные, если она не None. При воспроизведении снимков значение фикстуры такое же, как при
+    записи: dentistry_state.REPLAYED_STATE, если состояние восстанавливалось, иначе None.
+    :param request: Запрос фикстуры.
+    :return: Менеджер состояния или None.
+    """
+    session = request.config.snapshot_session
+    if session is not None and session.replay:
+        yield session.replayed_state(snapshot_key(request.node))
+        return
+
+    manager = request.getfixturevalue('state_manager')
+    yield manager
+    # Тест, объявивший в маркере requires, что он не изменяет состояние, не требует восстановления.
+    if manager is not None and dentistry_scheduler.requirements(request.node).mutates:
+        manager.restore()
+
+
+@pytest.fixture(autouse=True)
+def snapshots(request):
+    """
+    Запись или воспроизведение шагов теста в хранилище снимков.
+    :param request: Запрос фикстуры.
+    :return: Сессия записи или воспроизведения.
+    """
+    session = request.config.snapshot_session
+    if session is None:
+        yield None
+        return
+
+    session.start_test(snapshot_key(request.node), request.getfixturevalue('state') is not None)
+    yield session
+    session.finish_test()
+
+
+@pytest.fixture(autouse=True)
+def instrumentation(request):
+    """
+    Измерения теста: время и команды веб-драйвера каждого вызова помощника прикрепляются к тесту.
+    :param request: Запрос фикстуры.
+    :return: Сборщик измерений.
+    """
+    if not request.config.getoption('--instrumentation'):
+        yield None
+        return
+
+    dentistry_instrumentation.RECORDER.start_test(request.node.nodeid)
+    yield dentistry_instrumentation.RECORDER
+    result = dentistry_instrumentation.RECORDER.finish_test()
+    request.node.user_properties.append(('instrumentation', result))
+    request.config.instrumentation_tests.append(result)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """
+    Вывод показателей узлов WebDriver и оценки сэкономленных входов и переходов. С pytest-xdist тесты собираются в
+    рабочих процессах, и оценка не выводится, как и при запуске только тестов без входа и начальной страницы.
+    :param terminalreporter: Вывод итогов pytest.
+    :param config: Конфигурация pytest.
+    """
+    if getattr(config, 'node_stats', None):
+        terminalreporter.write_sep('-', 'узлы WebDriver')
+        for line in dentistry_nodes.stats_lines(dentistry_nodes.merge_stats(config.node_stats)):
+            terminalreporter.write_line(line)
+
+    if getattr(config, 'schedule_report', None) is None or not config.schedule_report.relevant:
+        return
+    terminalreporter.write_sep('-', 'планировщик тестов')
+    for line in config.schedule_report.lines():
+        terminalreporter.write_line(line)
+
+
+def pytest_sessionfinish(session):
+    """
+    Запись манифеста снимков и отчета измерений в конце сессии. Процессы pytest-xdist пишут их в отдельные файлы,
+    а показатели узлов WebDriver передают основному процессу.
+    :param session: Сессия pytest.
+    """
+    config = session.config
+    worker = worker_id(config)
+
+    if getattr(config, 'snapshot_session', None) is not None:
+        config.snapshot_session.save(worker)
+
+    worker_output = getattr(config, 'workeroutput', None)
+    if worker_output is not None and getattr(config, 'node_stats', None):
+        worker_output['node_stats'] = config.node_stats
+
+    if not config.getoption('--instrumentation') or not getattr(config, 'instrumentation_tests', None):
+        return
+
+    path = config.getoption('--instrumentation-report')
+    if worker:
+        stem, dot, extension = path.rpartition('.')
+        path = '{}.{}.{}'.format(stem, worker, extension) if dot else path + worker
+
+    dentistry_instrumentation.write_report(path, config.instrumentation_tests)
@@ -0,0 +1,730 @@
+import argparse
+import asyncio
+from datetime import timedelta
+import json
+import time
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import InvalidSessionIdException, JavascriptException, NoSuchElementException, \
+    StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.driver_finder import DriverFinder
+
+from dentistry_data import APPOINTMENT_DATE_FORMAT, APPOINTMENT_DAYS_AHEAD
+from dentistry_drivers import CHROME_WEB_DRIVER_PATH, DRIVER_HEADLESS, DRIVER_PROFILE, blocked_urls, chrome_options
+import dentistry_selenium
+from dentistry_server import CANCEL_APPOINTMENT_TEXT, DentistryStandIn
+from dentistry_selenium import FILL_FORM_SCRIPT, FORM_FIELDS, LINKS, SESSION_CACHE, SESSION_CHECK_TEXT, SUBMIT_ID, \
+    TABLE_ROWS_SCRIPT, TABLE_ROWS_SELECTOR, MaterialRecord, OrderRecord, amount_matches, capture_page, current_time, \
+    is_session_expired, session_key
+from dentistry_wait import POLL_FREQUENCY, WAIT_LOG, WAIT_TIMEOUT, WaitRecord
+
+# region Константы
+COMMAND_TIMEOUT = 30
+"""Время ожидания ответа на одну команду WebDriver в секундах."""
+
+SESSION_TIMEOUT = 120
+"""Время выполнения сценария одной сессии браузера в секундах."""
+
+MAX_CONCURRENCY = 20
+"""Количество одновременно открытых сессий браузера."""
+
+POOL_SIZE = 32
+"""Количество соединений с chromedriver в пуле."""
+
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+"""Ключ ссылки на элемент в протоколе W3C WebDriver."""
+
+ERRORS = {'no such element': NoSuchElementException, 'stale element reference': StaleElementReferenceException,
+          'timeout': TimeoutException, 'script timeout': TimeoutException,
+          'invalid session id': InvalidSessionIdException, 'javascript error': JavascriptException}
+"""Исключения Selenium для кодов ошибок W3C WebDriver."""
+
+SUBMIT_ROW_FORM_SCRIPT = """
+var root = document.documentElement, form = arguments[0].querySelector(':scope > td:last-child form');
+if (!form) {
+    return null;
+}
+HTMLFormElement.prototype.submit.call(form);
+return root;
+"""
+"""Скрипт отправки формы последней ячейки строки таблицы. Метод прототипа вызывается, потому что поле формы с
+name="submit" заменяет метод form.submit. Если в строке нет формы, возвращает null."""
+
+SELECT_OPTION_CONTAINING_SCRIPT = """
+var select = document.getElementById(arguments[0]), parts = arguments[1];
+var option = select && Array.prototype.find.call(select.options, function (option) {
+    return parts.every(function (part) { return option.text.indexOf(part) !== -1; });
+});
+if (option) {
+    option.selected = true;
+    select.dispatchEvent(new Event('change', {bubbles: true}));
+}
+return !!option;
+"""
+"""Скрипт выбора первого варианта, текст которого содержит все указанные подстроки."""
+
+BOOKING_SERVICE = 'Осмотр'
+"""Услуга для записи на прием в сценарии по умолчанию."""
+
+BOOKING_DOCTOR = 'Николаевна Анна Михайловна'
+"""Врач для записи на прием в сценарии по умолчанию."""
+
+BOOKING_TIME = '8:00'
+"""Время записи на прием в сценарии по умолчанию."""
+# endregion
+
+
+class ConnectionPool:
+    """
+    Пул HTTP/1.1 соединений keep-alive с сервером WebDriver на asyncio. Количество одновременных запросов
+    ограничено размером пула.
+    """
+
+    def __init__(self, url, size=POOL_SIZE):
+        """
+        :param url: Адрес сервера WebDriver, например, service_url chromedriver.
+        :param size: Количество соединений.
+        """
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.idle = []
+        self.semaphore = asyncio.Semaphore(size)
+
+    async def request(self, method, path, payload=None):
+        """
+        Отправляет запрос. Соединение, закрытое сервером, пока оно ожидало в пуле, заменяется новым.
+        :param method: HTTP метод.
+        :param path: Путь команды.
+        :param payload: Тело запроса, сериализуемое в JSON.
+        :return: Код ответа и разобранное тело ответа.
+        """
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        async with self.semaphore:
+            while True:
+                reused = bool(self.idle)
+                reader, writer = self.idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+                try:
+                    status, data, keep_alive = await self.exchange(reader, writer, method, self.prefix + path, body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                break
+
+            if keep_alive:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+
+        return status, json.loads(data) if data else {}
+
+    async def exchange(self, reader, writer, method, path, body):
+        """
+        Отправляет запрос и читает ответ по одному соединению.
+        :return: Код ответа, тело ответа и можно ли переиспользовать соединение.
+        """
+        writer.write('{} {} HTTP/1.1\r\nHost: {}:{}\r\nContent-Type: application/json;charset=UTF-8\r\n'
+                     'Content-Length: {}\r\nConnection: keep-alive\r\n\r\n'.format(
+                         method, path, self.host, self.port, len(body)).encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Сервер WebDriver закрыл соединение')
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                chunks.append(await reader.readexactly(size + 2))
+                if not size:
+                    break
+            data = b''.join(chunk[:-2] for chunk in chunks)
+        else:
+            data, keep_alive = await reader.read(), False
+
+        return status, data, keep_alive
+
+    def close(self):
+        """
+        Закрывает простаивающие соединения.
+        """
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class AsyncWebDriver:
+    """
+    Сессия браузера, управляемая командами W3C WebDriver через общий пул соединений. Как и для синхронного
+    веб-драйвера, текущая ссылка запоминается на стороне клиента.
+    """
+
+    def __init__(self, pool, session_id, timeout=COMMAND_TIMEOUT):
+        """
+        :param pool: Пул соединений с сервером WebDriver.
+        :param session_id: Идентификатор сессии.
+        :param timeout: Время ожидания ответа на команду в секундах.
+        """
+        self.pool = pool
+        self.session_id = session_id
+        self.timeout = timeout
+        self.url = None
+
+    @classmethod
+    async def create(cls, pool, capabilities, timeout=COMMAND_TIMEOUT):
+        """
+        Открывает новую сессию браузера.
+        :param pool: Пул соединений с сервером WebDriver.
+        :param capabilities: Возможности браузера.
+        :param timeout: Время ожидания ответа на команду в секундах.
+        :return: Сессия браузера.
+        """
+        status, response = await asyncio.wait_for(
+            pool.request('POST', '/session', {'capabilities': {'alwaysMatch': capabilities}}), timeout)
+        value = check_response(status, response)
+        return cls(pool, value['sessionId'], timeout)
+
+    async def execute(self, method, command, payload=None):
+        """
+        Выполняет команду сессии.
+        :param method: HTTP метод.
+        :param command: Путь команды относительно сессии.
+        :param payload: Параметры команды.
+        :return: Значение ответа.
+        """
+        path = '/session/{}{}'.format(self.session_id, command)
+        try:
+            status, response = await asyncio.wait_for(self.pool.request(method, path, payload), self.timeout)
+        except asyncio.TimeoutError as error:
+            raise TimeoutException('Команда {} {} не выполнилась за {} с'.format(method, command,
+                                                                                self.timeout)) from error
+        return check_response(status, response)
+
+    async def get(self, url):
+        await self.execute('POST', '/url', {'url': url})
+        self.url = url
+
+    async def current_url(self):
+        return await self.execute('GET', '/url')
+
+    async def page_source(self):
+        return await self.execute('GET', '/source')
+
+    async def execute_script(self, script, *args):
+        return await self.execute('POST', '/execute/sync', {'script': script, 'args': list(args)})
+
+    async def find_elements(self, selector):
+        return await self.execute('POST', '/elements', {'using': 'css selector', 'value': selector})
+
+    async def is_stale(self, element):
+        """
+        :param element: Ссылка на элемент.
+        :return: Удален ли элемент из DOM.
+        """
+        try:
+            await self.execute('GET', '/element/{}/enabled'.format(element[ELEMENT_KEY]))
+        except StaleElementReferenceException:
+            return True
+        return False
+
+    async def execute_cdp(self, cmd, params):
+        return await self.execute('POST', '/goog/cdp/execute', {'cmd': cmd, 'params': params})
+
+    async def get_cookies(self):
+        return await self.execute('GET', '/cookie')
+
+    async def add_cookie(self, cookie):
+        await self.execute('POST', '/cookie', {'cookie': cookie})
+
+    async def delete_all_cookies(self):
+        await self.execute('DELETE', '/cookie')
+
+    async def quit(self):
+        """
+        Закрывает сессию браузера, не вызывая исключение, если она уже закрыта.
+        """
+        try:
+            await self.execute('DELETE', '')
+        except (WebDriverException, OSError):
+            pass
+
+
+def check_response(status, response):
+    """
+    Проверяет ответ WebDriver и вызывает соответствующее исключение Selenium при ошибке.
+    :param status: Код ответа.
+    :param response: Разобранное тело ответа.
+    :return: Значение ответа.
+    """
+    value = response.get('value')
+    if status >= 400 or isinstance(value, dict) and 'error' in value:
+        value = value if isinstance(value, dict) else {}
+        raise ERRORS.get(value.get('error'), WebDriverException)(value.get('message') or 'HTTP {}'.format(status))
+    return value
+
+
+# region Ожидания
+async def wait_for(driver, check, name, timeout=WAIT_TIMEOUT, poll=POLL_FREQUENCY, raise_on_timeout=True):
+    """
+    Ожидает выполнения асинхронного условия, не блокируя цикл событий. Время ожидания записывается в журнал
+    dentistry_wait.WAIT_LOG.
+    :param driver: Сессия браузера.
+    :param check: Асинхронная функция проверки условия от сессии браузера.
+    :param name: Название условия для журнала ожиданий.
+    :param timeout: Время ожидания в секундах.
+    :param poll: Интервал проверки в секундах.
+    :param raise_on_timeout: Вызывать ли TimeoutException, если условие не выполнилось.
+    :return: Результат условия или False, если условие не выполнилось.
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+
+    while True:
+        try:
+            result = await check(driver)
+        except (NoSuchElementException, StaleElementReferenceException):
+            result = False
+
+        if result or time.perf_counter() >= deadline:
+            break
+        await asyncio.sleep(poll)
+
+    WAIT_LOG.append(WaitRecord(name, time.perf_counter() - start, bool(result)))
+
+    if not result and raise_on_timeout:
+        raise TimeoutException('Условие {} не выполнилось за {} с'.format(name, timeout))
+    return result
+
+
+async def wait_page_changed(driver, element, timeout=WAIT_TIMEOUT):
+    """
+    Ожидает ухода со страницы, на которой находился элемент. Не вызывает исключение, если страница не сменилась.
+    :param driver: Сессия браузера.
+    :param element: Ссылка на элемент прежней страницы.
+    :param timeout: Время ожидания в секундах.
+    :return: Сменилась ли страница.
+    """
+    return await wait_for(driver, lambda session: session.is_stale(element), 'staleness_of', timeout,
+                          raise_on_timeout=False)
+# endregion
+
+
+# region Помощники
+async def check_url(driver, current_url_check):
+    """
+    Проверяет, находится ли сессия на указанной странице, если нет, то переходит по этой ссылке.
+    :param driver: Сессия браузера.
+    :param current_url_check: Ссылка для проверки.
+    :return: Сессия браузера.
+    """
+    if driver.url is None:
+        driver.url = await driver.current_url()
+
+    if driver.url != current_url_check:
+        await driver.get(current_url_check)
+
+    return driver
+
+
+async def fill_form(driver, values, submit_id=None):
+    """
+    Заполняет поля формы и, если указана кнопка, отправляет форму одним вызовом execute_script. Значение поля ввода
+    заменяет его текущее значение.
+    :param driver: Сессия браузера.
+    :param values: Словарь идентификатор поля -> значение (для полей выбора - видимый текст варианта).
+    :param submit_id: Идентификатор кнопки отправки формы или None, если форму отправлять не нужно.
+    :return: Сессия браузера.
+    """
+    values = {field_id: str(value) for field_id, value in values.items()}
+    result = await driver.execute_script(FILL_FORM_SCRIPT, values, submit_id)
+    if result['missing']:
+        raise NoSuchElementException('Не найдены поля формы или варианты выбора: {}'.format(
+            ', '.join(result['missing'])))
+
+    if result['submitted']:
+        driver.url = None
+        await wait_page_changed(driver, result['root'])
+
+    return driver
+
+
+async def login(driver, telno, password):
+    """
+    Ввод данных в форму входа.
+    :param driver: Сессия браузера.
+    :param telno: Номер телефона.
+    :param password: Пароль.
+    :return: Содержимое страницы после нажатия на кнопку "Войти".
+    """
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['LOGIN_LINK'])
+    await fill_form(driver, dict(zip(FORM_FIELDS['LOGIN_LINK'], (telno, password))), SUBMIT_ID)
+    return await driver.page_source()
+
+
+async def cached_login(driver, telno, password):
+    """
+    Вход с переиспользованием cookie сессии из общего с синхронными помощниками кэша.
+    :param driver: Сессия браузера.
+    :param telno: Номер телефона.
+    :param password: Пароль.
+    :return: Содержимое страницы после входа.
+    """
+    key = session_key(telno, password)
+    cookies = SESSION_CACHE.get(key)
+
+    if cookies is not None and not is_session_expired(cookies):
+        await check_url(driver, LINKS['INDEX_LINK'])
+        await driver.delete_all_cookies()
+        for cookie in cookies:
+            await driver.add_cookie(cookie)
+        await driver.get(LINKS['INDEX_LINK'])
+        page_source = await driver.page_source()
+        if SESSION_CHECK_TEXT in page_source:
+            return page_source
+
+    page_source = await login(driver, telno, password)
+    if SESSION_CHECK_TEXT in page_source:
+        SESSION_CACHE[key] = await driver.get_cookies()
+    else:
+        SESSION_CACHE.pop(key, None)
+    return page_source
+
+
+async def registration(driver, surname, name, middle_name, birthday, telno, email, password, password_again):
+    """
+    Ввод данных в форму регистрации.
+    :param driver: Сессия браузера.
+    :param surname: Фамилия.
+    :param name: Имя.
+    :param middle_name: Отчество.
+    :param birthday: Дата рождения.
+    :param telno: Номер телефона.
+    :param email: Электронная почта.
+    :param password: Пароль.
+    :param password_again: Повтор пароля.
+    :return: Содержимое страницы после нажатия на кнопку "Регистрация".
+    """
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['REGISTRATION_LINK'])
+    await fill_form(driver, dict(zip(FORM_FIELDS['REGISTRATION_LINK'],
+                                     (surname, name, middle_name, birthday, telno, email, password, password_again))),
+                    SUBMIT_ID)
+    return await driver.page_source()
+
+
+async def new_appointment_select(driver, field_id, value):
+    """
+    Заполнение поля на странице создания новой записи.
+    :param driver: Сессия браузера.
+    :param field_id: Идентификатор поля.
+    :param value: Значение поля (для полей выбора - видимый текст варианта).
+    :return: Содержимое страницы после выбора.
+    """
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
+    await fill_form(driver, {field_id: value})
+    return await driver.page_source()
+
+
+async def new_appointment_select_service(driver, service_name):
+    """
+    Выбор услуги на странице создания новой записи.
+    :param driver: Сессия браузера.
+    :param service_name: Название услуги.
+    :return: Содержимое страницы после выбора.
+    """
+    return await new_appointment_select(driver, 'select_service', service_name)
+
+
+async def new_appointment_select_doctors(driver, doctor_name):
+    """
+    Выбор лечащего врача на странице создания новой записи.
+    :param driver: Сессия браузера.
+    :param doctor_name: Полное имя врача.
+    :return: Содержимое страницы после выбора.
+    """
+    return await new_appointment_select(driver, 'select_doctors', doctor_name)
+
+
+async def new_appointment_select_date(driver, date):
+    """
+    Выбор даты записи на странице создания новой записи.
+    :param driver: Сессия браузера.
+    :param date: Дата записи.
+    :return: Содержимое страницы после выбора.
+    """
+    return await new_appointment_select(driver, 'appointment_date', date)
+
+
+async def new_appointment_select_time(driver, time_text):
+    """
+    Выбор времени записи на странице создания новой записи.
+    :param driver: Сессия браузера.
+    :param time_text: Время записи.
+    :return: Содержимое страницы после выбора.
+    """
+    return await new_appointment_select(driver, 'select_time', time_text)
+
+
+async def new_appointment_select_patient(driver, patient_name):
+    """
+    Выбор пациента для записи на странице записи на прием.
+    :param driver: Сессия браузера.
+    :param patient_name: Полное имя пациента.
+    :return: Содержимое страницы после выбора.
+    """
+    return await new_appointment_select(driver, 'select_patient', patient_name)
+
+
+async def new_appointment_submit(driver):
+    """
+    Нажатие на кнопку "Создать запись" на странице создания новой записи.
+    :param driver: Сессия браузера.
+    :return: Содержимое страницы после нажатия на кнопку "Создать запись".
+    """
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
+    await fill_form(driver, {}, SUBMIT_ID)
+    return await driver.page_source()
+
+
+async def cancel_appointment(driver, date, full_name):
+    """
+    Отмена записи по ее дате и имени пациента.
+    :param driver: Сессия браузера.
+    :param date: Дата записи.
+    :param full_name: Имя пациента.
+    :return: Содержимое страницы после отмены записи.
+    """
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['EXISTING_APPOINTMENTS_LINK'])
+
+    for row in await driver.execute_script(TABLE_ROWS_SCRIPT, TABLE_ROWS_SELECTOR):
+        cells = row['cells']
+        if len(cells) > 2 and cells[2] == full_name and date.count(cells[1]) != 0:
+            root = await driver.execute_script(SUBMIT_ROW_FORM_SCRIPT, row['element'])
+            if root is not None:
+                driver.url = None
+                await wait_page_changed(driver, root)
+            break
+
+    return await driver.page_source()
+
+
+async def new_bill(driver, patient_name, appointment_date, service_name):
+    """
+    Создание нового счета на оплату.
+    :param driver: Сессия браузера.
+    :param patient_name: Имя пациента.
+    :param appointment_date: Дата записи.
+    :param service_name: Наименование услуги.
+    :return: Содержимое страницы после создания счета.
+    """
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['BILLS_LINK'])
+    await driver.execute_script(SELECT_OPTION_CONTAINING_SCRIPT, 'select_appointments',
+                                [patient_name, appointment_date, service_name])
+    await fill_form(driver, {}, SUBMIT_ID)
+    return await driver.page_source()
+
+
+async def new_medical_history(driver, patient_name, diagnosis):
+    """
+    Создание новой записи медицинской истории.
+    :param driver: Сессия браузера.
+    :param patient_name: Имя пациента.
+    :param diagnosis: Запись истории.
+    :return: Содержимое страницы после создания записи.
+    """
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['MEDICAL_HISTORY_LINK'])
+    await fill_form(driver, dict(zip(FORM_FIELDS['MEDICAL_HISTORY_LINK'], (patient_name, diagnosis))), SUBMIT_ID)
+    return await driver.page_source()
+
+
+async def new_cost_accounting_entry(driver, material_name, amount):
+    """
+    Создание новой записи учета расходных материалов.
+    :param driver: Сессия браузера.
+    :param material_name: Наименование расходного материала.
+    :param amount: Количество.
+    :return: Содержимое страницы создания записи учета до создания записи, содержимое страницы после создания записи,
+    содержимое страницы счетов: в режиме compact - CompactPage только с нужными строками, в режиме raw - текст страниц.
+    """
+    async def capture(record_type, predicate):
+        page_source = await driver.page_source()
+        if dentistry_selenium.CAPTURE_MODE == 'raw':
+            return page_source
+        return capture_page(page_source, record_type, predicate)
+
+    def is_material(record):
+        return material_name in record.name
+
+    await check_url(driver, LINKS['INDEX_LINK'] + LINKS['COST_ACCOUNTING_LINK'])
+    before_test = await capture(MaterialRecord, is_material)
+
+    await fill_form(driver, dict(zip(FORM_FIELDS['COST_ACCOUNTING_LINK'], (material_name, amount))), SUBMIT_ID)
+    after_test = await capture(MaterialRecord, is_material)
+
+    await driver.get(LINKS['INDEX_LINK'] + LINKS['ORDERS_LINK'])
+    orders = await capture(OrderRecord, lambda record: material_name in record.material and
+                           amount_matches(record.amount, amount))
+
+    return {'before_test': before_test, 'after_test': after_test, 'orders': orders}
+# endregion
+
+
+class SessionRunner:
+    """
+    Выполнение сценариев в отдельных сессиях браузера из одного цикла событий: количество одновременно открытых
+    сессий ограничено, каждый сценарий ограничен по времени, сессия закрывается в любом случае.
+    """
+
+    def __init__(self, service_url, capabilities=None, concurrency=MAX_CONCURRENCY, session_timeout=SESSION_TIMEOUT,
+                 command_timeout=COMMAND_TIMEOUT, pool_size=POOL_SIZE, profile=DRIVER_PROFILE):
+        """
+        :param service_url: Адрес сервера WebDriver.
+        :param capabilities: Возможности браузера, по умолчанию - настройки Chrome профиля модуля dentistry_drivers.
+        :param concurrency: Количество одновременно открытых сессий.
+        :param session_timeout: Время выполнения сценария одной сессии в секундах.
+        :param command_timeout: Время ожидания ответа на одну команду в секундах.
+        :param pool_size: Количество соединений с сервером WebDriver.
+        :param profile: Профиль браузера: lean или full.
+        """
+        self.service_url = service_url
+        self.capabilities = capabilities or chrome_options(DRIVER_HEADLESS, profile).to_capabilities()
+        self.profile = profile
+        self.concurrency = concurrency
+        self.session_timeout = session_timeout
+        self.command_timeout = command_timeout
+        self.pool_size = pool_size
+        self.pool = None
+        self.semaphore = None
+
+    async def run(self, scenario, *args):
+        """
+        Выполняет сценарий в новой сессии браузера.
+        :param scenario: Асинхронная функция, первый аргумент которой - сессия браузера.
+        :param args: Остальные аргументы сценария.
+        :return: Результат сценария.
+        """
+        if self.pool is None:
+            self.pool = ConnectionPool(self.service_url, self.pool_size)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.semaphore:
+            driver = await AsyncWebDriver.create(self.pool, self.capabilities, self.command_timeout)
+            try:
+                if self.profile == 'lean':
+                    await driver.execute_cdp('Network.enable', {})
+                    await driver.execute_cdp('Network.setBlockedURLs', {'urls': blocked_urls()})
+                return await asyncio.wait_for(scenario(driver, *args), self.session_timeout)
+            finally:
+                await driver.quit()
+
+    async def run_all(self, calls):
+        """
+        Выполняет сценарии одновременно и закрывает пул соединений. Без сценариев пул не создается.
+        :param calls: Список кортежей (сценарий, аргументы...).
+        :return: Результаты сценариев или исключения в том же порядке.
+        """
+        try:
+            return await asyncio.gather(*(self.run(*call) for call in calls), return_exceptions=True)
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+                self.semaphore = None
+
+
+def start_chromedriver(driver_path=CHROME_WEB_DRIVER_PATH):
+    """
+    Запускает chromedriver, к которому подключаются асинхронные сессии.
+    :param driver_path: Путь к chromedriver, если не задан - chromedriver находит Selenium Manager.
+    :return: Запущенный сервис chromedriver, адрес - service.service_url.
+    """
+    service = Service(driver_path)
+    if not driver_path:
+        service.path = DriverFinder(service, chrome_options()).get_driver_path()
+    service.start()
+    return service
+
+
+async def booking_scenario(driver, index, date):
+    """
+    Сценарий по умолчанию: регистрация нового пациента, вход и запись на прием.
+    :param driver: Сессия браузера.
+    :param index: Номер пациента.
+    :param date: Дата записи.
+    :return: Создана ли запись.
+    """
+    telno = '897{:08d}'.format(index)
+    await registration(driver, 'Асинхронный', 'Пациент', str(index), '01.01.1970', telno,
+                       'async{}@test.com'.format(index), 'qwerty', 'qwerty')
+    await login(driver, telno, 'qwerty')
+    for select, value in ((new_appointment_select_service, BOOKING_SERVICE),
+                          (new_appointment_select_doctors, BOOKING_DOCTOR), (new_appointment_select_date, date),
+                          (new_appointment_select_time, BOOKING_TIME)):
+        await select(driver, value)
+    return CANCEL_APPOINTMENT_TEXT in await new_appointment_submit(driver)
+
+
+def parse_arguments(arguments=None):
+    """
+    Разбирает аргументы командной строки.
+    :param arguments: Аргументы или None для sys.argv.
+    :return: Настройки.
+    """
+    # Дата по умолчанию отсчитывается от текущей, как в тестах: фиксированная дата со временем оказалась бы в прошлом.
+    default_date = (current_time().date() + timedelta(days=APPOINTMENT_DAYS_AHEAD)).strftime(APPOINTMENT_DATE_FORMAT)
+    parser = argparse.ArgumentParser(description='Одновременная запись пациентов из одного процесса.')
+    parser.add_argument('--base-url', default=None,
+                        help='адрес веб-сервиса, по умолчанию запускается заменитель dentistry-flask')
+    parser.add_argument('--sessions', type=int, default=40, help='количество пациентов')
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY, help='количество одновременных сессий')
+    parser.add_argument('--timeout', type=float, default=SESSION_TIMEOUT, help='время сценария одной сессии')
+    parser.add_argument('--date', default=default_date,
+                        help='дата записи, по умолчанию через {} дней от текущей'.format(APPOINTMENT_DAYS_AHEAD))
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    settings = parse_arguments()
+    stand_in = None
+    if settings.base_url:
+        dentistry_selenium.set_base_url(settings.base_url)
+    else:
+        stand_in = DentistryStandIn().start()
+        dentistry_selenium.set_base_url(stand_in.base_url)
+
+    chromedriver = start_chromedriver()
+    runner = SessionRunner(chromedriver.service_url, concurrency=settings.concurrency,
+                           session_timeout=settings.timeout)
+    start_time = time.perf_counter()
+    try:
+        results = asyncio.run(runner.run_all([(booking_scenario, index, settings.date)
+                                              for index in range(settings.sessions)]))
+    finally:
+        chromedriver.stop()
+        if stand_in is not None:
+            stand_in.stop()
+
+    failures = [result for result in results if result is not True]
+    print('Сессий: {}, успешно: {}, ошибок: {}, время: {:.2f} с'.format(
+        len(results), len(results) - len(failures), len(failures), time.perf_counter() - start_time))
+    for failure in failures[:10]:
+        print(repr(failure))
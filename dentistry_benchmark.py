@@ -0,0 +1,526 @@
+import argparse
+from datetime import date, datetime, timedelta
+from html.parser import HTMLParser
+import json
+import statistics
+import sys
+import time
+
+from dentistry_data import DOCTOR_DATA_LOGIN, EXISTING_PATIENT_DATA_LOGIN, MATERIAL_TEST_NAME, SERVICE_INSPECTION
+import dentistry_instrumentation
+from dentistry_drivers import create_chrome_driver, quit_driver, reset_driver
+from dentistry_load import percentile_value
+import dentistry_selenium
+from dentistry_selenium import DATE_TIME_FORMAT, LINKS, PARSED_TABLES, cached_login, cancel_appointment, \
+    count_material, find_medical_history, find_order, login, navigate, new_appointment_select_date, \
+    new_appointment_select_doctors, new_appointment_select_patient, new_appointment_select_service, \
+    new_appointment_select_time, new_appointment_submit, new_bill, new_cost_accounting_entry, new_medical_history, \
+    registration
+from dentistry_server import DentistryStandIn, table_html
+
+# region Константы
+BENCHMARK_REPEAT = 20
+"""Количество запусков каждого помощника."""
+
+TABLE_SIZES = (10, 100, 1000, 10000, 100000)
+"""Количество строк сгенерированных таблиц для помощников разбора страниц."""
+
+PARSER_ROWS_PER_RUN = 100000
+"""Количество разбираемых строк, после которого число запусков на больших таблицах уменьшается."""
+
+MIN_PARSER_REPEAT = 3
+"""Минимальное количество запусков помощника разбора страниц."""
+
+BASELINE_PATH = 'benchmark_baseline.json'
+"""Путь к сохраненным в репозитории базовым результатам."""
+
+REGRESSION_THRESHOLD = 0.5
+"""Допустимое относительное увеличение задержки."""
+
+MIN_REGRESSION_MS = 2.0
+"""Увеличение задержки в миллисекундах, меньше которого регрессия не засчитывается: шум измерений коротких вызовов."""
+
+LATENCY_METRICS = {'median_ms': 'median_ratio', 'p95_ms': 'p95_ratio'}
+"""Показатели задержки, сравниваемые с базовыми результатами, и соответствующие им показатели базовых результатов."""
+
+CALIBRATION_ROWS = 1000
+"""Количество строк таблицы калибровочного цикла."""
+
+CALIBRATION_REPEAT = 20
+"""Количество запусков калибровочного цикла."""
+
+APPOINTMENT_TIME = '8:00'
+"""Время записи на прием."""
+
+DIAGNOSIS_TEXT = 'Тестирование производительности.'
+"""Текст записи медицинской истории."""
+
+BROWSER_PROFILES = ('full', 'lean')
+"""Профили браузера, сравниваемые в отчете о загрузке страниц."""
+
+PROFILE_PAGES = ('INDEX_LINK', 'LOGIN_LINK', 'NEW_APPOINTMENT_LINK', 'EXISTING_APPOINTMENTS_LINK', 'BILLS_LINK',
+                 'MEDICAL_HISTORY_LINK', 'COST_ACCOUNTING_LINK', 'ORDERS_LINK')
+"""Страницы, время перехода на которые сравнивается для профилей браузера."""
+
+RESOURCE_COUNT_SCRIPT = "return performance.getEntriesByType('resource').length;"
+"""Скрипт подсчета загруженных страницей ресурсов."""
+# endregion
+
+
+def appointment_date(index):
+    """
+    :param index: Номер запуска.
+    :return: Дата записи запуска: у каждого запуска свой день, чтобы записи не совпадали.
+    """
+    return (date(2031, 1, 1) + timedelta(days=index)).strftime('%d.%m.%Y')
+
+
+def open_new_appointment(driver, user):
+    """
+    Входит пользователем и открывает страницу новой записи.
+    :param driver: Веб-драйвер.
+    :param user: Данные для входа.
+    """
+    cached_login(driver, user['telno'], user['password'])
+    navigate(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
+
+
+def create_appointment(driver, user, index):
+    """
+    Создает запись на прием к лечащему врачу.
+    :param driver: Веб-драйвер.
+    :param user: Данные для входа пациента или врача.
+    :param index: Номер запуска.
+    """
+    open_new_appointment(driver, user)
+    new_appointment_select_service(driver, SERVICE_INSPECTION)
+    new_appointment_select_doctors(driver, DOCTOR_DATA_LOGIN['full_name'])
+    new_appointment_select_date(driver, appointment_date(index))
+    new_appointment_select_time(driver, APPOINTMENT_TIME)
+    if user is DOCTOR_DATA_LOGIN:
+        new_appointment_select_patient(driver, EXISTING_PATIENT_DATA_LOGIN['full_name'])
+    new_appointment_submit(driver)
+
+
+# region Сценарии помощников
+def login_case(driver, index):
+    """Вход пациента на чистом веб-драйвере."""
+    reset_driver(driver)
+    return lambda: login(driver, EXISTING_PATIENT_DATA_LOGIN['telno'], EXISTING_PATIENT_DATA_LOGIN['password'])
+
+
+def registration_case(driver, index):
+    """Регистрация пациента с новым номером телефона."""
+    reset_driver(driver)
+    telno = '89{:09d}'.format((int(time.time()) * 1000 + index) % 10 ** 9)
+    return lambda: registration(driver, 'Тестов', 'Тест', 'Тестович', '01.01.1970', telno,
+                                'benchmark{}@test.com'.format(telno), 'qwerty', 'qwerty')
+
+
+def select_service_case(driver, index):
+    """Выбор услуги на странице новой записи."""
+    open_new_appointment(driver, EXISTING_PATIENT_DATA_LOGIN)
+    return lambda: new_appointment_select_service(driver, SERVICE_INSPECTION)
+
+
+def select_doctors_case(driver, index):
+    """Выбор врача после выбора услуги."""
+    open_new_appointment(driver, EXISTING_PATIENT_DATA_LOGIN)
+    new_appointment_select_service(driver, SERVICE_INSPECTION)
+    return lambda: new_appointment_select_doctors(driver, DOCTOR_DATA_LOGIN['full_name'])
+
+
+def select_date_case(driver, index):
+    """Выбор даты записи."""
+    open_new_appointment(driver, EXISTING_PATIENT_DATA_LOGIN)
+    return lambda: new_appointment_select_date(driver, appointment_date(index))
+
+
+def select_time_case(driver, index):
+    """Выбор времени записи."""
+    open_new_appointment(driver, EXISTING_PATIENT_DATA_LOGIN)
+    return lambda: new_appointment_select_time(driver, APPOINTMENT_TIME)
+
+
+def select_patient_case(driver, index):
+    """Выбор пациента врачом."""
+    open_new_appointment(driver, DOCTOR_DATA_LOGIN)
+    return lambda: new_appointment_select_patient(driver, EXISTING_PATIENT_DATA_LOGIN['full_name'])
+
+
+def cancel_appointment_case(driver, index):
+    """Отмена только что созданной записи."""
+    create_appointment(driver, EXISTING_PATIENT_DATA_LOGIN, index)
+    return lambda: cancel_appointment(driver, appointment_date(index), EXISTING_PATIENT_DATA_LOGIN['full_name'])
+
+
+def new_bill_case(driver, index):
+    """Счет на только что созданную врачом запись."""
+    create_appointment(driver, DOCTOR_DATA_LOGIN, BENCHMARK_REPEAT + index)
+    return lambda: new_bill(driver, EXISTING_PATIENT_DATA_LOGIN['full_name'],
+                            appointment_date(BENCHMARK_REPEAT + index), SERVICE_INSPECTION)
+
+
+def new_medical_history_case(driver, index):
+    """Запись медицинской истории."""
+    cached_login(driver, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
+    return lambda: new_medical_history(driver, EXISTING_PATIENT_DATA_LOGIN['full_name'], DIAGNOSIS_TEXT)
+
+
+def new_cost_accounting_entry_case(driver, index):
+    """Запись учета расходов с получением всех трех страниц."""
+    cached_login(driver, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
+    # Страницы берутся из браузера так же, как при проверке результата в тестах.
+    return lambda: {name: str(page) for name, page in new_cost_accounting_entry(driver, MATERIAL_TEST_NAME, 1).items()}
+# endregion
+
+
+HELPER_CASES = {'login': login_case, 'registration': registration_case,
+                'new_appointment_select_service': select_service_case,
+                'new_appointment_select_doctors': select_doctors_case,
+                'new_appointment_select_date': select_date_case,
+                'new_appointment_select_time': select_time_case,
+                'new_appointment_select_patient': select_patient_case,
+                'cancel_appointment': cancel_appointment_case, 'new_bill': new_bill_case,
+                'new_medical_history': new_medical_history_case,
+                'new_cost_accounting_entry': new_cost_accounting_entry_case}
+"""Сценарии помощников: функция от веб-драйвера и номера запуска, подготавливающая страницу и возвращающая вызов."""
+
+
+# region Таблицы помощников разбора страниц
+def materials_page(size):
+    """Страница учета расходов из size строк."""
+    rows = [[str(index), 'Материал {}'.format(index), str(index)] for index in range(1, size)]
+    rows.append([str(size), MATERIAL_TEST_NAME, '1000'])
+    return table_html(['№', 'Материал', 'Количество'], rows)
+
+
+def orders_page(size, now):
+    """Страница заказов из size строк."""
+    rows = [[str(index), DOCTOR_DATA_LOGIN['full_name'], 'Материал {}'.format(index), str(index),
+             (now - timedelta(days=index)).strftime(DATE_TIME_FORMAT)] for index in range(1, size)]
+    rows.append([str(size), DOCTOR_DATA_LOGIN['full_name'], MATERIAL_TEST_NAME, '1', now.strftime(DATE_TIME_FORMAT)])
+    return table_html(['№', 'Автор', 'Материал', 'Количество', 'Дата'], rows)
+
+
+def medical_history_page(size, now):
+    """Страница медицинской истории из size строк."""
+    rows = [[DOCTOR_DATA_LOGIN['full_name'], EXISTING_PATIENT_DATA_LOGIN['full_name'],
+             (now - timedelta(days=index)).strftime(DATE_TIME_FORMAT), 'Запись {}'.format(index)]
+            for index in range(1, size)]
+    rows.append([DOCTOR_DATA_LOGIN['full_name'], EXISTING_PATIENT_DATA_LOGIN['full_name'],
+                 now.strftime(DATE_TIME_FORMAT), DIAGNOSIS_TEXT])
+    return table_html(['Автор', 'Пациент', 'Дата', 'Запись'], rows)
+# endregion
+
+
+def calibrate(repeat=CALIBRATION_REPEAT):
+    """
+    Измеряет скорость машины: медиана времени разбора встроенным HTMLParser таблицы из CALIBRATION_ROWS строк.
+    Калибровочный цикл не использует помощники dentistry_selenium, поэтому их изменения на него не влияют.
+    :param repeat: Количество запусков.
+    :return: Медиана времени калибровочного цикла в миллисекундах.
+    """
+    document = materials_page(CALIBRATION_ROWS)
+    milliseconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser = HTMLParser()
+        parser.feed(document)
+        parser.close()
+        milliseconds.append((time.perf_counter() - start) * 1000)
+    return statistics.median(milliseconds)
+
+
+def to_ratios(results, calibration_ms):
+    """
+    Переводит задержки результатов в доли времени калибровочного цикла, которые не зависят от скорости машины.
+    :param results: Результаты с задержками в миллисекундах.
+    :param calibration_ms: Время калибровочного цикла в миллисекундах.
+    :return: Результаты для базовых результатов.
+    """
+    ratios = {}
+    for name, result in results.items():
+        ratios[name] = {'runs': result['runs']}
+        for metric, ratio in LATENCY_METRICS.items():
+            ratios[name][ratio] = round(result[metric] / calibration_ms, 6)
+        ratios[name]['commands'] = result['commands']
+    return ratios
+
+
+def expected_ms(base, metric, calibration_ms):
+    """
+    :param base: Базовый результат помощника.
+    :param metric: Показатель задержки из LATENCY_METRICS.
+    :param calibration_ms: Время калибровочного цикла на текущей машине в миллисекундах.
+    :return: Ожидаемая на текущей машине задержка в миллисекундах.
+    """
+    return round(base[LATENCY_METRICS[metric]] * calibration_ms, 3)
+
+
+def parser_cases(size):
+    """
+    Вызовы помощников разбора страниц на сгенерированной таблице. Искомая строка - последняя, худший случай.
+    :param size: Количество строк таблицы.
+    :return: Словарь название -> вызов.
+    """
+    now = datetime.now().replace(second=0, microsecond=0)
+    materials, orders, history = materials_page(size), orders_page(size, now), medical_history_page(size, now)
+    return {'count_material[{}]'.format(size): lambda: count_material(materials, MATERIAL_TEST_NAME),
+            'find_order[{}]'.format(size): lambda: find_order(orders, DOCTOR_DATA_LOGIN['full_name'], now,
+                                                              MATERIAL_TEST_NAME, 1),
+            'find_medical_history[{}]'.format(size): lambda: find_medical_history(
+                history, DOCTOR_DATA_LOGIN['full_name'], EXISTING_PATIENT_DATA_LOGIN['full_name'], DIAGNOSIS_TEXT, now)}
+
+
+def summarize_runs(seconds, commands):
+    """
+    :param seconds: Время запусков в секундах.
+    :param commands: Количество команд веб-драйвера в запусках.
+    :return: Результат помощника: количество запусков, медиана и p95 задержки, медиана количества команд.
+    """
+    milliseconds = sorted(value * 1000 for value in seconds)
+    return {'runs': len(milliseconds), 'median_ms': round(statistics.median(milliseconds), 3),
+            'p95_ms': round(percentile_value(milliseconds, 95), 3), 'commands': statistics.median_low(commands)}
+
+
+def run_parser_benchmarks(sizes, repeat):
+    """
+    Измеряет помощники разбора страниц. Первый запуск не учитывается, кэш разобранных таблиц очищается перед каждым
+    запуском: в тестах каждая страница разбирается впервые.
+    :param sizes: Количество строк таблиц.
+    :param repeat: Количество запусков на самой маленькой таблице.
+    :return: Словарь название -> результат.
+    """
+    results = {}
+    for size in sizes:
+        runs = max(MIN_PARSER_REPEAT, min(repeat, PARSER_ROWS_PER_RUN // size))
+        for name, call in parser_cases(size).items():
+            call()
+            seconds = []
+            for _ in range(runs):
+                PARSED_TABLES.clear()
+                start = time.perf_counter()
+                if not call():
+                    raise AssertionError('{}: искомая строка не найдена'.format(name))
+                seconds.append(time.perf_counter() - start)
+            results[name] = summarize_runs(seconds, [0] * runs)
+    return results
+
+
+def run_helper_benchmarks(driver, repeat):
+    """
+    Измеряет помощники веб-драйвера: время и количество команд каждого вызова без подготовки страницы.
+    :param driver: Инструментированный веб-драйвер.
+    :param repeat: Количество запусков каждого помощника.
+    :return: Словарь название -> результат.
+    """
+    recorder = dentistry_instrumentation.RECORDER
+    dentistry_instrumentation.enable()
+
+    results = {}
+    for name, case in HELPER_CASES.items():
+        seconds, commands = [], []
+        for index in range(repeat):
+            call = case(driver, index)
+            recorder.start_test(name)
+            call()
+            measurement = recorder.finish_test()
+            seconds.append(measurement['seconds'])
+            commands.append(measurement['commands'])
+        results[name] = summarize_runs(seconds, commands)
+    return results
+
+
+def run_profile_benchmarks(repeat, profiles=BROWSER_PROFILES):
+    """
+    Измеряет переходы на страницы веб-сервиса врачом для каждого профиля браузера.
+    :param repeat: Количество переходов на каждую страницу.
+    :param profiles: Профили браузера.
+    :return: Словарь страница -> профиль -> медиана и p95 времени перехода, медиана количества загруженных ресурсов.
+    """
+    results = {link: {} for link in PROFILE_PAGES}
+    for profile in profiles:
+        driver = create_chrome_driver(profile=profile)
+        try:
+            cached_login(driver, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
+            for link in PROFILE_PAGES:
+                url = LINKS['INDEX_LINK'] + (LINKS[link] if link != 'INDEX_LINK' else '')
+                seconds, resources = [], []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    navigate(driver, url)
+                    seconds.append(time.perf_counter() - start)
+                    resources.append(driver.execute_script(RESOURCE_COUNT_SCRIPT))
+                result = summarize_runs(seconds, resources)
+                result['resources'] = result.pop('commands')
+                results[link][profile] = result
+        finally:
+            quit_driver(driver)
+    return results
+
+
+def print_profile_results(results):
+    """
+    Печатает время перехода на страницы до (full) и после (lean) облегчения профиля браузера.
+    :param results: Результаты run_profile_benchmarks.
+    """
+    print('{:<30}{:>12}{:>12}{:>10}{:>12}{:>12}'.format('page', 'full_ms', 'lean_ms', 'saved', 'full_res',
+                                                        'lean_res'))
+    for link, profiles in results.items():
+        full, lean = profiles['full'], profiles['lean']
+        saved = 1 - lean['median_ms'] / full['median_ms'] if full['median_ms'] else 0
+        print('{:<30}{:>12}{:>12}{:>10.0%}{:>12}{:>12}'.format(link, full['median_ms'], lean['median_ms'], saved,
+                                                               full['resources'], lean['resources']))
+
+
+def compare(results, baseline, calibration_ms, threshold=REGRESSION_THRESHOLD):
+    """
+    Сравнивает результаты с базовыми. Регрессия - рост задержки больше порога или рост количества команд. Базовые
+    задержки хранятся в долях времени калибровочного цикла и переводятся в миллисекунды текущей машины.
+    :param results: Текущие результаты.
+    :param baseline: Базовые результаты.
+    :param calibration_ms: Время калибровочного цикла на текущей машине в миллисекундах.
+    :param threshold: Допустимое относительное увеличение задержки.
+    :return: Список описаний регрессий.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        for metric in LATENCY_METRICS:
+            expected = expected_ms(base, metric, calibration_ms)
+            if result[metric] - expected > max(expected * threshold, MIN_REGRESSION_MS):
+                regressions.append('{}: {} {} мс, базовое значение {} мс'.format(name, metric, result[metric],
+                                                                                 expected))
+        if result['commands'] > base['commands']:
+            regressions.append('{}: {} команд веб-драйвера, базовое значение {}'.format(name, result['commands'],
+                                                                                        base['commands']))
+    return regressions
+
+
+def print_results(results, baseline, calibration_ms):
+    """
+    Печатает результаты и базовые значения, переведенные в миллисекунды текущей машины.
+    :param results: Текущие результаты.
+    :param baseline: Базовые результаты.
+    :param calibration_ms: Время калибровочного цикла на текущей машине в миллисекундах.
+    """
+    print('Калибровочный цикл: {:.3f} мс'.format(calibration_ms))
+    print('{:<40}{:>8}{:>12}{:>12}{:>10}{:>14}'.format('benchmark', 'runs', 'median_ms', 'p95_ms', 'commands',
+                                                       'base_median'))
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        base = expected_ms(base, 'median_ms', calibration_ms) if base is not None else '-'
+        print('{:<40}{:>8}{:>12}{:>12}{:>10}{:>14}'.format(name, result['runs'], result['median_ms'],
+                                                           result['p95_ms'], result['commands'], base))
+
+
+def load_baseline(path):
+    """
+    :param path: Путь к базовым результатам.
+    :return: Базовые результаты или пустой словарь, если файла нет.
+    """
+    try:
+        with open(path, encoding='utf-8') as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return {}
+
+
+def parse_arguments(arguments=None):
+    """
+    Разбирает аргументы командной строки.
+    :param arguments: Аргументы или None для sys.argv.
+    :return: Настройки.
+    """
+    parser = argparse.ArgumentParser(description='Тесты производительности помощников dentistry_selenium.')
+    parser.add_argument('--base-url', default=None,
+                        help='адрес веб-сервиса, по умолчанию запускается заменитель dentistry-flask')
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT, help='количество запусков помощника')
+    parser.add_argument('--sizes', type=int, nargs='+', default=TABLE_SIZES, help='количество строк таблиц')
+    parser.add_argument('--parsers-only', action='store_true', help='измерять только помощники разбора страниц')
+    parser.add_argument('--compare-profiles', action='store_true',
+                        help='сравнить время перехода на страницы для обычного и облегченного профилей браузера')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='путь к базовым результатам')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='допустимое относительное увеличение задержки')
+    parser.add_argument('--update-baseline', action='store_true', help='записать результаты как базовые')
+    parser.add_argument('--report', default=None, help='путь к JSON файлу результатов')
+    return parser.parse_args(arguments)
+
+
+def start_service(base_url):
+    """
+    Направляет помощники на указанный веб-сервис или, если адрес не указан, на запущенный заменитель dentistry-flask.
+    :param base_url: Адрес веб-сервиса или None.
+    :return: Запущенный заменитель или None.
+    """
+    if base_url:
+        dentistry_selenium.set_base_url(base_url)
+        return None
+
+    stand_in = DentistryStandIn().start()
+    dentistry_selenium.set_base_url(stand_in.base_url)
+    return stand_in
+
+
+def main(arguments=None):
+    """
+    Запускает тесты производительности и сравнивает результаты с базовыми.
+    :param arguments: Аргументы командной строки.
+    :return: Код завершения: 1, если найдены регрессии.
+    """
+    settings = parse_arguments(arguments)
+
+    if settings.compare_profiles:
+        stand_in = start_service(settings.base_url)
+        try:
+            results = run_profile_benchmarks(settings.repeat)
+        finally:
+            if stand_in is not None:
+                stand_in.stop()
+        print_profile_results(results)
+        if settings.report:
+            with open(settings.report, 'w', encoding='utf-8') as report_file:
+                json.dump(results, report_file, ensure_ascii=False, indent=2)
+        return 0
+
+    calibration_ms = calibrate()
+    results = run_parser_benchmarks(settings.sizes, settings.repeat)
+
+    if not settings.parsers_only:
+        stand_in = start_service(settings.base_url)
+        driver = dentistry_instrumentation.instrument_driver(create_chrome_driver())
+        try:
+            results.update(run_helper_benchmarks(driver, settings.repeat))
+        finally:
+            quit_driver(driver)
+            if stand_in is not None:
+                stand_in.stop()
+
+    baseline = load_baseline(settings.baseline)
+    print_results(results, baseline, calibration_ms)
+
+    if settings.report:
+        with open(settings.report, 'w', encoding='utf-8') as report_file:
+            json.dump(results, report_file, ensure_ascii=False, indent=2)
+
+    if settings.update_baseline:
+        # Результаты, которые не измерялись в этом запуске, сохраняются: доли калибровочного цикла не зависят от
+        # машины, на которой они получены.
+        baseline.setdefault('results', {}).update(to_ratios(results, calibration_ms))
+        baseline['calibration_ms'] = round(calibration_ms, 3)
+        with open(settings.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file, ensure_ascii=False, indent=2)
+        return 0
+
+    regressions = compare(results, baseline, calibration_ms, settings.threshold)
+    for regression in regressions:
+        print('Регрессия: ' + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# region Учетные записи
+DOCTOR_DATA_LOGIN = {'full_name': 'Николаевна Анна Михайловна', 'telno': '89023456781', 'password': 'qwerty'}
+"""Данные для входа лечащего врача."""
+
+EXISTING_PATIENT_DATA_LOGIN = {'full_name': 'Тестов Тест Тестович',
+                               'telno': '89127658910',
+                               'password': 'qwerty'}
+"""Данные для входа существующего пользователя."""
+# endregion
+
+# region Услуги и материалы
+SERVICE_INSPECTION = 'Осмотр'
+"""Название медицинского осмотра при записи."""
+
+SERVICE_VENEER = 'Винир'
+"""Название услуги для установки винира при записи."""
+
+DOCTORS_SERVICE_INSPECTIONS = ['Николаевна Анна Михайловна', 'Михайлов Станислав Александрович',
+                               'Сергеев Сергей Андреевич', 'Иванов Николай Александрович']
+"""Список врачей для медицинского осмотра."""
+
+DOCTORS_SERVICE_VENEER = ['Михайлов Станислав Александрович']
+"""Список врачей для установки винира."""
+
+MATERIAL_TEST_NAME = 'Иглы'
+"""Название материала для тестирования."""
+
+MATERIAL_COUNT_GOOD_TEST = 1
+"""Количество материала для корректного результата тестирования."""
+# endregion
+
+# region Записи на прием
+APPOINTMENT_DAYS_AHEAD = 30
+"""Количество дней от текущей даты до даты записи для корректного результата тестирования."""
+
+APPOINTMENT_DATE_FORMAT = '%d.%m.%Y'
+"""Формат даты записи в форме записи на прием."""
+# endregion
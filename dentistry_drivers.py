@@ -0,0 +1,366 @@
+from collections import deque
+import os
+import threading
+import weakref
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+
+from dentistry_selenium import forget_driver_state
+
+# region Константы
+CHROME_WEB_DRIVER_PATH = os.environ.get('CHROME_WEB_DRIVER_PATH')
+"""Путь к исполняемому файлу chromedriver. Если не задан, драйвер находит Selenium Manager."""
+
+DRIVER_HEADLESS = os.environ.get('DRIVER_HEADLESS', '1') != '0'
+"""Запускать ли браузер без графического интерфейса."""
+
+DRIVER_POOL_SIZE = int(os.environ.get('DRIVER_POOL_SIZE', '1'))
+"""Количество заранее запущенных веб-драйверов в пуле."""
+
+DRIVER_MAX_USES = int(os.environ.get('DRIVER_MAX_USES', '50'))
+"""Количество тестов, после которого веб-драйвер перезапускается."""
+
+DRIVER_WAIT_TIMEOUT = 300.0
+"""Время ожидания свободного веб-драйвера пула в секундах."""
+
+BLANK_PAGE = 'about:blank'
+"""Пустая страница, на которую переходит веб-драйвер при сбросе."""
+
+CLEAR_STORAGE_SCRIPT = 'window.localStorage.clear(); window.sessionStorage.clear();'
+"""Скрипт очистки локального и сессионного хранилища страницы."""
+
+DRIVER_PROFILE = os.environ.get('DRIVER_PROFILE', 'lean')
+"""Профиль браузера: lean - без загрузки изображений, шрифтов, медиа и стилей, full - обычный браузер."""
+
+LEAN_PAGE_LOAD_STRATEGY = 'eager'
+"""Стратегия загрузки страниц облегченного профиля: ожидание только построения DOM, без загрузки ресурсов."""
+
+LEAN_BLOCKED_URLS = ('*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+                     '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+                     '*.mp3', '*.mp4', '*.webm', '*.ogg', '*.wav',
+                     '*.css', '*fonts.googleapis.com*', '*fonts.gstatic.com*')
+"""Шаблоны ссылок ресурсов, которые облегченный профиль не загружает: проверки тестов читают только текст DOM и
+состояние форм."""
+
+LEAN_PREFERENCES = {'profile.default_content_setting_values.notifications': 2,
+                    'profile.default_content_setting_values.geolocation': 2,
+                    'profile.default_content_setting_values.media_stream': 2,
+                    'profile.password_manager_enabled': False, 'credentials_enable_service': False,
+                    'translate.enabled': False}
+"""Настройки Chrome облегченного профиля. Изображения блокируются только через LEAN_BLOCKED_URLS, чтобы тест мог
+разрешить их маркером allow_resources."""
+
+LEAN_ARGUMENTS = ('--disable-background-networking', '--disable-component-update', '--disable-default-apps',
+                  '--disable-extensions', '--disable-sync', '--disable-client-side-phishing-detection',
+                  '--disable-domain-reliability',
+                  '--disable-features=Translate,OptimizationHints,MediaRouter,AutofillServerCommunication',
+                  '--metrics-recording-only', '--mute-audio', '--no-default-browser-check', '--no-first-run')
+"""Аргументы Chrome облегченного профиля, отключающие фоновые службы."""
+# endregion
+
+# region Облегченные веб-драйверы
+LEAN_DRIVERS = weakref.WeakSet()
+"""Веб-драйверы, запущенные с облегченным профилем."""
+# endregion
+
+
+def chrome_options(headless=DRIVER_HEADLESS, profile=DRIVER_PROFILE):
+    """
+    Создает настройки Chrome веб-драйвера.
+    :param headless: Запускать ли браузер без графического интерфейса.
+    :param profile: Профиль браузера: lean или full.
+    :return: Настройки веб-драйвера.
+    """
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+
+    if profile == 'lean':
+        options.page_load_strategy = LEAN_PAGE_LOAD_STRATEGY
+        options.add_experimental_option('prefs', LEAN_PREFERENCES)
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+
+    return options
+
+
+def create_chrome_driver(driver_path=CHROME_WEB_DRIVER_PATH, options=None, profile=DRIVER_PROFILE):
+    """
+    Запускает новый Chrome веб-драйвер. Веб-драйвер облегченного профиля не загружает ресурсы LEAN_BLOCKED_URLS.
+    :param driver_path: Путь к chromedriver.
+    :param options: Настройки веб-драйвера, по умолчанию - настройки профиля. Для переданных настроек профиль не
+    применяется, и блокировка ресурсов не включается.
+    :param profile: Профиль браузера: lean или full.
+    :return: Веб-драйвер.
+    """
+    service = Service(driver_path) if driver_path else Service()
+    if options is not None:
+        return webdriver.Chrome(service=service, options=options)
+    driver = webdriver.Chrome(service=service, options=chrome_options(profile=profile))
+    return apply_profile(driver, profile)
+
+
+def create_remote_driver(url, options=None, profile=DRIVER_PROFILE):
+    """
+    Открывает сессию Chrome на удаленном сервере WebDriver: узле Selenium Grid или отдельно запущенном chromedriver.
+    Соединение поддерживает команды CDP, поэтому облегченный профиль работает так же, как у локального веб-драйвера.
+    :param url: Адрес сервера WebDriver.
+    :param options: Настройки веб-драйвера, по умолчанию - настройки профиля. Для переданных настроек профиль не
+    применяется, и блокировка ресурсов не включается.
+    :param profile: Профиль браузера: lean или full.
+    :return: Веб-драйвер.
+    """
+    connection = ChromiumRemoteConnection(url, vendor_prefix='goog', browser_name='chrome')
+    if options is not None:
+        return webdriver.Remote(command_executor=connection, options=options)
+    driver = webdriver.Remote(command_executor=connection, options=chrome_options(profile=profile))
+    return apply_profile(driver, profile)
+
+
+def apply_profile(driver, profile):
+    """
+    Включает блокировку ресурсов LEAN_BLOCKED_URLS для веб-драйвера облегченного профиля.
+    :param driver: Веб-драйвер.
+    :param profile: Профиль браузера: lean или full.
+    :return: Веб-драйвер.
+    """
+    if profile == 'lean':
+        driver.execute_cdp_cmd('Network.enable', {})
+        LEAN_DRIVERS.add(driver)
+        block_urls(driver)
+
+    return driver
+
+
+def blocked_urls(allowed=()):
+    """
+    :param allowed: Шаблоны из LEAN_BLOCKED_URLS, которые нужно загружать.
+    :return: Шаблоны блокируемых ссылок.
+    """
+    unknown = [pattern for pattern in allowed if pattern not in LEAN_BLOCKED_URLS]
+    if unknown:
+        raise ValueError('Шаблоны {} не входят в LEAN_BLOCKED_URLS'.format(', '.join(unknown)))
+    return [pattern for pattern in LEAN_BLOCKED_URLS if pattern not in allowed]
+
+
+def block_urls(driver, allowed=()):
+    """
+    Задает блокируемые ресурсы облегченного веб-драйвера через CDP Network.setBlockedURLs. Для веб-драйверов
+    обычного профиля ничего не делает, но шаблоны проверяются и для них.
+    :param driver: Веб-драйвер.
+    :param allowed: Шаблоны из LEAN_BLOCKED_URLS, которые нужно загружать, например, ('*.css',) для теста,
+    проверяющего видимость элементов. Шаблон не из LEAN_BLOCKED_URLS вызывает ValueError.
+    """
+    urls = blocked_urls(allowed)
+    if driver in LEAN_DRIVERS:
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+
+
+def reset_driver(driver):
+    """
+    Сбрасывает состояние веб-драйвера между тестами без перезапуска браузера: очищает хранилища страницы, cookie
+    и переходит на пустую страницу.
+    :param driver: Веб-драйвер.
+    """
+    try:
+        driver.execute_script(CLEAR_STORAGE_SCRIPT)
+    except WebDriverException:
+        # Хранилище недоступно на страницах вроде about:blank или data:.
+        pass
+    driver.delete_all_cookies()
+    driver.get(BLANK_PAGE)
+    forget_driver_state(driver)
+
+
+def quit_driver(driver):
+    """
+    Завершает работу веб-драйвера, игнорируя ошибки уже упавшего браузера.
+    :param driver: Веб-драйвер.
+    """
+    try:
+        driver.quit()
+    except WebDriverException:
+        pass
+
+
+class DriverPool:
+    """
+    Пул заранее запущенных веб-драйверов, которые выдаются тестам и сбрасываются между ними вместо перезапуска.
+    Веб-драйвер можно вернуть с меткой (например, ролью пользователя, вошедшего в нем), тогда он не сбрасывается и
+    выдается в первую очередь при запросе с той же меткой. Место веб-драйвера, который не удалось перезапустить,
+    остается свободным, и веб-драйвер запускается при следующей выдаче.
+    """
+
+    def __init__(self, factory=create_chrome_driver, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES,
+                 timeout=DRIVER_WAIT_TIMEOUT):
+        """
+        :param factory: Функция, создающая новый веб-драйвер.
+        :param size: Количество веб-драйверов в пуле.
+        :param max_uses: Количество выдач, после которого веб-драйвер перезапускается.
+        :param timeout: Время ожидания свободного веб-драйвера в секундах.
+        """
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self.uses = {}
+        self.tags = {}
+        self.idle = deque()
+        self.vacant = 0
+        """Количество мест пула без запущенного веб-драйвера."""
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.closed = False
+
+    def start(self):
+        """
+        Запускает все веб-драйверы пула заранее.
+        :return: Пул.
+        """
+        for _ in range(self.size):
+            self._put(self._spawn())
+        return self
+
+    def _spawn(self):
+        """
+        Запускает новый веб-драйвер и регистрирует его в пуле.
+        :return: Веб-драйвер.
+        """
+        driver = self.factory()
+        with self.lock:
+            self.uses[driver] = 0
+        return driver
+
+    def _respawn(self):
+        """
+        Запускает веб-драйвер на место завершенного. Если запуск не удался, место остается свободным для следующей
+        выдачи, а ошибка передается вызывающему.
+        :return: Веб-драйвер.
+        """
+        try:
+            return self._spawn()
+        except Exception:
+            with self.available:
+                self.vacant += 1
+                self.available.notify()
+            raise
+
+    def _retire(self, driver):
+        """
+        Завершает работу веб-драйвера и удаляет его из пула.
+        :param driver: Веб-драйвер.
+        """
+        with self.lock:
+            self.uses.pop(driver, None)
+            self.tags.pop(driver, None)
+        quit_driver(driver)
+
+    def _put(self, driver, tag=None):
+        """
+        Добавляет веб-драйвер в очередь свободных.
+        :param driver: Веб-драйвер.
+        :param tag: Метка веб-драйвера или None, если он сброшен.
+        """
+        with self.available:
+            self.tags[driver] = tag
+            self.idle.append(driver)
+            self.available.notify()
+
+    def acquire(self, tag=None):
+        """
+        Выдает веб-драйвер из пула: свободный веб-драйвер с указанной меткой, если он есть, иначе сброшенный или
+        сбрасываемый перед выдачей. Если свободных веб-драйверов нет, но есть свободное место, веб-драйвер
+        запускается.
+        :param tag: Метка веб-драйвера или None, если нужен сброшенный веб-драйвер.
+        :return: Веб-драйвер.
+        """
+        if self.closed:
+            raise RuntimeError('Пул веб-драйверов закрыт')
+
+        with self.available:
+            if not self.available.wait_for(lambda: self.idle or self.vacant or self.closed, self.timeout):
+                raise RuntimeError('Нет свободных веб-драйверов за {} с'.format(self.timeout))
+            if self.closed:
+                raise RuntimeError('Пул веб-драйверов закрыт')
+            if self.idle:
+                # Веб-драйверы с сессиями других ролей сбрасываются, только если нет подходящих.
+                driver = next((idle for idle in self.idle if self.tags.get(idle) == tag),
+                              next((idle for idle in self.idle if self.tags.get(idle) is None), self.idle[0]))
+                self.idle.remove(driver)
+                stale = self.tags.get(driver) not in (None, tag)
+            else:
+                self.vacant -= 1
+                driver, stale = None, False
+
+        if driver is None:
+            driver = self._respawn()
+        elif stale:
+            try:
+                reset_driver(driver)
+            except WebDriverException:
+                self._retire(driver)
+                driver = self._respawn()
+        with self.lock:
+            self.uses[driver] = self.uses.get(driver, 0) + 1
+            self.tags[driver] = None
+        return driver
+
+    def release(self, driver, broken=False, tag=None):
+        """
+        Возвращает веб-драйвер в пул. Упавший или израсходовавший лимит использований драйвер перезапускается.
+        :param driver: Веб-драйвер.
+        :param broken: Упал ли веб-драйвер во время теста.
+        :param tag: Метка, с которой веб-драйвер возвращается без сброса, или None, чтобы сбросить его.
+        """
+        if self.closed:
+            self._retire(driver)
+            return
+
+        if not broken and self.uses.get(driver, self.max_uses) < self.max_uses:
+            if tag is not None:
+                self._put(driver, tag)
+                return
+            try:
+                reset_driver(driver)
+            except WebDriverException:
+                # Браузер не отвечает - перезапускаем его.
+                pass
+            else:
+                self._put(driver)
+                return
+
+        self._retire(driver)
+        self._put(self._respawn())
+
+    def replace(self, driver, tag=None):
+        """
+        Заменяет упавший веб-драйвер новым.
+        :param driver: Упавший веб-драйвер.
+        :param tag: Метка нужного веб-драйвера.
+        :return: Новый веб-драйвер.
+        """
+        try:
+            self.release(driver, broken=True)
+        except Exception:
+            # Место упавшего веб-драйвера осталось свободным, и acquire попробует запустить веб-драйвер еще раз.
+            pass
+        return self.acquire(tag)
+
+    def close(self):
+        """
+        Завершает работу всех веб-драйверов пула.
+        """
+        with self.available:
+            self.closed = True
+            drivers = list(self.uses)
+            self.uses.clear()
+            self.tags.clear()
+            self.idle.clear()
+            self.available.notify_all()
+        for driver in drivers:
+            quit_driver(driver)
@@ -0,0 +1,215 @@
+from collections import defaultdict
+import json
+import threading
+import time
+
+from selenium.webdriver.remote.command import Command
+
+import dentistry_selenium
+
+# region Константы
+PAGE_SOURCE_COMMANDS = (Command.GET_PAGE_SOURCE,)
+"""Команды, для которых считается объем переданного содержимого страницы."""
+
+TEST_SCOPE = '<test>'
+"""Название области измерений всего теста."""
+# endregion
+
+
+class Measurement:
+    """
+    Измерения одной области: вызова помощника или всего теста.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: Название помощника или области.
+        """
+        self.name = name
+        self.seconds = 0.0
+        self.command_counts = defaultdict(int)
+        self.command_seconds = defaultdict(float)
+        self.page_source_bytes = 0
+
+    def add_command(self, command, seconds, size):
+        """
+        Учитывает выполненную команду веб-драйвера.
+        :param command: Название команды WebDriver.
+        :param seconds: Время выполнения в секундах.
+        :param size: Объем переданного содержимого страницы в байтах.
+        """
+        self.command_counts[command] += 1
+        self.command_seconds[command] += seconds
+        self.page_source_bytes += size
+
+    def to_dict(self):
+        """
+        :return: Измерения в виде словаря для отчета.
+        """
+        return {'name': self.name, 'seconds': round(self.seconds, 6),
+                'commands': sum(self.command_counts.values()),
+                'command_counts': dict(self.command_counts),
+                'command_seconds': {command: round(seconds, 6) for command, seconds in self.command_seconds.items()},
+                'page_source_bytes': self.page_source_bytes}
+
+
+class Recorder:
+    """
+    Сбор измерений вызовов помощников и команд веб-драйвера. Измеряются только вызовы помощников верхнего уровня:
+    вложенный вызов (например, login внутри cached_login) входит в измерения внешнего помощника и отдельно не
+    учитывается, поэтому сводка по помощникам не считает одни и те же команды дважды.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.test = None
+        self.calls = []
+
+    @property
+    def stack(self):
+        """
+        :return: Стек активных вызовов помощников текущего потока.
+        """
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def start_test(self, name):
+        """
+        Начинает измерения теста.
+        :param name: Идентификатор теста.
+        """
+        self.test = Measurement(name)
+        self.test.seconds = time.perf_counter()
+        self.calls = []
+
+    def finish_test(self):
+        """
+        Завершает измерения теста.
+        :return: Измерения теста и его вызовов помощников в виде словаря.
+        """
+        test, self.test = self.test, None
+        if test is None:
+            return None
+        test.seconds = time.perf_counter() - test.seconds
+        result = test.to_dict()
+        result['helpers'] = [call.to_dict() for call in self.calls]
+        return result
+
+    def hook(self, name, call):
+        """
+        Обработчик вызовов помощников для dentistry_selenium.HELPER_HOOKS.
+        :param name: Название помощника.
+        :param call: Вызов помощника.
+        :return: Результат помощника.
+        """
+        if self.stack:
+            return call()
+
+        measurement = Measurement(name)
+        self.calls.append(measurement)
+        self.stack.append(measurement)
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            measurement.seconds = time.perf_counter() - start
+            self.stack.pop()
+
+    def command(self, command, seconds, size):
+        """
+        Учитывает выполненную команду веб-драйвера.
+        :param command: Название команды WebDriver.
+        :param seconds: Время выполнения в секундах.
+        :param size: Объем переданного содержимого страницы в байтах.
+        """
+        if self.test is not None:
+            self.test.add_command(command, seconds, size)
+        for measurement in self.stack:
+            measurement.add_command(command, seconds, size)
+
+
+# region Текущий сборщик
+RECORDER = Recorder()
+"""Сборщик измерений, используемый обработчиками помощников и инструментированными веб-драйверами."""
+# endregion
+
+
+def enable():
+    """
+    Включает измерения вызовов помощников.
+    """
+    if RECORDER.hook not in dentistry_selenium.HELPER_HOOKS:
+        dentistry_selenium.HELPER_HOOKS.append(RECORDER.hook)
+
+
+def disable():
+    """
+    Отключает измерения вызовов помощников.
+    """
+    if RECORDER.hook in dentistry_selenium.HELPER_HOOKS:
+        dentistry_selenium.HELPER_HOOKS.remove(RECORDER.hook)
+
+
+def instrument_driver(driver):
+    """
+    Оборачивает выполнение команд веб-драйвера (и его элементов) измерением времени и объема содержимого страницы.
+    :param driver: Веб-драйвер.
+    :return: Веб-драйвер.
+    """
+    execute = driver.execute
+
+    def instrumented_execute(driver_command, params=None):
+        start = time.perf_counter()
+        response = execute(driver_command, params)
+        seconds = time.perf_counter() - start
+
+        size = 0
+        if driver_command in PAGE_SOURCE_COMMANDS and response:
+            size = len((response.get('value') or '').encode('utf-8'))
+        RECORDER.command(driver_command, seconds, size)
+
+        return response
+
+    driver.execute = instrumented_execute
+    return driver
+
+
+def summarize(tests):
+    """
+    Сводит измерения тестов по помощникам.
+    :param tests: Список измерений тестов.
+    :return: Словарь название помощника -> суммарные показатели.
+    """
+    helpers = {}
+    for test in tests:
+        for call in test['helpers']:
+            total = helpers.setdefault(call['name'], {'calls': 0, 'seconds': 0.0, 'commands': 0,
+                                                      'command_counts': defaultdict(int),
+                                                      'command_seconds': defaultdict(float),
+                                                      'page_source_bytes': 0})
+            total['calls'] += 1
+            total['seconds'] += call['seconds']
+            total['commands'] += call['commands']
+            total['page_source_bytes'] += call['page_source_bytes']
+            for command, count in call['command_counts'].items():
+                total['command_counts'][command] += count
+            for command, seconds in call['command_seconds'].items():
+                total['command_seconds'][command] += seconds
+
+    for total in helpers.values():
+        total['seconds'] = round(total['seconds'], 6)
+        total['command_counts'] = dict(total['command_counts'])
+        total['command_seconds'] = {command: round(seconds, 6) for command, seconds in total['command_seconds'].items()}
+
+    return dict(sorted(helpers.items(), key=lambda item: -item[1]['seconds']))
+
+
+def write_report(path, tests):
+    """
+    Записывает отчет измерений в JSON файл.
+    :param path: Путь к файлу отчета.
+    :param tests: Список измерений тестов.
+    """
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump({'tests': tests, 'helpers': summarize(tests)}, report_file, ensure_ascii=False, indent=2)
@@ -0,0 +1,440 @@
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from html.parser import HTMLParser
+import json
+import math
+import random
+import threading
+import time
+from urllib.parse import urlencode, urljoin
+
+import urllib3
+
+from dentistry_data import DOCTOR_DATA_LOGIN, EXISTING_PATIENT_DATA_LOGIN, MATERIAL_COUNT_GOOD_TEST, SERVICE_INSPECTION
+from dentistry_selenium import LINKS, FORM_FIELDS, SESSION_CHECK_TEXT, SUBMIT_ID, BillsPage, CostAccountingPage, \
+    LoginPage, MedicalHistoryPage, NewAppointmentPage
+
+# region Константы
+DIAGNOSIS_TEXT = 'Нагрузочное тестирование.'
+"""Текст записи медицинской истории."""
+
+REQUEST_TIMEOUT = 30
+"""Время ожидания ответа на запрос в секундах."""
+
+MAX_REDIRECTS = 5
+"""Количество перенаправлений, по которым следует один запрос."""
+
+RETRY_BACKOFF = 0.5
+"""Пауза перед повтором сценария после первой ошибки в секундах, после каждой следующей ошибки подряд она
+удваивается."""
+
+RETRY_BACKOFF_MAX = 10.0
+"""Наибольшая пауза перед повтором сценария в секундах."""
+
+PERCENTILES = (50, 95, 99)
+"""Перцентили задержки в отчете."""
+# endregion
+
+
+class SessionExpired(Exception):
+    """
+    Вход не выполнен или сессия пользователя истекла: веб-сервис перенаправил запрос на страницу входа.
+    """
+
+
+class FormParser(HTMLParser):
+    """
+    Разбор полей первой формы страницы: значения по умолчанию, имена полей по идентификаторам и варианты выбора.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.in_form = False
+        self.done = False
+        self.fields = {}
+        """Значения полей по умолчанию, ключ - имя поля."""
+        self.names = {}
+        """Имена полей, ключ - идентификатор поля."""
+        self.options = defaultdict(list)
+        """Варианты полей выбора (значение, текст), ключ - идентификатор поля."""
+        self.select = None
+        self.option = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form' and not self.done:
+            self.in_form = True
+        if not self.in_form:
+            return
+
+        if tag in ('input', 'textarea', 'select') and attrs.get('name'):
+            if attrs.get('id'):
+                self.names[attrs['id']] = attrs['name']
+            if tag == 'input' and attrs.get('type') != 'submit':
+                self.fields[attrs['name']] = attrs.get('value') or ''
+            if tag == 'select':
+                self.select = (attrs.get('id') or attrs['name'], attrs['name'])
+        elif tag == 'option' and self.select is not None:
+            self.option = [attrs.get('value'), '', 'selected' in attrs]
+
+    def handle_data(self, data):
+        if self.option is not None:
+            self.option[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'option' and self.option is not None:
+            value, text, selected = self.option
+            text = ' '.join(text.split())
+            value = text if value is None else value
+            field_id, name = self.select
+            self.options[field_id].append((value, text))
+            if selected or name not in self.fields:
+                self.fields[name] = value
+            self.option = None
+        elif tag == 'select':
+            self.select = None
+        elif tag == 'form' and self.in_form:
+            self.in_form = False
+            self.done = True
+
+
+def parse_form(html_text):
+    """
+    Разбирает первую форму страницы.
+    :param html_text: Текст html документа.
+    :return: Разобранная форма.
+    """
+    parser = FormParser()
+    parser.feed(html_text)
+    parser.close()
+    return parser
+
+
+class Statistics:
+    """
+    Потокобезопасный сбор задержек и ошибок запросов по конечным точкам и ошибок сценариев.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.start = time.perf_counter()
+
+    def add(self, endpoint, seconds, ok):
+        """
+        Добавляет результат запроса.
+        :param endpoint: Конечная точка, например 'POST login'.
+        :param seconds: Задержка в секундах.
+        :param ok: Успешен ли запрос.
+        """
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def add_error(self, name):
+        """
+        Учитывает ошибку сценария, не связанную с запросом (например, страница не разобралась).
+        :param name: Название ошибки, например 'error KeyError'.
+        """
+        with self.lock:
+            self.errors[name] += 1
+
+    def report(self):
+        """
+        Формирует отчет: количество запросов, ошибок, пропускная способность и перцентили задержки в миллисекундах.
+        :return: Словарь конечная точка -> показатели.
+        """
+        elapsed = time.perf_counter() - self.start
+        report = {}
+        with self.lock:
+            for endpoint in sorted(set(self.latencies) | set(self.errors)):
+                latencies = sorted(self.latencies.get(endpoint, ()))
+                row = {'requests': len(latencies), 'errors': self.errors[endpoint],
+                       'rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0}
+                for percentile in PERCENTILES:
+                    row['p{}_ms'.format(percentile)] = round(1000 * percentile_value(latencies, percentile), 2)
+                report[endpoint] = row
+        return report
+
+
+def percentile_value(sorted_values, percentile):
+    """
+    Возвращает перцентиль методом ближайшего ранга.
+    :param sorted_values: Отсортированные значения.
+    :param percentile: Перцентиль от 0 до 100.
+    :return: Значение перцентиля или 0, если значений нет.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percentile / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class RateLimiter:
+    """
+    Ограничение суммарной частоты запросов всех виртуальных пользователей.
+    """
+
+    def __init__(self, rps):
+        """
+        :param rps: Целевое количество запросов в секунду или None без ограничения.
+        """
+        self.interval = 1 / rps if rps else 0
+        self.lock = threading.Lock()
+        self.next_time = time.perf_counter()
+
+    def wait(self):
+        """
+        Блокирует поток до момента, когда можно отправить следующий запрос.
+        """
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.perf_counter()
+            self.next_time = max(self.next_time + self.interval, now)
+            delay = self.next_time - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class VirtualUser:
+    """
+    Виртуальный пользователь со своими cookie, отправляющий запросы через общий пул соединений. Формы заполняются
+    так же, как объектами страниц dentistry_selenium: значения по порядку полей FORM_FIELDS страницы.
+    """
+
+    def __init__(self, http, base_url, statistics, limiter):
+        """
+        :param http: Общий пул соединений urllib3.
+        :param base_url: Адрес веб-сервиса.
+        :param statistics: Сбор статистики.
+        :param limiter: Ограничение частоты запросов.
+        """
+        self.http = http
+        self.base_url = base_url
+        self.statistics = statistics
+        self.limiter = limiter
+        self.cookies = {}
+        self.signed_in = False
+
+    def sign_out(self):
+        """
+        Забывает сессию пользователя, чтобы следующий сценарий начался со входа.
+        """
+        self.cookies.clear()
+        self.signed_in = False
+
+    def request(self, method, link, fields=None):
+        """
+        Отправляет запрос к странице веб-сервиса, следуя перенаправлениям и сохраняя cookie. Запрос к другой странице,
+        перенаправленный на страницу входа, считается ошибкой: сессия истекла.
+        :param method: HTTP метод.
+        :param link: Ключ ссылки из LINKS.
+        :param fields: Поля формы для POST запроса.
+        :return: Текст ответа.
+        """
+        url = urljoin(self.base_url, LINKS[link])
+        login_url = urljoin(self.base_url, LINKS[LoginPage.link])
+        endpoint = '{} {}'.format(method, LINKS[link])
+        body = urlencode(fields) if fields is not None else None
+
+        self.limiter.wait()
+        start = time.perf_counter()
+        ok = False
+        try:
+            for _ in range(MAX_REDIRECTS):
+                headers = {'Cookie': '; '.join('{}={}'.format(*cookie) for cookie in self.cookies.items())}
+                if body is not None:
+                    headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                response = self.http.request(method, url, body=body, headers=headers, redirect=False,
+                                             timeout=REQUEST_TIMEOUT)
+                self.store_cookies(response)
+                if response.status in (301, 302, 303, 307, 308) and response.headers.get('Location'):
+                    url = urljoin(url, response.headers['Location'])
+                    if response.status in (301, 302, 303):
+                        method, body = 'GET', None
+                    continue
+                break
+            expired = link != LoginPage.link and url.split('?', 1)[0] == login_url
+            ok = 200 <= response.status < 300 and not expired
+            if expired:
+                self.signed_in = False
+                raise SessionExpired('Запрос {} перенаправлен на страницу входа'.format(endpoint))
+            return response.data.decode('utf-8', 'replace')
+        finally:
+            self.statistics.add(endpoint, time.perf_counter() - start, ok)
+
+    def store_cookies(self, response):
+        """
+        Сохраняет cookie из ответа.
+        :param response: Ответ urllib3.
+        """
+        for header in response.headers.getlist('Set-Cookie'):
+            name, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value.strip()
+
+    def fill(self, page, values):
+        """
+        Открывает страницу с формой и отправляет ее. CSRF токен и скрытые поля берутся со страницы.
+        :param page: Класс объекта страницы dentistry_selenium.
+        :param values: Значения полей FORM_FIELDS[page.link] по порядку; для полей выбора - видимый текст варианта или
+        None для случайного варианта.
+        :return: Текст ответа.
+        """
+        link = page.link
+        values = dict(zip(FORM_FIELDS[link], values))
+        form = parse_form(self.request('GET', link))
+        fields = dict(form.fields)
+
+        for field_id in FORM_FIELDS[link]:
+            if field_id not in values or field_id not in form.names:
+                continue
+            value = values[field_id]
+            options = form.options.get(field_id)
+            if options:
+                matching = [option for option, text in options if text == value or value is None and option]
+                value = random.choice(matching) if matching else value
+            fields[form.names[field_id]] = '' if value is None else value
+
+        fields[SUBMIT_ID] = SUBMIT_ID
+        return self.request('POST', link, fields)
+
+
+def login_flow(user, credentials):
+    """
+    Вход пользователя. Вход считается выполненным, если на странице после входа есть SESSION_CHECK_TEXT, как в
+    dentistry_selenium.cached_login.
+    :param user: Виртуальный пользователь.
+    :param credentials: Данные для входа из dentistry_data.
+    """
+    if SESSION_CHECK_TEXT not in user.fill(LoginPage, (credentials['telno'], credentials['password'])):
+        raise SessionExpired('Вход {} не выполнен'.format(credentials['telno']))
+    user.signed_in = True
+
+
+def booking_flow(user):
+    """
+    Запись пациента на прием к случайному врачу на случайную дату и время.
+    :param user: Виртуальный пользователь.
+    """
+    appointment_date = date.today() + timedelta(days=random.randint(1, 365))
+    user.fill(NewAppointmentPage, (SERVICE_INSPECTION, None, appointment_date.isoformat(), None))
+
+
+def doctor_flow(user):
+    """
+    Работа врача: счет на оплату, запись медицинской истории пациента из тестовых данных и запись учета случайного
+    расходного материала (один материал быстро закончился бы).
+    :param user: Виртуальный пользователь.
+    """
+    user.fill(BillsPage, (None,))
+    user.fill(MedicalHistoryPage, (EXISTING_PATIENT_DATA_LOGIN['full_name'], DIAGNOSIS_TEXT))
+    user.fill(CostAccountingPage, (None, MATERIAL_COUNT_GOOD_TEST))
+
+
+def backoff(failures):
+    """
+    :param failures: Количество ошибок сценария подряд.
+    :return: Пауза перед повтором сценария в секундах со случайным разбросом, чтобы пользователи не повторяли
+    сценарии одновременно.
+    """
+    return min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (failures - 1)) * random.uniform(0.5, 1.0)
+
+
+def run_user(index, settings, http, statistics, limiter, deadline):
+    """
+    Сценарий виртуального пользователя: четные пользователи - пациенты, нечетные - врачи.
+    :param index: Номер пользователя.
+    :param settings: Настройки нагрузки.
+    :param http: Общий пул соединений.
+    :param statistics: Сбор статистики.
+    :param limiter: Ограничение частоты запросов.
+    :param deadline: Время окончания нагрузки по time.perf_counter.
+    """
+    user = VirtualUser(http, settings.base_url, statistics, limiter)
+    doctor = index % 2 == 1
+    failures = 0
+
+    while time.perf_counter() < deadline:
+        try:
+            if not user.signed_in:
+                login_flow(user, DOCTOR_DATA_LOGIN if doctor else EXISTING_PATIENT_DATA_LOGIN)
+            if doctor:
+                doctor_flow(user)
+            else:
+                booking_flow(user)
+            failures = 0
+        except Exception as error:
+            # Ошибки запросов уже учтены в статистике, остальные ошибки сценария учитываются отдельно. После паузы
+            # начинаем сценарий заново с входа: поток пользователя не должен завершаться до окончания нагрузки.
+            if not isinstance(error, (urllib3.exceptions.HTTPError, OSError, SessionExpired)):
+                statistics.add_error('error {}'.format(type(error).__name__))
+            user.sign_out()
+            failures += 1
+            time.sleep(min(backoff(failures), max(0.0, deadline - time.perf_counter())))
+
+
+def run_load(settings):
+    """
+    Запускает нагрузку: пользователи запускаются равномерно в течение времени разгона и работают до окончания теста.
+    :param settings: Настройки нагрузки (base_url, users, ramp_up, rps, duration).
+    :return: Отчет по конечным точкам.
+    """
+    http = urllib3.PoolManager(maxsize=max(1, settings.users), block=False)
+    statistics = Statistics()
+    limiter = RateLimiter(settings.rps)
+    deadline = time.perf_counter() + settings.duration
+
+    threads = []
+    for index in range(settings.users):
+        thread = threading.Thread(target=run_user, args=(index, settings, http, statistics, limiter, deadline),
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+        if settings.ramp_up and settings.users > 1:
+            time.sleep(min(settings.ramp_up / settings.users, max(0.0, deadline - time.perf_counter())))
+
+    for thread in threads:
+        thread.join()
+
+    http.clear()
+    return statistics.report()
+
+
+def print_report(report):
+    """
+    Печатает отчет в виде таблицы.
+    :param report: Отчет по конечным точкам.
+    """
+    columns = ['requests', 'errors', 'rps'] + ['p{}_ms'.format(percentile) for percentile in PERCENTILES]
+    print('{:<28}'.format('endpoint') + ''.join('{:>10}'.format(column) for column in columns))
+    for endpoint, row in report.items():
+        print('{:<28}'.format(endpoint) + ''.join('{:>10}'.format(row[column]) for column in columns))
+
+
+def parse_arguments(arguments=None):
+    """
+    Разбирает аргументы командной строки.
+    :param arguments: Аргументы или None для sys.argv.
+    :return: Настройки нагрузки.
+    """
+    parser = argparse.ArgumentParser(description='Нагрузочное тестирование dentistry-flask.')
+    parser.add_argument('--base-url', default=LINKS['INDEX_LINK'], help='адрес веб-сервиса')
+    parser.add_argument('--users', type=int, default=100, help='количество виртуальных пользователей')
+    parser.add_argument('--ramp-up', type=float, default=10, help='время запуска всех пользователей в секундах')
+    parser.add_argument('--rps', type=float, default=None, help='целевое количество запросов в секунду')
+    parser.add_argument('--duration', type=float, default=60, help='длительность нагрузки в секундах')
+    parser.add_argument('--report', default=None, help='путь к JSON файлу отчета')
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    load_settings = parse_arguments()
+    load_report = run_load(load_settings)
+    print_report(load_report)
+    if load_settings.report:
+        with open(load_settings.report, 'w', encoding='utf-8') as report_file:
+            json.dump(load_report, report_file, ensure_ascii=False, indent=2)
@@ -0,0 +1,498 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+import urllib3.exceptions
+
+from dentistry_drivers import DRIVER_MAX_USES, create_remote_driver, reset_driver
+
+# region Константы
+DRIVER_NODES = os.environ.get('DRIVER_NODES', '')
+"""Адреса удаленных серверов WebDriver через запятую, например, http://127.0.0.1:9515,http://127.0.0.1:9516=2
+(после = - количество сессий узла)."""
+
+NODE_CAPACITY = int(os.environ.get('DRIVER_NODE_CAPACITY', '1'))
+"""Количество сессий браузера узла, если оно не указано в адресе. Процессы pytest-xdist делят сессии узла между
+собой."""
+
+NODE_CHECK_TIMEOUT = 2.0
+"""Время ожидания ответа на проверку состояния узла в секундах."""
+
+NODE_RECHECK_SECONDS = 10.0
+"""Интервал, через который недоступный узел проверяется снова, в секундах."""
+
+NODE_WAIT_TIMEOUT = 300.0
+"""Время ожидания свободного доступного узла в секундах."""
+
+NODE_SPAWN_FAILURES = 3
+"""Количество неудачных открытий сессии подряд, после которого узел исключается до повторной проверки, даже если он
+отвечает на /status."""
+
+NODE_RETRIES = 1
+"""Количество повторов теста на другом узле, если узел теста перестал отвечать."""
+
+LATENCY_SMOOTHING = 0.2
+"""Вес нового измерения в экспоненциальном скользящем среднем задержки команд узла."""
+
+LOST_DRIVER_MESSAGES = ('chrome not reachable', 'disconnected', 'session deleted', 'target window already closed',
+                        'no such session', 'tab crashed')
+"""Фрагменты сообщений WebDriverException, означающих, что браузер или сервер WebDriver упал."""
+# endregion
+
+
+def parse_nodes(text, capacity=NODE_CAPACITY):
+    """
+    Разбирает список адресов узлов.
+    :param text: Адреса через запятую или пробел, у каждого может быть указано количество сессий после =.
+    :param capacity: Количество сессий узла по умолчанию.
+    :return: Список пар адрес, количество сессий.
+    """
+    nodes = []
+    for item in text.replace(',', ' ').split():
+        url, separator, size = item.rpartition('=')
+        nodes.append((url, int(size)) if separator and size.isdigit() else (item, capacity))
+    return nodes
+
+
+def node_share(capacity, workers, worker, index):
+    """
+    Возвращает часть сессий узла, которую открывает один процесс pytest-xdist. Остаток от деления достается разным
+    процессам на разных узлах, поэтому сумма частей всех процессов равна количеству сессий узла.
+    :param capacity: Количество сессий узла.
+    :param workers: Количество процессов pytest-xdist.
+    :param worker: Номер процесса.
+    :param index: Номер узла.
+    :return: Количество сессий процесса на узле.
+    """
+    return capacity // workers + (1 if (worker - index) % workers < capacity % workers else 0)
+
+
+def is_driver_lost(error):
+    """
+    Проверяет, вызвана ли ошибка теста падением браузера или сервера WebDriver, а не самим тестом.
+    :param error: Исключение теста.
+    :return: Потерян ли веб-драйвер.
+    """
+    while error is not None:
+        if isinstance(error, (InvalidSessionIdException, urllib3.exceptions.HTTPError, ConnectionError)):
+            return True
+        if isinstance(error, WebDriverException) and \
+                any(message in (error.msg or '').lower() for message in LOST_DRIVER_MESSAGES):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def quit_quietly(driver):
+    """
+    Завершает сессию, игнорируя ошибки недоступного узла.
+    :param driver: Веб-драйвер.
+    """
+    try:
+        driver.quit()
+    except (WebDriverException, urllib3.exceptions.HTTPError, OSError):
+        pass
+
+
+class RemoteNode:
+    """
+    Удаленный сервер WebDriver: свободные сессии, доступность, задержка команд и счетчики тестов.
+    """
+
+    def __init__(self, url, capacity):
+        """
+        :param url: Адрес сервера WebDriver.
+        :param capacity: Количество сессий, которые можно открыть на узле.
+        """
+        self.url = url.rstrip('/')
+        self.capacity = capacity
+        self.healthy = True
+        self.checked = 0.0
+        self.failures = 0
+        self.check_latency = None
+        self.latency = None
+        self.idle = []
+        self.tags = {}
+        self.uses = {}
+        self.busy = 0
+        self.sessions = 0
+        self.tests = 0
+        self.lost = 0
+        self.busy_seconds = 0.0
+        self.commands = 0
+        self.command_seconds = 0.0
+
+    @property
+    def size(self):
+        """
+        :return: Количество открытых сессий узла.
+        """
+        return self.busy + len(self.idle)
+
+    def available(self):
+        """
+        :return: Может ли узел выдать сессию: есть свободная или можно открыть новую.
+        """
+        return self.healthy and (self.idle or self.size < self.capacity)
+
+    def check(self, timeout=NODE_CHECK_TIMEOUT):
+        """
+        Проверяет доступность узла запросом /status и измеряет задержку ответа.
+        :param timeout: Время ожидания ответа в секундах.
+        :return: Доступен ли узел.
+        """
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(self.url + '/status', timeout=timeout) as response:
+                status = json.load(response).get('value') or {}
+            self.healthy = bool(status.get('ready', True))
+        except (urllib.error.URLError, OSError, ValueError):
+            self.healthy = False
+        self.check_latency = time.perf_counter() - start
+        self.checked = time.monotonic()
+        return self.healthy
+
+    def observe(self, seconds):
+        """
+        Учитывает выполненную на узле команду.
+        :param seconds: Время выполнения команды в секундах.
+        """
+        self.commands += 1
+        self.command_seconds += seconds
+        self.latency = seconds if self.latency is None else \
+            self.latency + LATENCY_SMOOTHING * (seconds - self.latency)
+
+    def stats(self):
+        """
+        :return: Показатели узла в виде словаря.
+        """
+        return {'capacity': self.capacity, 'healthy': self.healthy, 'sessions': self.sessions, 'tests': self.tests,
+                'lost': self.lost, 'busy_seconds': round(self.busy_seconds, 3), 'commands': self.commands,
+                'command_seconds': round(self.command_seconds, 6)}
+
+
+class NodePool:
+    """
+    Пул сессий браузера на нескольких удаленных серверах WebDriver. Тест получает сессию узла с наименьшей загрузкой
+    и задержкой команд; недоступный узел исключается до повторной проверки, а тесты переходят на другие узлы.
+    Интерфейс совпадает с dentistry_drivers.DriverPool, включая метки сессий.
+    """
+
+    def __init__(self, nodes, factory=create_remote_driver, max_uses=DRIVER_MAX_USES, offset=0, workers=1):
+        """
+        :param nodes: Список пар адрес, количество сессий.
+        :param factory: Функция, открывающая сессию по адресу узла.
+        :param max_uses: Количество выдач, после которого сессия открывается заново.
+        :param offset: Номер процесса pytest-xdist: сдвиг порядка узлов с одинаковой загрузкой, чтобы процессы
+        начинали с разных узлов.
+        :param workers: Количество процессов pytest-xdist, которые делят сессии узлов.
+        """
+        self.nodes = [RemoteNode(url, node_share(capacity, workers, offset, index))
+                      for index, (url, capacity) in enumerate(nodes)]
+        if not any(node.capacity for node in self.nodes):
+            raise ValueError('Сессий узлов WebDriver меньше, чем процессов pytest-xdist: {}'.format(workers))
+        self.factory = factory
+        self.max_uses = max_uses
+        self.offset = offset
+        self.owners = {}
+        self.acquired = {}
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+        self.started = time.monotonic()
+        self.closed = False
+
+    def start(self):
+        """
+        Проверяет доступность узлов.
+        :return: Пул.
+        """
+        for node in self.nodes:
+            node.check()
+        return self
+
+    def choose(self, tag, avoid):
+        """
+        Выбирает узел: сначала узел со свободной сессией нужной метки, затем наименее загруженный, затем с наименьшей
+        задержкой команд. Вызывается под блокировкой пула.
+        :param tag: Метка нужной сессии.
+        :param avoid: Узел, который выбирается, только если других нет.
+        :return: Узел или None, если свободных доступных узлов нет.
+        """
+        candidates = [node for node in self.nodes if node.capacity and node.available()]
+        if not candidates:
+            return None
+
+        def key(node):
+            index = self.nodes.index(node)
+            warm = tag is not None and any(node.tags.get(driver) == tag for driver in node.idle)
+            return (node is avoid, not warm, node.busy / node.capacity,
+                    node.latency if node.latency is not None else node.check_latency or 0.0,
+                    (index - self.offset) % len(self.nodes))
+
+        return min(candidates, key=key)
+
+    def recheck(self):
+        """
+        Повторно проверяет недоступные узлы, которые не проверялись NODE_RECHECK_SECONDS.
+        """
+        now = time.monotonic()
+        for node in self.nodes:
+            if not node.healthy and now - node.checked >= NODE_RECHECK_SECONDS:
+                node.check()
+
+    def spawn_failed(self, node):
+        """
+        Учитывает неудачное открытие сессии на узле. Узел, который не отвечает или не открыл сессию
+        NODE_SPAWN_FAILURES раз подряд, исключается до повторной проверки через NODE_RECHECK_SECONDS.
+        :param node: Узел.
+        """
+        node.failures += 1
+        if not node.check() or node.failures >= NODE_SPAWN_FAILURES:
+            with self.lock:
+                node.healthy = False
+                node.checked = time.monotonic()
+                node.failures = 0
+
+    def acquire(self, tag=None, avoid=None):
+        """
+        Выдает сессию браузера. Время ожидания NODE_WAIT_TIMEOUT проверяется перед каждой попыткой, в том числе после
+        неудачного открытия сессии.
+        :param tag: Метка сессии или None, если нужна сброшенная сессия.
+        :param avoid: Узел, сессия которого выдается, только если других узлов нет.
+        :return: Веб-драйвер.
+        """
+        if self.closed:
+            raise RuntimeError('Пул узлов WebDriver закрыт')
+
+        deadline = time.monotonic() + NODE_WAIT_TIMEOUT
+        last_error = None
+        while True:
+            if time.monotonic() >= deadline:
+                raise RuntimeError('Нет свободных доступных узлов WebDriver за {} с: {}'.format(
+                    NODE_WAIT_TIMEOUT, ', '.join(node.url for node in self.nodes))) from last_error
+
+            with self.released:
+                node = self.choose(tag, avoid)
+                driver = None
+                if node is not None:
+                    node.busy += 1
+                    if node.idle:
+                        driver = next((idle for idle in node.idle if node.tags.get(idle) == tag),
+                                      next((idle for idle in node.idle if node.tags.get(idle) is None),
+                                           node.idle[0]))
+                        node.idle.remove(driver)
+                else:
+                    self.released.wait(max(min(NODE_RECHECK_SECONDS, deadline - time.monotonic()), 0))
+
+            if node is None:
+                self.recheck()
+                continue
+
+            try:
+                if driver is None:
+                    driver = self.spawn(node)
+                elif node.tags.get(driver) not in (None, tag):
+                    # Сессия хранит вход другой роли.
+                    reset_driver(driver)
+            except (WebDriverException, urllib3.exceptions.HTTPError, OSError) as error:
+                last_error = error
+                with self.lock:
+                    node.busy -= 1
+                if driver is not None:
+                    self.discard(node, driver)
+                self.spawn_failed(node)
+                continue
+
+            with self.lock:
+                node.failures = 0
+                node.tags[driver] = None
+                node.uses[driver] = node.uses.get(driver, 0) + 1
+                self.acquired[driver] = time.monotonic()
+            return driver
+
+    def spawn(self, node):
+        """
+        Открывает новую сессию на узле. Время выполнения команд сессии учитывается в задержке узла.
+        :param node: Узел.
+        :return: Веб-драйвер.
+        """
+        driver = self.factory(node.url)
+        execute = driver.execute
+
+        def observed_execute(driver_command, params=None):
+            start = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                node.observe(time.perf_counter() - start)
+
+        driver.execute = observed_execute
+        with self.lock:
+            self.owners[driver] = node
+            node.sessions += 1
+        return driver
+
+    def discard(self, node, driver):
+        """
+        Закрывает сессию и удаляет ее из пула.
+        :param node: Узел сессии.
+        :param driver: Веб-драйвер.
+        """
+        with self.lock:
+            self.owners.pop(driver, None)
+            node.tags.pop(driver, None)
+            node.uses.pop(driver, None)
+        quit_quietly(driver)
+
+    def release(self, driver, broken=False, tag=None):
+        """
+        Возвращает сессию в пул. Сессия упавшего теста закрывается; если при этом узел не отвечает, он исключается
+        вместе со всеми свободными сессиями до повторной проверки.
+        :param driver: Веб-драйвер.
+        :param broken: Упал ли веб-драйвер во время теста.
+        :param tag: Метка, с которой сессия возвращается без сброса, или None, чтобы сбросить ее.
+        """
+        with self.lock:
+            # Сессия, уже удаленная из пула (например, при повторном возврате), пропускается, как в DriverPool.
+            node = self.owners.pop(driver, None)
+            if node is None:
+                return
+            node.busy -= 1
+            node.tests += 1
+            node.busy_seconds += time.monotonic() - self.acquired.pop(driver, time.monotonic())
+
+        keep = not self.closed and not broken and node.uses.get(driver, self.max_uses) < self.max_uses
+        if keep and tag is None:
+            try:
+                reset_driver(driver)
+            except (WebDriverException, urllib3.exceptions.HTTPError, OSError):
+                keep, broken = False, True
+
+        if keep:
+            with self.released:
+                # Пока сессия сбрасывалась, пул мог быть закрыт: тогда она закрывается, а не возвращается.
+                if not self.closed:
+                    self.owners[driver] = node
+                    node.tags[driver] = tag
+                    node.idle.append(driver)
+                    self.released.notify()
+                    return
+
+        self.discard(node, driver)
+        if broken and not node.check():
+            with self.lock:
+                node.lost += 1
+                idle, node.idle = node.idle, []
+            for idle_driver in idle:
+                self.discard(node, idle_driver)
+        with self.released:
+            self.released.notify()
+
+    def replace(self, driver, tag=None):
+        """
+        Заменяет упавшую сессию сессией другого узла, если он есть.
+        :param driver: Упавший веб-драйвер.
+        :param tag: Метка нужной сессии.
+        :return: Новый веб-драйвер.
+        """
+        node = self.owners.get(driver)
+        self.release(driver, broken=True)
+        return self.acquire(tag, avoid=node)
+
+    def close(self):
+        """
+        Закрывает все сессии пула.
+        """
+        self.closed = True
+        with self.lock:
+            owners = list(self.owners.items())
+            for node in self.nodes:
+                node.idle = []
+        for driver, node in owners:
+            self.discard(node, driver)
+
+    def stats(self):
+        """
+        :return: Показатели узлов: словарь адрес -> показатели, и время работы пула в секундах под ключом seconds.
+        """
+        return {'seconds': round(time.monotonic() - self.started, 3),
+                'nodes': {node.url: node.stats() for node in self.nodes}}
+
+
+class DriverLease:
+    """
+    Веб-драйвер, выданный тесту пулом. Если браузер или узел теста упал, веб-драйвер заменяется новым.
+    """
+
+    def __init__(self, pool, tag=None, prepare=None):
+        """
+        :param pool: Пул веб-драйверов: DriverPool или NodePool.
+        :param tag: Метка веб-драйвера.
+        :param prepare: Функция от нового веб-драйвера, вызываемая перед тестом, или None.
+        """
+        self.pool = pool
+        self.tag = tag
+        self.prepare = prepare
+        self.moves = 0
+        self.driver = self.pool.acquire(tag)
+        if self.prepare is not None:
+            self.prepare(self.driver)
+
+    def move(self):
+        """
+        Заменяет упавший веб-драйвер.
+        :return: Новый веб-драйвер.
+        """
+        self.moves += 1
+        self.driver = self.pool.replace(self.driver, self.tag)
+        if self.prepare is not None:
+            self.prepare(self.driver)
+        return self.driver
+
+    def release(self, broken=False, tag=None):
+        """
+        Возвращает веб-драйвер в пул.
+        :param broken: Упал ли веб-драйвер.
+        :param tag: Метка, с которой веб-драйвер возвращается без сброса.
+        """
+        self.pool.release(self.driver, broken=broken, tag=tag)
+
+
+def merge_stats(stats):
+    """
+    Объединяет показатели пулов нескольких процессов pytest-xdist.
+    :param stats: Список результатов NodePool.stats.
+    :return: Объединенные показатели.
+    """
+    merged = {'seconds': 0.0, 'nodes': {}}
+    for pool_stats in stats:
+        merged['seconds'] = max(merged['seconds'], pool_stats['seconds'])
+        for url, node_stats in pool_stats['nodes'].items():
+            total = merged['nodes'].setdefault(url, dict(node_stats, capacity=0, healthy=True, sessions=0, tests=0,
+                                                         lost=0, busy_seconds=0.0, commands=0,
+                                                         command_seconds=0.0))
+            total['healthy'] = total['healthy'] and node_stats['healthy']
+            for name in ('capacity', 'sessions', 'tests', 'lost', 'busy_seconds', 'commands', 'command_seconds'):
+                total[name] += node_stats[name]
+    return merged
+
+
+def stats_lines(stats):
+    """
+    :param stats: Показатели узлов.
+    :return: Строки отчета для итогов pytest: тесты, пропускная способность и задержка команд каждого узла.
+    """
+    minutes = stats['seconds'] / 60 or 1.0
+    lines = []
+    for url, node in stats['nodes'].items():
+        latency = node['command_seconds'] / node['commands'] * 1000 if node['commands'] else 0.0
+        lines.append('{}: {}, открыто сессий {} (одновременно до {}), тестов {} ({:.1f} в минуту), занят {:.1f} с, '
+                     'команд {} (в среднем {:.1f} мс), потерь узла {}'.format(
+                         url, 'доступен' if node['healthy'] else 'недоступен', node['sessions'], node['capacity'],
+                         node['tests'], node['tests'] / minutes, node['busy_seconds'], node['commands'], latency,
+                         node['lost']))
+    return lines
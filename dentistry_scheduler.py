@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+# region Константы
+REQUIRES_MARKER = 'requires'
+"""Маркер требований теста: @pytest.mark.requires(role, page, mutates=False)."""
+
+ANONYMOUS_ROLE = 'anonymous'
+"""Роль теста без входа: ему выдается сброшенный веб-драйвер."""
+
+LOGIN_NAVIGATIONS = 2
+"""Переходы одного входа: при входе через форму - страница входа и отправка формы, при восстановлении сохраненной
+сессии - главная страница до и после добавления cookie."""
+# endregion
+
+Requirements = namedtuple('Requirements', ['role', 'page', 'mutates'])
+"""Требования теста: роль пользователя, ключ начальной страницы в LINKS и изменяет ли тест состояние веб-сервиса."""
+
+UNKNOWN_REQUIREMENTS = Requirements(None, None, True)
+"""Требования теста без маркера: сброшенный веб-драйвер и восстановление состояния после теста."""
+
+
+def requirements(item):
+    """
+    Возвращает требования теста из маркера requires.
+    :param item: Тест pytest.
+    :return: Требования теста.
+    """
+    marker = item.get_closest_marker(REQUIRES_MARKER)
+    if marker is None:
+        return UNKNOWN_REQUIREMENTS
+    values = dict(zip(Requirements._fields, marker.args), **marker.kwargs)
+    return Requirements(values.get('role'), values.get('page'), values.get('mutates', False))
+
+
+def is_signed_in(role):
+    """
+    :param role: Роль теста.
+    :return: Выполняет ли тест вход, сессию которого можно сохранить для следующего теста.
+    """
+    return role not in (None, ANONYMOUS_ROLE)
+
+
+def schedule(items):
+    """
+    Упорядочивает тесты: тесты одной роли выполняются подряд, внутри роли - тесты одной начальной страницы, сначала
+    не изменяющие состояние, затем изменяющие в исходном порядке. Роли и страницы упорядочены по первому появлению,
+    поэтому тест, не изменяющий состояние, не переносится после изменяющего теста той же страницы.
+    :param items: Тесты в исходном порядке.
+    :return: Тесты в новом порядке.
+    """
+    roles = {}
+    pages = {}
+    keys = {}
+    for index, item in enumerate(items):
+        required = requirements(item)
+        role = roles.setdefault(required.role, len(roles))
+        page = pages.setdefault((required.role, required.page), len(pages))
+        keys[item] = (role, page, required.mutates, index)
+    return sorted(items, key=keys.__getitem__)
+
+
+def estimate(plan, warm):
+    """
+    Оценивает количество входов и переходов для последовательности тестов. Каждый тест переходит на свою начальную
+    страницу, а каждый вход добавляет LOGIN_NAVIGATIONS переходов. Как и в cached_login, через форму выполняется
+    только первый вход каждой роли, следующие восстанавливают сессию из кэша сессий.
+    :param plan: Требования тестов в порядке выполнения.
+    :param warm: Сохраняется ли сессия в веб-драйвере между тестами одной роли. Без сохранения каждый тест с входом
+    входит заново.
+    :return: Количество входов через форму, количество восстановлений сессии и количество переходов.
+    """
+    logins = restores = navigations = 0
+    cached = set()
+    previous = None
+    for required in plan:
+        if is_signed_in(required.role) and not (warm and previous is not None and previous.role == required.role):
+            if required.role in cached:
+                restores += 1
+            else:
+                logins += 1
+                cached.add(required.role)
+            navigations += LOGIN_NAVIGATIONS
+        if required.page is not None:
+            navigations += 1
+        previous = required
+    return logins, restores, navigations
+
+
+class ScheduleReport:
+    """
+    Оценка экономии входов и переходов от упорядочивания тестов. В обоих порядках учитывается кэш сессий, поэтому
+    экономия - только от сохранения сессии в веб-драйвере между тестами одной роли.
+    """
+
+    def __init__(self, original, scheduled):
+        """
+        :param original: Тесты в исходном порядке.
+        :param scheduled: Тесты в новом порядке.
+        """
+        plan = [requirements(item) for item in scheduled]
+        self.tests = len(plan)
+        # Отчет имеет смысл, только если есть тесты со входом или начальной страницей, например, не для unit-тестов.
+        self.relevant = any(is_signed_in(required.role) or required.page is not None for required in plan)
+        self.before = estimate(map(requirements, original), warm=False)
+        self.after = estimate(plan, warm=True)
+
+    def lines(self):
+        """
+        :return: Строки отчета для итогов pytest.
+        """
+        titles = ('входов через форму', 'восстановлений сессии', 'переходов')
+        return ['тестов: {}'.format(self.tests)] + [
+            '{}: {} -> {} (сэкономлено {})'.format(title, before, after, before - after)
+            for title, before, after in zip(titles, self.before, self.after)]
@@ -1,9 +1,19 @@
 from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
-from bs4 import BeautifulSoup
 from selenium.webdriver.chrome.service import Service
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
+import functools
+from dentistry_wait import NEGATIVE_WAIT_TIMEOUT, find_element, find_optional_element, row_count_stable, \
+    text_present, wait_for, wait_page_changed
+import hashlib
+from html import unescape
+from html.parser import HTMLParser
+import os
+import time
+import weakref
 
 # region Константы
 LINKS = {'INDEX_LINK': 'http://127.0.0.1:5000/', 'LOGIN_LINK': 'login', 'REGISTRATION_LINK': 'register',
@@ -17,41 +27,1053 @@ DATE_TIME_FORMAT = '%d.%m.%Y %H:%M'
 
 TIME_DELTA_DIFF = 3
 """Количество минут для допустимой разницы между объектами datetime при их сравнении."""
+
+SESSION_CHECK_TEXT = 'Выход'
+"""Текст, по наличию которого на странице определяется, что пользователь авторизован."""
+
+SESSION_CHECK_LOCATOR = (By.TAG_NAME, 'body')
+"""Элемент, в видимом тексте которого ищется SESSION_CHECK_TEXT."""
+
+TABLE_ROWS_SELECTOR = 'table > tbody > tr'
+"""CSS селектор строк таблиц страницы."""
+
+TABLE_ROWS_SCRIPT = """
+return Array.prototype.map.call(document.querySelectorAll(arguments[0]), function (row) {
+    var cells = row.querySelectorAll(':scope > td');
+    return {element: row, cells: Array.prototype.map.call(cells, function (cell) { return cell.innerText.trim(); })};
+});
+"""
+"""Скрипт, возвращающий за один вызов строки таблицы вместе с текстами их ячеек."""
+
+SUBMIT_ID = 'submit'
+"""Идентификатор кнопки отправки форм."""
+
+FORM_FIELDS = {'LOGIN_LINK': ('tel_no', 'password'),
+               'REGISTRATION_LINK': ('surname', 'user_name', 'middle_name', 'birth_date', 'tel_no', 'email', 'password',
+                                     'password2'),
+               'NEW_APPOINTMENT_LINK': ('select_service', 'select_doctors', 'appointment_date', 'select_time',
+                                        'select_patient'),
+               'BILLS_LINK': ('select_appointments',),
+               'MEDICAL_HISTORY_LINK': ('select_patient', 'history_text'),
+               'COST_ACCOUNTING_LINK': ('select_material', 'amount')}
+"""Идентификаторы полей форм страниц веб-сервиса."""
+
+FILL_FORM_SCRIPT = """
+var values = arguments[0], submitId = arguments[1], missing = [], submitted = false;
+Object.keys(values).forEach(function (id) {
+    var element = document.getElementById(id), value = values[id];
+    if (!element) {
+        missing.push(id);
+        return;
+    }
+    if (element.tagName === 'SELECT') {
+        var option = Array.prototype.find.call(element.options, function (option) {
+            return option.text.replace(/\\s+/g, ' ').trim() === value;
+        });
+        if (!option) {
+            missing.push(id);
+            return;
+        }
+        option.selected = true;
+    } else {
+        var date = /^(\\d{2})\\.(\\d{2})\\.(\\d{4})$/.exec(value);
+        element.value = element.type === 'date' && date ? date[3] + '-' + date[2] + '-' + date[1] : value;
+    }
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+});
+if (missing.length === 0 && submitId) {
+    var form = document.getElementById(submitId).form;
+    if (form.dispatchEvent(new Event('submit', {bubbles: true, cancelable: true}))) {
+        // Кнопка с name="submit" заменяет метод form.submit, поэтому вызывается метод прототипа.
+        HTMLFormElement.prototype.submit.call(form);
+        submitted = true;
+    }
+}
+return {missing: missing, root: document.documentElement, submitted: submitted};
+"""
+"""Скрипт заполнения полей формы и ее отправки за один вызов. Поля выбора заполняются по видимому тексту варианта,
+а для каждого поля генерируются события input и change. Значение поля ввода заменяется, а не дописывается к
+текущему, как при send_keys. Если обработчик события submit отменил отправку, смены страницы не ожидается."""
+
+SELECT_OPTIONS_SCRIPT = """
+return Array.prototype.map.call(arguments[0].options, function (option) {
+    return option.text.replace(/\\s+/g, ' ').trim();
+});
+"""
+"""Скрипт, возвращающий за один вызов нормализованные тексты всех вариантов поля выбора."""
+
+SELECT_OPTION_SCRIPT = """
+var select = arguments[0], option = select.options[arguments[1]];
+if (!option || option.text.replace(/\\s+/g, ' ').trim() !== arguments[2]) {
+    return false;
+}
+option.selected = true;
+select.dispatchEvent(new Event('input', {bubbles: true}));
+select.dispatchEvent(new Event('change', {bubbles: true}));
+return true;
+"""
+"""Скрипт выбора варианта по номеру. Если текст варианта не совпадает с ожидаемым (варианты изменились скриптом
+страницы), вариант не выбирается."""
+
+PARSED_TABLES_CACHE_SIZE = 32
+"""Количество разобранных таблиц, хранящихся в кэше."""
+
+SCAN_CHUNK_SIZE = 64 * 1024
+"""Размер фрагмента html документа, передаваемого потоковому сканеру компактного получения за один раз."""
+
+CAPTURE_MODES = ('compact', 'raw')
+"""Режимы получения страниц, результаты которых проверяют тесты: compact - при получении страницы из нее извлекаются
+только нужные строки таблицы и текст вне таблиц, raw - страница хранится целиком для отладки."""
+
+CAPTURE_MODE = os.environ.get('CAPTURE_MODE', 'compact')
+"""Текущий режим получения страниц из CAPTURE_MODES."""
+
+CAPTURE_SKIPPED_TAGS = ('script', 'style', 'template')
+"""Элементы, текст которых не входит в текст страницы при компактном получении."""
+
+CAPTURE_VALUE_INPUTS = ('submit', 'button', 'reset')
+"""Типы полей ввода, надпись (value) которых входит в текст страницы при компактном получении."""
+# endregion
+
+# region Кэш разобранных таблиц
+PARSED_TABLES = OrderedDict()
+"""Разобранные таблицы страниц, ключ - хэш содержимого страницы."""
+# endregion
+
+# region Состояние веб-драйверов
+DRIVER_STATES = weakref.WeakKeyDictionary()
+"""Отслеживаемое на стороне клиента состояние веб-драйверов."""
 # endregion
 
+# region Обработчики вызовов помощников
+HELPER_HOOKS = []
+"""Обработчики вызовов помощников: функции hook(name, call), которые должны вызвать call() и вернуть его результат."""
+# endregion
+
+# region Кэш сессий
+SESSION_CACHE = {}
+"""Сохраненные cookie сессий Flask, ключ - (адрес сервиса, номер телефона, пароль)."""
+# endregion
+
+
+def helper(func):
+    """
+    Декоратор публичных помощников модуля: передает вызов через обработчики HELPER_HOOKS (измерения, запись снимков).
+    Без обработчиков помощник вызывается напрямую.
+    :param func: Помощник.
+    :return: Обернутый помощник.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not HELPER_HOOKS:
+            return func(*args, **kwargs)
+
+        call = functools.partial(func, *args, **kwargs)
+        for hook in reversed(HELPER_HOOKS):
+            call = functools.partial(hook, func.__name__, call)
+        return call()
+
+    return wrapper
+
+
+def set_base_url(base_url):
+    """
+    Меняет адрес веб-сервиса, например, на адрес запущенного в процессе заменителя dentistry-flask.
+    :param base_url: Адрес веб-сервиса.
+    """
+    LINKS['INDEX_LINK'] = base_url.rstrip('/') + '/'
+
+
+def set_capture_mode(mode):
+    """
+    Меняет режим получения страниц, например, на raw для отладки.
+    :param mode: Режим из CAPTURE_MODES.
+    """
+    if mode not in CAPTURE_MODES:
+        raise ValueError('Неизвестный режим получения страниц: {}'.format(mode))
+    global CAPTURE_MODE
+    CAPTURE_MODE = mode
+
+
+@helper
+def current_time():
+    """
+    Текущее время для сравнения с датами записей. Помощник, чтобы при воспроизведении снимков использовалось время
+    записи.
+    :return: Текущие дата и время.
+    """
+    return datetime.now()
+
+
+class DriverState:
+    """
+    Состояние веб-драйвера, отслеживаемое на стороне клиента, чтобы не запрашивать его у драйвера повторно.
+    """
+
+    def __init__(self):
+        self.url = None
+        """Текущая ссылка или None, если она неизвестна (например, после отправки формы)."""
+        self.select_indexes = {}
+        """Индексы вариантов полей выбора текущей страницы, ключ - идентификатор поля."""
+        self.elements = {}
+        """Найденные элементы текущей страницы, ключ - идентификатор элемента."""
+        self.session = None
+        """Ключ кэша сессий пользователя, вошедшего в веб-драйвере через cached_login, или None."""
+
+    def page_replaced(self, url=None):
+        """
+        Сбрасывает сведения о прежней странице после перехода на новую.
+        :param url: Ссылка новой страницы или None, если она неизвестна.
+        """
+        self.url = url
+        self.select_indexes.clear()
+        self.elements.clear()
+
+
+class PageSnapshot:
+    """
+    Отложенный снимок содержимого страницы: page_source запрашивается у веб-драйвера только при первом чтении снимка,
+    поэтому результат помощника, который никто не читает, не стоит ни одной команды. Снимок нужно читать до следующего
+    действия с веб-драйвером: прочитанный позже снимок содержит уже новую страницу.
+    """
+
+    def __init__(self, driver):
+        """
+        :param driver: Веб-драйвер.
+        """
+        self.driver = driver
+        self.source = None
+
+    def resolve(self):
+        """
+        Возвращает содержимое страницы, запрашивая его у веб-драйвера при первом обращении.
+        :return: Содержимое страницы в виде str.
+        """
+        if self.source is None:
+            self.source = self.driver.page_source
+            self.driver = None
+        return self.source
+
+    def __str__(self):
+        return self.resolve()
+
+    def __repr__(self):
+        return 'PageSnapshot({})'.format('...' if self.source is None else repr(self.source[:60]))
+
+    def __contains__(self, text):
+        return text in self.resolve()
+
+    def __getitem__(self, index):
+        return self.resolve()[index]
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def count(self, text):
+        return self.resolve().count(text)
+
+
+def parse_int(text):
+    """
+    :param text: Текст ячейки.
+    :return: Целое число или None, если текст не является числом.
+    """
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def parse_date(text):
+    """
+    :param text: Текст ячейки в формате DATE_TIME_FORMAT.
+    :return: Дата или None, если текст не является датой.
+    """
+    try:
+        return datetime.strptime(text, DATE_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def amount_matches(amount, count):
+    """
+    Проверяет количество строки так же, как поиск по тексту страницы: текст количества содержит искомое количество.
+    :param amount: Количество строки - текст ячейки или уже разобранное число.
+    :param count: Искомое количество.
+    :return: Совпадает ли количество. Пустое или неразборчивое количество ни с чем не совпадает.
+    """
+    return amount is not None and str(count) in str(amount)
+
+
+class Record:
+    """
+    Строка таблицы с уже разобранными значениями ячеек. Хранит только значения, без словаря атрибутов.
+    """
+
+    __slots__ = ()
+    converters = ()
+    """Функции разбора ячеек по порядку полей __slots__."""
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_cells(cls, cells):
+        """
+        :param cells: Тексты ячеек строки, недостающие ячейки считаются пустыми.
+        :return: Строка таблицы.
+        """
+        cells = tuple(cells) + ('',) * (len(cls.__slots__) - len(cells))
+        return cls(*(convert(cell.strip()) for convert, cell in zip(cls.converters, cells)))
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(map(repr, self)))
+
+
+class MaterialRecord(Record):
+    """Строка страницы учета расходов."""
+
+    __slots__ = ('number', 'name', 'amount')
+    converters = (parse_int, str, parse_int)
+
+
+class OrderRecord(Record):
+    """Строка страницы заказов."""
+
+    __slots__ = ('number', 'author', 'material', 'amount', 'date')
+    converters = (parse_int, str, str, parse_int, parse_date)
+
+
+class MedicalHistoryRecord(Record):
+    """Строка страницы медицинской истории."""
+
+    __slots__ = ('author', 'patient', 'date', 'diagnosis')
+    converters = (str, str, parse_date, str)
+
+
+class CompactPage:
+    """
+    Результат компактного получения страницы: текст страницы вне таблиц и нужные строки таблицы. Размер не зависит от
+    размера страницы, сама страница после получения не хранится.
+    """
+
+    __slots__ = ('text', 'rows')
+
+    def __init__(self, text, rows=()):
+        """
+        :param text: Текст страницы вне таблиц.
+        :param rows: Строки таблицы - объекты Record.
+        """
+        self.text = text
+        self.rows = tuple(rows)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return 'CompactPage({!r}, rows={})'.format(self.text[:60], len(self.rows))
+
+    def __contains__(self, text):
+        # Тексты для проверки html документа могут быть записаны с мнемониками, например, &lt;.
+        return unescape(text) in self.text
+
+    def __len__(self):
+        return len(self.text)
+
+    def count(self, text):
+        return self.text.count(unescape(text))
+
+
+def driver_state(driver):
+    """
+    Возвращает отслеживаемое состояние веб-драйвера.
+    :param driver: Веб-драйвер.
+    :return: Состояние веб-драйвера.
+    """
+    state = DRIVER_STATES.get(driver)
+    if state is None:
+        state = DRIVER_STATES[driver] = DriverState()
+    return state
+
+
+def forget_driver_state(driver):
+    """
+    Сбрасывает отслеживаемое состояние веб-драйвера, например, после его сброса между тестами.
+    :param driver: Веб-драйвер.
+    """
+    DRIVER_STATES.pop(driver, None)
+
+
+def navigate(driver, url):
+    """
+    Переходит по ссылке и запоминает ее как текущую без запроса current_url у веб-драйвера.
+    :param driver: Веб-драйвер.
+    :param url: Ссылка.
+    :return: Веб-драйвер.
+    """
+    driver.get(url)
+    driver_state(driver).page_replaced(url)
+    return driver
+
+
+def submit_element(driver, element):
+    """
+    Отправляет форму элемента и дожидается ухода со страницы. Если при этом сменилась ссылка, запоминается новая
+    ссылка, иначе она считается неизвестной и запрашивается у веб-драйвера при следующей проверке check_url.
+    :param driver: Веб-драйвер.
+    :param element: Элемент формы.
+    """
+    state = driver_state(driver)
+    previous_url = state.url
+    element.submit()
+    changed = wait_page_changed(driver, element, previous_url)
+    state.page_replaced(changed if isinstance(changed, str) else None)
+
 
 def check_url(driver, current_url_check):
     """
     Проверяет, находится ли веб-драйвер на указанной странице, если нет, то переходит по этой ссылке.
+    Текущая ссылка запоминается при переходе и запрашивается у веб-драйвера, только если она неизвестна на стороне
+    клиента, например, после отправки формы.
     :param driver: Веб-драйвер для проверки.
     :param current_url_check: Ссылка для проверки.
     :return: Веб-драйвер.
     """
-    if driver.current_url != current_url_check:
-        driver.get(current_url_check)
+    state = driver_state(driver)
+    if state.url is None:
+        state.url = driver.current_url
+
+    if state.url != current_url_check:
+        navigate(driver, current_url_check)
 
     return driver
 
 
-def login(driver, telno, password):
+def cached_element(driver, element_id):
+    """
+    Находит элемент по идентификатору один раз за посещение страницы: повторные обращения на той же странице
+    возвращают найденный ранее элемент.
+    :param driver: Веб-драйвер.
+    :param element_id: Идентификатор элемента.
+    :return: Элемент.
+    """
+    elements = driver_state(driver).elements
+    if element_id not in elements:
+        elements[element_id] = find_element(driver, By.ID, element_id)
+    return elements[element_id]
+
+
+def with_element(driver, element_id, action):
+    """
+    Выполняет действие с запомненным элементом. Если элемент удален из DOM (например, перерисован скриптом
+    страницы), он находится заново, и действие повторяется один раз.
+    :param driver: Веб-драйвер.
+    :param element_id: Идентификатор элемента.
+    :param action: Функция от элемента.
+    :return: Результат действия.
+    """
+    try:
+        return action(cached_element(driver, element_id))
+    except StaleElementReferenceException:
+        driver_state(driver).elements.pop(element_id, None)
+        return action(cached_element(driver, element_id))
+
+
+def fill_form(driver, values, submit_id=None, keystrokes=False):
+    """
+    Заполняет поля формы и, если указана кнопка, отправляет форму. По умолчанию все поля заполняются одним вызовом
+    execute_script с генерацией событий input и change, и значение поля заменяет его текущее значение. В режиме
+    keystrokes значения вводятся с клавиатуры по одному полю и, как при send_keys, дописываются к текущему значению.
+    :param driver: Веб-драйвер.
+    :param values: Словарь идентификатор поля -> значение (для полей выбора - видимый текст варианта).
+    :param submit_id: Идентификатор кнопки отправки формы или None, если форму отправлять не нужно.
+    :param keystrokes: Вводить ли значения с клавиатуры.
+    :return: Веб-драйвер.
+    """
+    values = {field_id: str(value) for field_id, value in values.items()}
+
+    if keystrokes:
+        for field_id, value in values.items():
+            with_element(driver, field_id, lambda element: Select(element).select_by_visible_text(value)
+                         if element.tag_name == 'select' else element.send_keys(value))
+        if submit_id:
+            with_element(driver, submit_id, lambda element: submit_element(driver, element))
+        return driver
+
+    result = driver.execute_script(FILL_FORM_SCRIPT, values, submit_id)
+    if result['missing']:
+        raise NoSuchElementException('Не найдены поля формы или варианты выбора: {}'.format(
+            ', '.join(result['missing'])))
+
+    if result['submitted']:
+        state = driver_state(driver)
+        changed = wait_page_changed(driver, result['root'], state.url)
+        state.page_replaced(changed if isinstance(changed, str) else None)
+
+    return driver
+
+
+class SelectIndex:
+    """
+    Индекс вариантов поля выбора: поле берется из кэша элементов страницы (и при первом обращении ожидается его
+    появление), тексты всех вариантов получаются одним вызовом execute_script, поиск выполняется в памяти, а выбранный
+    вариант выбирается по номеру еще одним вызовом.
+    """
+
+    def __init__(self, driver, select_id):
+        """
+        :param driver: Веб-драйвер.
+        :param select_id: Идентификатор поля выбора.
+        """
+        self.driver = driver
+        self.select_id = select_id
+        self.element, self.texts = with_element(
+            driver, select_id, lambda element: (element, driver.execute_script(SELECT_OPTIONS_SCRIPT, element)))
+        self.positions = {}
+        """Номер первого варианта с указанным текстом."""
+        for position, text in enumerate(self.texts):
+            self.positions.setdefault(text, position)
+        self.containing = {}
+        """Запомненные результаты поиска по подстрокам."""
+
+    def position_of(self, text):
+        """
+        :param text: Видимый текст варианта.
+        :return: Номер варианта или None.
+        """
+        return self.positions.get(' '.join(str(text).split()))
+
+    def position_containing(self, *parts):
+        """
+        :param parts: Подстроки текста варианта.
+        :return: Номер первого варианта, текст которого содержит все подстроки, или None.
+        """
+        if parts not in self.containing:
+            self.containing[parts] = next((position for position, text in enumerate(self.texts)
+                                           if all(part in text for part in parts)), None)
+        return self.containing[parts]
+
+    def select(self, position):
+        """
+        Выбирает вариант по номеру.
+        :param position: Номер варианта.
+        :return: Выбран ли вариант: False, если варианты поля изменились после построения индекса.
+        """
+        return self.driver.execute_script(SELECT_OPTION_SCRIPT, self.element, position, self.texts[position])
+
+
+def select_index(driver, select_id):
+    """
+    Возвращает индекс вариантов поля выбора текущей страницы, строя его при первом обращении.
+    :param driver: Веб-драйвер.
+    :param select_id: Идентификатор поля выбора.
+    :return: Индекс вариантов.
+    """
+    indexes = driver_state(driver).select_indexes
+    if select_id not in indexes:
+        indexes[select_id] = SelectIndex(driver, select_id)
+    return indexes[select_id]
+
+
+def select_option(driver, select_id, find):
+    """
+    Выбирает вариант поля выбора, найденный по индексу. Если индекс устарел (страница или варианты изменились),
+    он строится заново, а если поле удалено из DOM, оно находится заново.
+    :param driver: Веб-драйвер.
+    :param select_id: Идентификатор поля выбора.
+    :param find: Функция поиска номера варианта в индексе.
+    :return: Выбран ли вариант.
+    """
+    for attempt in range(2):
+        index = select_index(driver, select_id)
+        position = find(index)
+        try:
+            if position is not None and index.select(position):
+                return True
+        except StaleElementReferenceException:
+            driver_state(driver).elements.pop(select_id, None)
+        if attempt == 0:
+            driver_state(driver).select_indexes.pop(select_id, None)
+    return False
+
+
+def select_by_visible_text(driver, select_id, text):
+    """
+    Выбирает вариант поля выбора по видимому тексту.
+    :param driver: Веб-драйвер.
+    :param select_id: Идентификатор поля выбора.
+    :param text: Видимый текст варианта.
+    """
+    if not select_option(driver, select_id, lambda index: index.position_of(text)):
+        raise NoSuchElementException('Вариант {} поля выбора {} не найден'.format(text, select_id))
+
+
+def select_containing(driver, select_id, *parts):
+    """
+    Выбирает первый вариант поля выбора, текст которого содержит все подстроки.
+    :param driver: Веб-драйвер.
+    :param select_id: Идентификатор поля выбора.
+    :param parts: Подстроки текста варианта.
+    :return: Выбран ли вариант.
+    """
+    return select_option(driver, select_id, lambda index: index.position_containing(*parts))
+
+
+class Page:
+    """
+    Объект страницы веб-сервиса: переход на страницу и действия с ее элементами. Найденные элементы запоминаются до
+    ухода со страницы, поэтому несколько шагов на одной странице ищут каждый элемент один раз.
+    """
+
+    link = 'INDEX_LINK'
+    """Ключ ссылки страницы в LINKS."""
+    record_type = None
+    """Тип строк таблицы страницы для компактного получения или None, если таблица входит в текст страницы."""
+
+    def __init__(self, driver):
+        """
+        :param driver: Веб-драйвер.
+        """
+        self.driver = driver
+
+    @property
+    def url(self):
+        """
+        :return: Ссылка страницы.
+        """
+        return LINKS['INDEX_LINK'] + (LINKS[self.link] if self.link != 'INDEX_LINK' else '')
+
+    def open(self):
+        """
+        Переходит на страницу, если веб-драйвер находится на другой странице.
+        :return: Объект страницы.
+        """
+        check_url(self.driver, self.url)
+        return self
+
+    def load(self):
+        """
+        Загружает страницу заново, даже если веб-драйвер уже находится на ней.
+        :return: Объект страницы.
+        """
+        navigate(self.driver, self.url)
+        return self
+
+    def snapshot(self):
+        """
+        :return: Снимок содержимого страницы.
+        """
+        return PageSnapshot(self.driver)
+
+    def capture(self, predicate=None):
+        """
+        Получает текущую страницу в режиме CAPTURE_MODE.
+        :param predicate: Условие отбора строк таблицы (функция от Record) или None, чтобы сохранить все строки.
+        :return: Результат компактного получения или, в режиме raw, снимок страницы.
+        """
+        if CAPTURE_MODE == 'raw':
+            return self.snapshot()
+        return capture_page(self.driver.page_source, self.record_type, predicate)
+
+    def element(self, element_id):
+        """
+        :param element_id: Идентификатор элемента.
+        :return: Элемент страницы, найденный один раз за посещение.
+        """
+        return cached_element(self.driver, element_id)
+
+    def act(self, element_id, action):
+        """
+        Выполняет действие с элементом страницы, находя его заново, если он удален из DOM.
+        :param element_id: Идентификатор элемента.
+        :param action: Функция от элемента.
+        :return: Результат действия.
+        """
+        return with_element(self.driver, element_id, action)
+
+    def select(self, select_id, text):
+        """
+        Выбирает вариант поля выбора по видимому тексту. Поле берется из кэша элементов страницы, как и в act.
+        :param select_id: Идентификатор поля выбора.
+        :param text: Видимый текст варианта.
+        :return: Снимок страницы после выбора.
+        """
+        select_by_visible_text(self.driver, select_id, text)
+        return self.snapshot()
+
+    def fill(self, values, keystrokes=False):
+        """
+        Заполняет поля формы страницы FORM_FIELDS[link] по порядку и отправляет ее.
+        :param values: Значения полей.
+        :param keystrokes: Вводить ли данные с клавиатуры.
+        :return: Снимок страницы после отправки формы.
+        """
+        fill_form(self.driver, dict(zip(FORM_FIELDS[self.link], values)), SUBMIT_ID, keystrokes)
+        return self.snapshot()
+
+    def submit(self):
+        """
+        Нажимает на кнопку отправки формы страницы.
+        :return: Снимок страницы после отправки формы.
+        """
+        self.act(SUBMIT_ID, lambda element: submit_element(self.driver, element))
+        return self.snapshot()
+
+
+class LoginPage(Page):
+    """
+    Страница входа.
+    """
+
+    link = 'LOGIN_LINK'
+
+    def login(self, telno, password, keystrokes=False):
+        """
+        Входит в систему. Запомненная сессия веб-драйвера сбрасывается до отправки формы.
+        :param telno: Номер телефона.
+        :param password: Пароль.
+        :param keystrokes: Вводить ли данные с клавиатуры.
+        :return: Снимок страницы после входа.
+        """
+        driver_state(self.driver).session = None
+        return self.fill((telno, password), keystrokes)
+
+
+class RegistrationPage(Page):
+    """
+    Страница регистрации.
+    """
+
+    link = 'REGISTRATION_LINK'
+
+    def register(self, surname, name, middle_name, birthday, telno, email, password, password_again,
+                 keystrokes=False):
+        """
+        Регистрирует пациента.
+        :param surname: Фамилия.
+        :param name: Имя.
+        :param middle_name: Отчество.
+        :param birthday: Дата рождения.
+        :param telno: Номер телефона.
+        :param email: Адрес электронной почты.
+        :param password: Пароль.
+        :param password_again: Повтор пароля.
+        :param keystrokes: Вводить ли данные с клавиатуры.
+        :return: Снимок страницы после регистрации.
+        """
+        return self.fill((surname, name, middle_name, birthday, telno, email, password, password_again), keystrokes)
+
+
+class NewAppointmentPage(Page):
+    """
+    Страница создания новой записи на прием.
+    """
+
+    link = 'NEW_APPOINTMENT_LINK'
+
+    def select_service(self, service_name):
+        """
+        Выбирает услугу.
+        :param service_name: Название услуги.
+        :return: Снимок страницы после выбора.
+        """
+        return self.select('select_service', service_name)
+
+    def select_doctors(self, doctor_name):
+        """
+        Выбирает лечащего врача.
+        :param doctor_name: Полное имя врача.
+        :return: Снимок страницы после выбора.
+        """
+        return self.select('select_doctors', doctor_name)
+
+    def select_date(self, date):
+        """
+        Вводит дату записи с клавиатуры.
+        :param date: Дата записи.
+        :return: Снимок страницы после ввода.
+        """
+        self.act('appointment_date', lambda element: element.send_keys(date))
+        return self.snapshot()
+
+    def select_time(self, time):
+        """
+        Выбирает время записи.
+        :param time: Время записи.
+        :return: Снимок страницы после выбора.
+        """
+        return self.select('select_time', time)
+
+    def select_patient(self, patient_name):
+        """
+        Выбирает пациента (доступно врачу).
+        :param patient_name: Полное имя пациента.
+        :return: Снимок страницы после выбора.
+        """
+        return self.select('select_patient', patient_name)
+
+
+class AppointmentsPage(Page):
+    """
+    Страница существующих записей на прием.
+    """
+
+    link = 'EXISTING_APPOINTMENTS_LINK'
+
+    def cancel(self, date, full_name):
+        """
+        Отменяет запись по ее дате и имени пациента. Если записи нет или ее нельзя отменить (в строке нет формы
+        отмены), страница не меняется, и ожидания не выполняются.
+        :param date: Дата записи.
+        :param full_name: Имя пациента.
+        :return: Снимок страницы после отмены записи.
+        """
+        # Строки таблицы читаются один раз, поэтому сначала дожидаемся, пока их количество перестанет меняться.
+        wait_for(self.driver, row_count_stable((By.CSS_SELECTOR, TABLE_ROWS_SELECTOR)))
+        row = find_table_row(self.driver, lambda cells: len(cells) > 2 and cells[2] == full_name and
+                             date.count(cells[1]) != 0)
+        button = find_optional_element(row, By.XPATH, './td[last()]/form/input') if row is not None else None
+        if button is not None:
+            submit_element(self.driver, button)
+        return self.snapshot()
+
+
+class BillsPage(Page):
+    """
+    Страница счетов на оплату.
+    """
+
+    link = 'BILLS_LINK'
+
+    def create(self, patient_name, appointment_date, service_name):
+        """
+        Создает счет на запись, выбранную по пациенту, дате и услуге.
+        :param patient_name: Полное имя пациента.
+        :param appointment_date: Дата записи.
+        :param service_name: Название услуги.
+        :return: Снимок страницы после создания счета.
+        """
+        select_containing(self.driver, 'select_appointments', patient_name, appointment_date, service_name)
+        return self.submit()
+
+
+class MedicalHistoryPage(Page):
+    """
+    Страница медицинской истории.
+    """
+
+    link = 'MEDICAL_HISTORY_LINK'
+    record_type = MedicalHistoryRecord
+
+    def create(self, patient_name, diagnosis, keystrokes=False):
+        """
+        Создает запись медицинской истории.
+        :param patient_name: Имя пациента.
+        :param diagnosis: Запись истории.
+        :param keystrokes: Вводить ли данные с клавиатуры.
+        :return: Страница после создания записи со строками истории этого пациента с этим текстом.
+        """
+        self.fill((patient_name, diagnosis), keystrokes)
+        return self.capture(lambda record: patient_name in record.patient and diagnosis in record.diagnosis)
+
+
+class OrdersPage(Page):
+    """
+    Страница заказов расходных материалов.
+    """
+
+    link = 'ORDERS_LINK'
+    record_type = OrderRecord
+
+
+class CostAccountingPage(Page):
+    """
+    Страница учета расходных материалов.
+    """
+
+    link = 'COST_ACCOUNTING_LINK'
+    record_type = MaterialRecord
+
+    def create(self, material_name, amount, keystrokes=False):
+        """
+        Создает запись учета и загружает страницу заказов.
+        :param material_name: Наименование расходного материала.
+        :param amount: Количество.
+        :param keystrokes: Вводить ли данные с клавиатуры.
+        :return: Страницы учета до и после создания записи со строкой материала и страница заказов с заказами этого
+        материала в этом количестве.
+        """
+        def is_material(record):
+            return material_name in record.name
+
+        before_test = self.capture(is_material)
+        self.fill((material_name, amount), keystrokes)
+        after_test = self.capture(is_material)
+        orders = OrdersPage(self.driver).load().capture(
+            lambda record: material_name in record.material and amount_matches(record.amount, amount))
+        return {'before_test': before_test, 'after_test': after_test, 'orders': orders}
+
+
+# region Объекты страниц
+PAGES = {page.link: page for page in (Page, LoginPage, RegistrationPage, NewAppointmentPage, AppointmentsPage,
+                                      BillsPage, MedicalHistoryPage, CostAccountingPage, OrdersPage)}
+"""Объекты страниц, ключ - ключ ссылки страницы в LINKS."""
+# endregion
+
+
+def extract_table(driver, selector=TABLE_ROWS_SELECTOR):
+    """
+    Извлекает строки таблицы страницы одним вызовом execute_script.
+    :param driver: Веб-драйвер.
+    :param selector: CSS селектор строк.
+    :return: Список пар (элемент строки, кортеж текстов ячеек).
+    """
+    return [(row['element'], tuple(row['cells'])) for row in driver.execute_script(TABLE_ROWS_SCRIPT, selector)]
+
+
+def find_table_row(driver, predicate, selector=TABLE_ROWS_SELECTOR):
+    """
+    Находит первую строку таблицы, тексты ячеек которой удовлетворяют условию.
+    :param driver: Веб-драйвер.
+    :param predicate: Функция, принимающая кортеж текстов ячеек.
+    :param selector: CSS селектор строк.
+    :return: Элемент строки или None, если строка не найдена.
+    """
+    for element, cells in extract_table(driver, selector):
+        if predicate(cells):
+            return element
+
+    return None
+
+
+@helper
+def login(driver, telno, password, keystrokes=False):
     """
     Ввод данных в форму входа.
     :param driver: Веб-драйвер.
     :param telno: Номер телефона.
     :param password: Пароль.
+    :param keystrokes: Вводить ли данные с клавиатуры.
     :return: Содержимое страницы после нажатия на кнопку "Войти".
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['LOGIN_LINK'])
+    return LoginPage(driver).open().login(telno, password, keystrokes)
 
-    driver.find_element(By.ID, 'tel_no').send_keys(telno)
-    driver.find_element(By.ID, 'password').send_keys(password)
 
-    driver.find_element(By.ID, 'submit').submit()
+def session_key(telno, password):
+    """
+    Возвращает ключ кэша сессий для набора учетных данных.
+    :param telno: Номер телефона.
+    :param password: Пароль.
+    :return: Ключ кэша сессий.
+    """
+    return LINKS['INDEX_LINK'], str(telno), str(password)
+
+
+def is_session_expired(cookies):
+    """
+    Проверяет, истек ли срок действия хотя бы одного из сохраненных cookie.
+    :param cookies: Список cookie.
+    :return: Истек ли срок действия сессии.
+    """
+    now = time.time()
+    return any('expiry' in cookie and cookie['expiry'] <= now for cookie in cookies)
+
+
+def invalidate_session(telno=None, password=None):
+    """
+    Удаляет сохраненную сессию из кэша. Без параметров очищает весь кэш.
+    :param telno: Номер телефона.
+    :param password: Пароль.
+    """
+    if telno is None:
+        SESSION_CACHE.clear()
+    else:
+        SESSION_CACHE.pop(session_key(telno, password), None)
 
-    return driver.page_source
+
+def is_session_active(driver):
+    """
+    Проверяет по видимому тексту текущей страницы, что пользователь авторизован. Страница уже загружена, поэтому
+    условие проверяется один раз, а содержимое страницы не запрашивается.
+    :param driver: Веб-драйвер.
+    :return: Есть ли на странице текст SESSION_CHECK_TEXT.
+    """
+    return bool(wait_for(driver, text_present(SESSION_CHECK_LOCATOR, SESSION_CHECK_TEXT), NEGATIVE_WAIT_TIMEOUT,
+                         raise_on_timeout=False))
 
 
-def registration(driver, surname, name, middle_name, birthday, telno, email, password, password_again):
+def restore_session(driver, telno, password):
+    """
+    Восстанавливает сохраненную сессию в веб-драйвере через add_cookie.
+    :param driver: Веб-драйвер.
+    :param telno: Номер телефона.
+    :param password: Пароль.
+    :return: Содержимое главной страницы с восстановленной сессией или None, если сессия недействительна.
+    """
+    key = session_key(telno, password)
+    cookies = SESSION_CACHE.get(key)
+
+    if cookies is None:
+        return None
+
+    if is_session_expired(cookies):
+        del SESSION_CACHE[key]
+        return None
+
+    # Cookie можно добавить только для домена открытой страницы.
+    driver = check_url(driver, LINKS['INDEX_LINK'])
+    driver.delete_all_cookies()
+    for cookie in cookies:
+        driver.add_cookie(cookie)
+    navigate(driver, LINKS['INDEX_LINK'])
+
+    if not is_session_active(driver):
+        # Сессия отозвана сервером (например, пользователь удален или сменился секретный ключ).
+        del SESSION_CACHE[key]
+        return None
+
+    return PageSnapshot(driver)
+
+
+@helper
+def cached_login(driver, telno, password):
+    """
+    Вход с использованием кэша сессий: форма входа заполняется только при первом входе с данными учетными данными
+    или если сохраненная сессия стала недействительной. Если в веб-драйвере уже открыта сессия этого пользователя
+    (веб-драйвер выдан пулом без сброса), вход не выполняется.
+    :param driver: Веб-драйвер.
+    :param telno: Номер телефона.
+    :param password: Пароль.
+    :return: Содержимое страницы после входа или текущей страницы, если сессия уже открыта.
+    """
+    state = driver_state(driver)
+    key = session_key(telno, password)
+    if state.session == key:
+        return PageSnapshot(driver)
+
+    page_source = restore_session(driver, telno, password)
+    if page_source is not None:
+        state.session = key
+        return page_source
+
+    page_source = login(driver, telno, password)
+    if is_session_active(driver):
+        SESSION_CACHE[key] = driver.get_cookies()
+        state.session = key
+    return page_source
+
+
+@helper
+def registration(driver, surname, name, middle_name, birthday, telno, email, password, password_again,
+                 keystrokes=False):
     """
     Ввод данных в форму регистрации.
     :param driver: Веб-драйвер.
@@ -63,24 +1085,14 @@ def registration(driver, surname, name, middle_name, birthday, telno, email, pas
     :param email: Электронная почта.
     :param password: Пароль.
     :param password_again: Повтор пароля.
+    :param keystrokes: Вводить ли данные с клавиатуры.
     :return: Содержимое страницы после нажатия на кнопку "Регистрация"
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['REGISTRATION_LINK'])
-
-    driver.find_element(By.ID, 'surname').send_keys(surname)
-    driver.find_element(By.ID, 'user_name').send_keys(name)
-    driver.find_element(By.ID, 'middle_name').send_keys(middle_name)
-    driver.find_element(By.ID, 'birth_date').send_keys(birthday)
-    driver.find_element(By.ID, 'tel_no').send_keys(telno)
-    driver.find_element(By.ID, 'email').send_keys(email)
-    driver.find_element(By.ID, 'password').send_keys(password)
-    driver.find_element(By.ID, 'password2').send_keys(password_again)
-
-    driver.find_element(By.ID, 'submit').submit()
-
-    return driver.page_source
+    return RegistrationPage(driver).open().register(surname, name, middle_name, birthday, telno, email, password,
+                                                    password_again, keystrokes)
 
 
+@helper
 def new_appointment_select_service(driver, service_name):
     """
     Выбор услуги на странице создания новой записи.
@@ -88,12 +1100,10 @@ def new_appointment_select_service(driver, service_name):
     :param service_name: Название услуги.
     :return: Содержимое страницы после выбора.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
-
-    Select(driver.find_element(By.ID, 'select_service')).select_by_visible_text(service_name)
-    return driver.page_source
+    return NewAppointmentPage(driver).open().select_service(service_name)
 
 
+@helper
 def new_appointment_select_doctors(driver, doctor_name):
     """
     Выбор лечащего врача на странице создания новой записи.
@@ -101,13 +1111,10 @@ def new_appointment_select_doctors(driver, doctor_name):
     :param doctor_name: Полное имя врача.
     :return: Содержимое страницы после выбора.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
-
-    Select(driver.find_element(By.ID, 'select_doctors')).select_by_visible_text(doctor_name)
-
-    return driver.page_source
+    return NewAppointmentPage(driver).open().select_doctors(doctor_name)
 
 
+@helper
 def new_appointment_select_date(driver, date):
     """
     Выбор даты записи на странице создания новой записи.
@@ -115,13 +1122,10 @@ def new_appointment_select_date(driver, date):
     :param date: Дата записи.
     :return: Содержимое страницы после выбора.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
-
-    driver.find_element(By.ID, 'appointment_date').send_keys(date)
-
-    return driver.page_source
+    return NewAppointmentPage(driver).open().select_date(date)
 
 
+@helper
 def new_appointment_select_time(driver, time):
     """
     Выбор времени записи на странице создания новой записи.
@@ -129,13 +1133,10 @@ def new_appointment_select_time(driver, time):
     :param time: Время записи.
     :return: Содержимое страницы после выбора.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
-
-    Select(driver.find_element(By.ID, 'select_time')).select_by_visible_text(time)
-
-    return driver.page_source
+    return NewAppointmentPage(driver).open().select_time(time)
 
 
+@helper
 def new_appointment_select_patient(driver, patient_name):
     """
     Выбор пациента для записи на странице записи на прием.
@@ -143,25 +1144,20 @@ def new_appointment_select_patient(driver, patient_name):
     :param patient_name: Полное имя пациента.
     :return: Содержимое страницы после выбора.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
-
-    Select(driver.find_element(By.ID, 'select_patient')).select_by_visible_text(patient_name)
-
-    return driver.page_source
+    return NewAppointmentPage(driver).open().select_patient(patient_name)
 
 
+@helper
 def new_appointment_submit(driver):
     """
     Нажатие на кнопку "Создать запись" на странице создания новой записи.
     :param driver: Веб-драйвер.
     :return: Содержимое страницы после нажатия на кнопку "Создать запись".
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['NEW_APPOINTMENT_LINK'])
-
-    driver.find_element(By.ID, 'submit').submit()
-    return driver.page_source
+    return NewAppointmentPage(driver).open().submit()
 
 
+@helper
 def cancel_appointment(driver, date, full_name):
     """
     Отмена записи по ее дате и имени пациента.
@@ -170,25 +1166,10 @@ def cancel_appointment(driver, date, full_name):
     :param full_name: Имя пациента.
     :return: Содержимое страницы после отмены записи.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['EXISTING_APPOINTMENTS_LINK'])
-
-    rows = driver.find_elements(By.XPATH, '//table/tbody/tr')
-
-    for row in rows:
-        name_cell = row.find_element(By.XPATH, './td[3]')
-        name_text = name_cell.text
-
-        date_cell = row.find_element(By.XPATH, './td[2]')
-        date_text = date_cell.text
-
-        if name_text == full_name and date.count(date_text) != 0:
-            button = row.find_element(By.XPATH, './td[last()]/form/input')
-            button.submit()
-            break
-
-    return driver.page_source
+    return AppointmentsPage(driver).open().cancel(date, full_name)
 
 
+@helper
 def new_bill(driver, patient_name, appointment_date, service_name):
     """
     Создание нового счета на оплату.
@@ -198,127 +1179,357 @@ def new_bill(driver, patient_name, appointment_date, service_name):
     :param service_name: Наименование услуги.
     :return: Содержимое страницы после создания счета.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['BILLS_LINK'])
-
-    select = Select(driver.find_element(By.ID, 'select_appointments'))
-
-    for option in select.options:
-        if patient_name in option.text and appointment_date in option.text and service_name in option.text:
-            option.click()
-            break
-
-    driver.find_element(By.ID, 'submit').submit()
-
-    return driver.page_source
+    return BillsPage(driver).open().create(patient_name, appointment_date, service_name)
 
 
-def new_medical_history(driver, patient_name, diagnosis):
+@helper
+def new_medical_history(driver, patient_name, diagnosis, keystrokes=False):
     """
     Создание новой записи медицинской истории.
     :param driver: Веб-драйвер.
     :param patient_name: Имя пациента.
     :param diagnosis: Запись истории.
+    :param keystrokes: Вводить ли данные с клавиатуры.
     :return: Содержимое страницы после создания записи.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['MEDICAL_HISTORY_LINK'])
+    return MedicalHistoryPage(driver).open().create(patient_name, diagnosis, keystrokes)
 
-    Select(driver.find_element(By.ID, 'select_patient')).select_by_visible_text(patient_name)
-    driver.find_element(By.ID, 'history_text').send_keys(diagnosis)
-    driver.find_element(By.ID, 'submit').submit()
 
-    return driver.page_source
-
-
-def new_cost_accounting_entry(driver, material_name, amount):
+@helper
+def new_cost_accounting_entry(driver, material_name, amount, keystrokes=False):
     """
     Создание новой записи учета расходных материалов.
     :param driver: Веб-драйвер.
     :param material_name: Наименование расходного материала.
     :param amount: Количество.
+    :param keystrokes: Вводить ли данные с клавиатуры.
     :return: Содержимое страницы создания записи учета до создания записи, содержимое страницы после создания записи,
-    содержимое страницы счетов.
+    содержимое страницы счетов: в режиме compact - CompactPage только с нужными строками, в режиме raw - снимки страниц.
+    """
+    return CostAccountingPage(driver).open().create(material_name, amount, keystrokes)
+
+
+class RowScanner(HTMLParser):
+    """
+    Потоковый разбор строк таблиц: строка становится доступной сразу после ее закрытия, в памяти хранится только
+    текущая строка и еще не прочитанные готовые строки.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rows = deque()
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self.close_row()
+            self.row = []
+        elif tag in ('td', 'th') and self.row is not None:
+            self.close_cell()
+            # Заголовочные ячейки не входят в строку: строка заголовка таблицы не содержит ячеек.
+            self.cell = [] if tag == 'td' else None
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th'):
+            self.close_cell()
+        elif tag in ('tr', 'table'):
+            self.close_row()
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def close_cell(self):
+        if self.cell is not None:
+            self.row.append(''.join(self.cell))
+            self.cell = None
+
+    def close_row(self):
+        if self.row is not None:
+            self.close_cell()
+            self.rows.append(tuple(self.row))
+            self.row = None
+
+
+class ParsedTable:
+    """
+    Таблица страницы, разобранная один раз: ячейки хранятся по столбцам, для столбцов строятся индексы текст ячейки ->
+    номера строк, а разобранные даты и результаты поиска запоминаются. Поиск по подстроке проверяет различные тексты
+    столбца из индекса, а не все строки, поэтому повторные запросы к той же странице не требуют ни разбора, ни
+    просмотра строк.
+    """
+
+    def __init__(self, html_text):
+        """
+        :param html_text: Текст html документа.
+        """
+        scanner = RowScanner()
+        scanner.feed(html_text)
+        scanner.close()
+        scanner.close_row()
+
+        # Первая строка - заголовок таблицы.
+        rows = list(scanner.rows)[1:]
+        width = max((len(row) for row in rows), default=0)
+
+        self.row_count = len(rows)
+        self.columns = [tuple(row[index] if index < len(row) else '' for row in rows) for index in range(width)]
+        self.indexes = {}
+        self.dates = {}
+        self.matches = {}
+        self.amounts = {}
+
+    def row(self, index):
+        """
+        Возвращает строку таблицы.
+        :param index: Номер строки без учета заголовка.
+        :return: Кортеж текстов ячеек.
+        """
+        return tuple(column[index] for column in self.columns)
+
+    def index(self, column):
+        """
+        Возвращает индекс столбца, строя его при первом обращении.
+        :param column: Номер столбца.
+        :return: Словарь текст ячейки -> кортеж номеров строк по возрастанию.
+        """
+        if column not in self.indexes:
+            index = {}
+            for row, cell in enumerate(self.columns[column] if column < len(self.columns) else ()):
+                index.setdefault(cell, []).append(row)
+            self.indexes[column] = {cell: tuple(rows) for cell, rows in index.items()}
+        return self.indexes[column]
+
+    def rows_containing(self, column, text):
+        """
+        Возвращает номера строк, в ячейке столбца которых содержится текст.
+        :param column: Номер столбца.
+        :param text: Искомый текст.
+        :return: Кортеж номеров строк по возрастанию.
+        """
+        key = (column, text)
+        if key not in self.matches:
+            self.matches[key] = tuple(sorted(row for cell, rows in self.index(column).items() if text in cell
+                                             for row in rows))
+        return self.matches[key]
+
+    def date(self, column, row):
+        """
+        Возвращает дату ячейки, разобранную по формату DATE_TIME_FORMAT. Каждый текст даты разбирается один раз.
+        :param column: Номер столбца.
+        :param row: Номер строки.
+        :return: Дата и время или None, если текст ячейки не является датой.
+        """
+        cell = self.columns[column][row]
+        if cell not in self.dates:
+            self.dates[cell] = parse_date(cell.strip())
+        return self.dates[cell]
+
+    def amount(self, name_column, amount_column, name):
+        """
+        Возвращает количество из первой строки, название в которой содержит указанный текст.
+        :param name_column: Номер столбца названия.
+        :param amount_column: Номер столбца количества.
+        :param name: Название.
+        :return: Количество или 0, если строка не найдена или количество не является числом.
+        """
+        key = (name_column, amount_column, name)
+        if key not in self.amounts:
+            rows = self.rows_containing(name_column, name)
+            self.amounts[key] = (parse_int(self.columns[amount_column][rows[0]].strip()) or 0) if rows else 0
+        return self.amounts[key]
+
+    def find(self, text_filters, date_column, date_value):
+        """
+        Проверяет, есть ли строка, ячейки которой содержат тексты фильтров, а дата отличается от указанной не более чем
+        на TIME_DELTA_DIFF минут.
+        :param text_filters: Словарь номер столбца -> искомый текст.
+        :param date_column: Номер столбца даты.
+        :param date_value: Дата для сравнения.
+        :return: Была ли найдена строка.
+        """
+        candidates = None
+        for column, text in text_filters.items():
+            rows = set(self.rows_containing(column, text))
+            candidates = rows if candidates is None else candidates & rows
+
+        if not candidates or date_column >= len(self.columns):
+            return False
+        # Даты разбираются только для строк, тексты которых уже совпали.
+        return any(is_near(self.date(date_column, row), date_value) for row in sorted(candidates))
+
+
+def table_key(html_text):
+    """
+    Возвращает ключ кэша разобранных таблиц.
+    :param html_text: Текст html документа.
+    :return: Хэш содержимого страницы.
+    """
+    return hashlib.sha1(str(html_text).encode('utf-8')).digest()
+
+
+def parse_table(html_text):
+    """
+    Возвращает разобранную таблицу страницы. Таблицы кэшируются по хэшу содержимого страницы.
+    :param html_text: Текст html документа.
+    :return: Разобранная таблица.
     """
-    driver = check_url(driver, LINKS['INDEX_LINK'] + LINKS['COST_ACCOUNTING_LINK'])
+    key = table_key(html_text)
 
-    before_test = driver.page_source
+    table = PARSED_TABLES.pop(key, None)
+    if table is None:
+        table = ParsedTable(str(html_text))
+    PARSED_TABLES[key] = table
 
-    Select(driver.find_element(By.ID, 'select_material')).select_by_visible_text(material_name)
-    driver.find_element(By.ID, 'amount').send_keys(amount)
+    while len(PARSED_TABLES) > PARSED_TABLES_CACHE_SIZE:
+        PARSED_TABLES.popitem(last=False)
 
-    driver.find_element(By.ID, 'submit').submit()
-    after_test = driver.page_source
+    return table
 
-    driver.get(LINKS['INDEX_LINK'] + LINKS['ORDERS_LINK'])
-    orders = driver.page_source
 
-    return {'before_test': before_test, 'after_test': after_test, 'orders': orders}
+class CaptureScanner(RowScanner):
+    """
+    Потоковый разбор страницы для компактного получения: кроме строк таблиц собирает текст страницы вне таблиц
+    и надписи кнопок.
+    """
 
+    def __init__(self, tables_in_text):
+        """
+        :param tables_in_text: Входит ли текст таблиц в текст страницы.
+        """
+        super().__init__()
+        self.tables_in_text = tables_in_text
+        self.text = []
+        self.table_depth = 0
+        self.skipped_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        super().handle_starttag(tag, attrs)
+        if tag == 'table':
+            self.table_depth += 1
+        elif tag in CAPTURE_SKIPPED_TAGS:
+            self.skipped_depth += 1
+        elif tag == 'input' and self.in_text():
+            attrs = dict(attrs)
+            if attrs.get('type') in CAPTURE_VALUE_INPUTS and attrs.get('value'):
+                self.text.append(attrs['value'])
+
+    def handle_endtag(self, tag):
+        super().handle_endtag(tag)
+        if tag == 'table':
+            self.table_depth = max(self.table_depth - 1, 0)
+        elif tag in CAPTURE_SKIPPED_TAGS:
+            self.skipped_depth = max(self.skipped_depth - 1, 0)
+
+    def handle_data(self, data):
+        super().handle_data(data)
+        data = data.strip()
+        if data and self.in_text():
+            self.text.append(data)
+
+    def in_text(self):
+        """
+        :return: Входит ли текущий текст в текст страницы.
+        """
+        return not self.skipped_depth and (self.tables_in_text or not self.table_depth)
+
+
+def capture_page(html_text, record_type=None, predicate=None, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Компактное получение страницы: документ разбирается потоково фрагментами, из него сохраняются только текст вне
+    таблиц и отобранные строки таблицы.
+    :param html_text: Текст html документа.
+    :param record_type: Тип строк таблицы - подкласс Record или None, если текст таблиц входит в текст страницы.
+    :param predicate: Условие отбора строк таблицы или None, чтобы сохранить все строки.
+    :param chunk_size: Размер фрагмента документа.
+    :return: Результат компактного получения CompactPage.
+    """
+    html_text = str(html_text)
+    scanner = CaptureScanner(record_type is None)
+    rows = []
+
+    for start in range(0, len(html_text) + 1, chunk_size):
+        if start < len(html_text):
+            scanner.feed(html_text[start:start + chunk_size])
+        else:
+            scanner.close()
+            scanner.close_row()
+
+        while scanner.rows:
+            cells = scanner.rows.popleft()
+            # Строка заголовка состоит только из ячеек th и не содержит ячеек.
+            if record_type is None or not cells:
+                continue
+            record = record_type.from_cells(cells)
+            if predicate is None or predicate(record):
+                rows.append(record)
+
+    return CompactPage(' '.join(scanner.text), rows)
+
+
+def is_near(date_text, date_value):
+    """
+    Проверяет, отличается ли дата ячейки от указанной не более чем на TIME_DELTA_DIFF минут.
+    :param date_text: Текст даты в формате DATE_TIME_FORMAT или уже разобранная дата.
+    :param date_value: Дата для сравнения.
+    :return: Близки ли даты. Пустая или неразборчивая дата ячейки ни с чем не совпадает.
+    """
+    if isinstance(date_text, str):
+        date_text = parse_date(date_text.strip())
+    if date_text is None:
+        return False
+    return abs(date_text - date_value) <= timedelta(minutes=TIME_DELTA_DIFF)
 
+
+@helper
 def count_material(html_text, material_name):
     """
     Возвращает количество указанного материала для страницы учета расходов.
-    :param html_text: Текст html документа.
+    :param html_text: Текст html документа или результат компактного получения CompactPage.
     :param material_name: Название материала.
     :return: Количество материала.
     """
-    parser = BeautifulSoup(html_text, 'html.parser')
-
-    for row in parser.find_all('tr')[1:]:
-        current_row = []
-        for col in row.find_all('td'):
-            current_row.append(col.text)
-        if current_row[1].count(material_name) != 0:
-            return int(current_row[2])
-
-    return 0
+    if isinstance(html_text, CompactPage):
+        return next((record.amount or 0 for record in html_text.rows if material_name in record.name), 0)
+    return parse_table(html_text).amount(1, 2, material_name)
 
 
+@helper
 def find_order(html_text, author, date_order, material_name, count):
     """
-    Поиск записи счета по автору счета, дате, материалу и количеству материала на странице счетов.
-    :param html_text: Текст html документа.
+    Поиск записи счета по автору счета, дате, материалу и количеству материала на странице счетов. Страница
+    разбирается один раз, как и в count_material: повторные проверки той же страницы используют разобранную таблицу.
+    :param html_text: Текст html документа или результат компактного получения CompactPage.
     :param author: Автор счета.
     :param date_order: Дата счета.
     :param material_name: Название материала.
     :param count: Количество материала.
     :return: Была ли найдена запись.
     """
-    parser = BeautifulSoup(html_text, 'html.parser')
+    if isinstance(html_text, CompactPage):
+        return any(author in record.author and material_name in record.material
+                   and amount_matches(record.amount, count) and is_near(record.date, date_order)
+                   for record in html_text.rows)
 
-    for row in parser.find_all('tr')[1:]:
-        current_row = []
-        for col in row.find_all('td'):
-            current_row.append(col.text)
-        if current_row[1].count(author) != 0 and current_row[2].count(material_name) != 0 \
-                and current_row[3].count(str(count)) != 0 \
-                and abs(datetime.strptime(current_row[4].strip(), DATE_TIME_FORMAT) - date_order) \
-                <= timedelta(minutes=TIME_DELTA_DIFF):
-            return True
-
-    return False
+    # Количество сравнивается по тексту, как в amount_matches.
+    return parse_table(html_text).find({1: author, 2: material_name, 3: str(count)}, 4, date_order)
 
 
+@helper
 def find_medical_history(html_text, author, patient, diagnosis, date_history):
     """
-    Поиск записи медицинской истории по автору записи, пациенту, тексту диагноза, дате создания записи.
-    :param html_text: Текст html документа.
+    Поиск записи медицинской истории по автору записи, пациенту, тексту диагноза, дате создания записи. Страница
+    разбирается один раз, как и в count_material: повторные проверки той же страницы используют разобранную таблицу.
+    :param html_text: Текст html документа или результат компактного получения CompactPage.
     :param author: Автор записи.
     :param patient: Полное имя пациента.
     :param diagnosis: Текст записи медицинской истории.
     :param date_history: Дата создания записи.
     :return: Была ли найдена запись.
     """
-    parser = BeautifulSoup(html_text, 'html.parser')
-
-    for row in parser.find_all('tr')[1:]:
-        current_row = []
-        for col in row.find_all('td'):
-            current_row.append(col.text)
-        if current_row[0].count(author) != 0 and current_row[1].count(patient) != 0 \
-                and current_row[3].count(diagnosis) != 0 \
-                and abs(datetime.strptime(current_row[2].strip(), DATE_TIME_FORMAT) - date_history) \
-                <= timedelta(minutes=TIME_DELTA_DIFF):
-            return True
-
-    return False
+    if isinstance(html_text, CompactPage):
+        return any(author in record.author and patient in record.patient and diagnosis in record.diagnosis
+                   and is_near(record.date, date_history) for record in html_text.rows)
 
+    return parse_table(html_text).find({0: author, 1: patient, 3: diagnosis}, 2, date_history)
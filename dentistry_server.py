@@ -0,0 +1,616 @@
+import copy
+from datetime import date, datetime
+from html import escape
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import secrets
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+from dentistry_selenium import DATE_TIME_FORMAT
+
+# region Константы
+HOST = '127.0.0.1'
+"""Адрес, на котором запускается заменитель веб-сервиса."""
+
+SESSION_COOKIE = 'session'
+"""Имя cookie сессии."""
+
+EMPTY_FIELD_TEXT = 'Это поле обязательно для заполнения'
+"""Текст сообщения незаполненных полей."""
+
+WRONG_LOGIN_TEXT = 'Неверный логин или пароль'
+"""Текст сообщения неверных данных для входа."""
+
+WRONG_DATE_APPOINTMENT_TEXT = 'Дата записи должна быть позже сегодняшней'
+"""Текст сообщения неверной даты при создании новой записи."""
+
+WRONG_COUNT_MATERIAL_ORDER_TEXT = '0 < количество <= максимальное значение в таблице'
+"""Текст сообщения неверного количества материала для создания записи учета материалов."""
+
+PASSWORDS_MISMATCH_TEXT = 'Пароли не совпадают'
+"""Текст сообщения несовпадающих паролей при регистрации."""
+
+TELNO_EXISTS_TEXT = 'Пользователь с таким номером телефона уже существует'
+"""Текст сообщения повторной регистрации номера телефона."""
+
+CANCEL_APPOINTMENT_TEXT = 'Отменить запись'
+"""Текст кнопки отмены записи."""
+
+LOGOUT_TEXT = 'Выход'
+"""Текст ссылки выхода."""
+
+APPOINTMENT_TIMES = ['{}:{:02d}'.format(hour, minute) for hour in range(8, 18) for minute in (0, 30)]
+"""Время записи на прием."""
+
+SEED_USERS = [
+    {'surname': 'Тестов', 'name': 'Тест', 'middle_name': 'Тестович', 'birth_date': '1970-01-01',
+     'tel_no': '89127658910', 'email': 'patient@test.com', 'password': 'qwerty', 'doctor': False},
+    {'surname': 'Николаевна', 'name': 'Анна', 'middle_name': 'Михайловна', 'birth_date': '1980-01-01',
+     'tel_no': '89023456781', 'email': 'anna@test.com', 'password': 'qwerty', 'doctor': True},
+    {'surname': 'Михайлов', 'name': 'Станислав', 'middle_name': 'Александрович', 'birth_date': '1975-01-01',
+     'tel_no': '89023456782', 'email': 'stanislav@test.com', 'password': 'qwerty', 'doctor': True},
+    {'surname': 'Сергеев', 'name': 'Сергей', 'middle_name': 'Андреевич', 'birth_date': '1985-01-01',
+     'tel_no': '89023456783', 'email': 'sergey@test.com', 'password': 'qwerty', 'doctor': True},
+    {'surname': 'Иванов', 'name': 'Николай', 'middle_name': 'Александрович', 'birth_date': '1990-01-01',
+     'tel_no': '89023456784', 'email': 'nikolay@test.com', 'password': 'qwerty', 'doctor': True}]
+"""Пользователи начального состояния."""
+
+SEED_SERVICES = {'Осмотр': ['89023456781', '89023456782', '89023456783', '89023456784'],
+                 'Винир': ['89023456782']}
+"""Услуги и номера телефонов врачей, которые их оказывают."""
+
+SEED_MATERIALS = {'Иглы': 1000, 'Перчатки': 1000, 'Пломбы': 500}
+"""Расходные материалы и их количество."""
+
+STATIC_FILES = {
+    'static/style.css': ('text/css', 'body { font-family: sans-serif; } table { border-collapse: collapse; } '
+                                     'td, th { border: 1px solid #ccc; padding: 4px; } .error { color: #c00; }'),
+    'static/logo.svg': ('image/svg+xml', '<svg xmlns="http://www.w3.org/2000/svg" width="32" height="32">'
+                                         '<circle cx="16" cy="16" r="14" fill="#3a7"/></svg>')}
+"""Статические файлы страниц: как и у dentistry-flask, страницы загружают стили и изображение."""
+# endregion
+
+
+def full_name(user):
+    """
+    :param user: Пользователь.
+    :return: Полное имя пользователя.
+    """
+    return '{} {} {}'.format(user['surname'], user['name'], user['middle_name'])
+
+
+def parse_date(text):
+    """
+    Разбирает дату из поля формы в формате ГГГГ-ММ-ДД или ДД.ММ.ГГГГ.
+    :param text: Текст поля.
+    :return: Дата или None.
+    """
+    for date_format in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(text.strip(), date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def seed_state():
+    """
+    Создает начальное состояние веб-сервиса.
+    :return: Состояние: пользователи, услуги, записи, счета, медицинская история, материалы и заказы.
+    """
+    return {'users': {user['tel_no']: dict(user) for user in SEED_USERS},
+            'services': copy.deepcopy(SEED_SERVICES),
+            'appointments': [], 'bills': [], 'medical_history': [],
+            'materials': dict(SEED_MATERIALS), 'orders': [], 'next_id': 1}
+
+
+class DentistryStandIn:
+    """
+    Легкий заменитель веб-сервиса dentistry-flask: те же страницы, идентификаторы элементов и сообщения, состояние
+    хранится в памяти.
+    """
+
+    def __init__(self, state=None):
+        """
+        :param state: Начальное состояние или None для состояния по умолчанию.
+        """
+        self.state = state or seed_state()
+        self.sessions = {}
+        self.lock = threading.RLock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        """
+        :return: Адрес запущенного веб-сервиса.
+        """
+        return 'http://{}:{}/'.format(*self.server.server_address[:2])
+
+    def start(self, port=0):
+        """
+        Запускает веб-сервис в отдельном потоке. По умолчанию выбирается свободный порт.
+        :param port: Порт.
+        :return: Веб-сервис.
+        """
+        stand_in = self
+
+        class Handler(StandInHandler):
+            app = stand_in
+
+        self.server = ThreadingHTTPServer((HOST, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Останавливает веб-сервис.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def dump_state(self):
+        """
+        :return: Копия состояния веб-сервиса.
+        """
+        with self.lock:
+            return copy.deepcopy(self.state)
+
+    def load_state(self, state):
+        """
+        Заменяет состояние веб-сервиса копией указанного. Сессии пользователей сохраняются.
+        :param state: Состояние.
+        """
+        with self.lock:
+            self.state = copy.deepcopy(state)
+
+    def new_id(self):
+        """
+        :return: Новый идентификатор записи.
+        """
+        self.state['next_id'] += 1
+        return self.state['next_id'] - 1
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов заменителя веб-сервиса.
+    """
+
+    app = None
+    """Заменитель веб-сервиса."""
+
+    protocol_version = 'HTTP/1.1'
+
+    # Заголовки и тело ответа отправляются отдельно: без этого алгоритм Нейгла задерживает ответы keep-alive.
+    disable_nagle_algorithm = True
+
+    def log_message(self, message_format, *args):
+        pass
+
+    # region Инфраструктура запроса
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        self.form = {key: values[0] for key, values in parse_qs(body, keep_blank_values=True).items()}
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        self.new_cookie = None
+        self.session = self.load_session()
+        path = urlsplit(self.path).path.strip('/') or 'index'
+        if method == 'GET' and path in STATIC_FILES:
+            content_type, content = STATIC_FILES[path]
+            self.respond(200, content, content_type=content_type)
+            return
+        route = getattr(self, '{}_{}'.format(method.lower(), path), None)
+
+        if route is None:
+            self.respond(404, self.page('Страница не найдена', '<p>Страница не найдена</p>'))
+            return
+
+        with self.app.lock:
+            if method == 'POST' and self.form.get('csrf_token') != self.session['csrf']:
+                self.respond(400, self.page('Ошибка', '<p>The CSRF token is missing.</p>'))
+                return
+            route()
+
+    def load_session(self):
+        cookie = SimpleCookie(self.headers.get('Cookie') or '')
+        token = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+        with self.app.lock:
+            if token not in self.app.sessions:
+                token = secrets.token_hex(16)
+                self.app.sessions[token] = {'user': None, 'csrf': secrets.token_hex(16)}
+                self.new_cookie = token
+            return self.app.sessions[token]
+
+    def respond(self, status, html_text, location=None, content_type='text/html'):
+        data = html_text.encode('utf-8')
+        self.send_response(status)
+        if location:
+            self.send_header('Location', location)
+        if self.new_cookie:
+            self.send_header('Set-Cookie', '{}={}; Path=/; HttpOnly'.format(SESSION_COOKIE, self.new_cookie))
+        self.send_header('Content-Type', content_type + '; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, path):
+        self.respond(302, '', '/' + path)
+
+    @property
+    def user(self):
+        return self.app.state['users'].get(self.session['user'])
+
+    def require_user(self, doctor=False):
+        """
+        Проверяет вход пользователя, иначе перенаправляет на страницу входа.
+        :param doctor: Требуется ли вход врача.
+        :return: Пользователь или None.
+        """
+        user = self.user
+        if user is None or doctor and not user['doctor']:
+            self.redirect('login')
+            return None
+        return user
+    # endregion
+
+    # region Разметка
+    def page(self, title, body):
+        user = self.user
+        if user is None:
+            navigation = '<a href="/login">Вход</a> <a href="/register">Регистрация</a>'
+        else:
+            links = [('new_appointment', 'Новая запись'), ('appointment', 'Записи'), ('bills', 'Счета'),
+                     ('medical_history', 'Медицинская история')]
+            if user['doctor']:
+                links += [('cost_accounting', 'Учет расходов'), ('orders', 'Заказы')]
+            navigation = ' '.join('<a href="/{}">{}</a>'.format(*link) for link in links) + \
+                ' <span>{}</span> <a href="/logout">{}</a>'.format(escape(full_name(user)), LOGOUT_TEXT)
+        return '<!DOCTYPE html><html><head><meta charset="utf-8"><title>{0}</title>' \
+               '<link rel="stylesheet" href="/static/style.css"></head><body><nav><img src="/static/logo.svg" alt="">' \
+               '{1}</nav><h1>{0}</h1>{2}</body></html>'.format(escape(title), navigation, body)
+
+    def form_html(self, fields, submit_text, errors=()):
+        return '<form method="post"><input id="csrf_token" name="csrf_token" type="hidden" value="{}">{}{}' \
+               '<input id="submit" name="submit" type="submit" value="{}"></form>'.format(
+                   self.session['csrf'], ''.join(errors_html(errors)), ''.join(fields), escape(submit_text))
+
+    def render_form_page(self, title, fields, submit_text, errors=(), after=''):
+        self.respond(200, self.page(title, self.form_html(fields, submit_text, errors) + after))
+    # endregion
+
+    # region Страницы
+    def get_index(self):
+        self.respond(200, self.page('Стоматология', '<p>Добро пожаловать!</p>'))
+
+    def get_logout(self):
+        self.session['user'] = None
+        self.redirect('')
+
+    def login_fields(self):
+        return [input_html('tel_no', 'Номер телефона', self.form_value('tel_no')),
+                input_html('password', 'Пароль', input_type='password')]
+
+    def get_login(self):
+        self.render_form_page('Вход', self.login_fields(), 'Войти')
+
+    def post_login(self):
+        errors = [EMPTY_FIELD_TEXT for field in ('tel_no', 'password') if not self.form.get(field)]
+        if not errors:
+            user = self.app.state['users'].get(self.form['tel_no'])
+            if user is None or user['password'] != self.form['password']:
+                errors = [WRONG_LOGIN_TEXT]
+            else:
+                self.session['user'] = user['tel_no']
+                self.redirect('')
+                return
+        self.render_form_page('Вход', self.login_fields(), 'Войти', errors)
+
+    def registration_fields(self):
+        labels = [('surname', 'Фамилия'), ('user_name', 'Имя'), ('middle_name', 'Отчество'),
+                  ('birth_date', 'Дата рождения'), ('tel_no', 'Номер телефона'), ('email', 'Электронная почта'),
+                  ('password', 'Пароль'), ('password2', 'Повтор пароля')]
+        types = {'birth_date': 'date', 'email': 'email', 'password': 'password', 'password2': 'password'}
+        return [input_html(field, label, self.form_value(field) if field not in ('password', 'password2') else '',
+                           types.get(field, 'text')) for field, label in labels]
+
+    def get_register(self):
+        self.render_form_page('Регистрация', self.registration_fields(), 'Регистрация')
+
+    def post_register(self):
+        fields = ('surname', 'user_name', 'middle_name', 'birth_date', 'tel_no', 'email', 'password', 'password2')
+        errors = [EMPTY_FIELD_TEXT for field in fields if not self.form.get(field)]
+        if not errors:
+            if self.form['password'] != self.form['password2']:
+                errors.append(PASSWORDS_MISMATCH_TEXT)
+            if self.form['tel_no'] in self.app.state['users']:
+                errors.append(TELNO_EXISTS_TEXT)
+            if parse_date(self.form['birth_date']) is None:
+                errors.append('Неверная дата рождения')
+        if errors:
+            self.render_form_page('Регистрация', self.registration_fields(), 'Регистрация', errors)
+            return
+
+        self.app.state['users'][self.form['tel_no']] = {
+            'surname': self.form['surname'], 'name': self.form['user_name'], 'middle_name': self.form['middle_name'],
+            'birth_date': parse_date(self.form['birth_date']).isoformat(), 'tel_no': self.form['tel_no'],
+            'email': self.form['email'], 'password': self.form['password'], 'doctor': False}
+        self.redirect('login')
+
+    def new_appointment_fields(self, user):
+        state = self.app.state
+        doctors = [full_name(state['users'][telno]) for telno in
+                   dict.fromkeys(telno for telnos in state['services'].values() for telno in telnos)]
+        fields = [select_html('select_service', 'Услуга', list(state['services'])),
+                  select_html('select_doctors', 'Врач', doctors),
+                  input_html('appointment_date', 'Дата записи', self.form_value('appointment_date'), 'date'),
+                  select_html('select_time', 'Время', APPOINTMENT_TIMES)]
+        if user['doctor']:
+            fields.append(select_html('select_patient', 'Пациент', [full_name(patient) for patient in
+                                                                    self.patients()]))
+        return fields
+
+    def patients(self):
+        return [user for user in self.app.state['users'].values() if not user['doctor']]
+
+    def find_user(self, name, doctor):
+        for user in self.app.state['users'].values():
+            if full_name(user) == name and user['doctor'] == doctor:
+                return user
+        return None
+
+    def get_new_appointment(self):
+        user = self.require_user()
+        if user:
+            self.render_form_page('Новая запись', self.new_appointment_fields(user), 'Создать запись')
+
+    def post_new_appointment(self):
+        user = self.require_user()
+        if not user:
+            return
+
+        state = self.app.state
+        errors = [EMPTY_FIELD_TEXT for field in ('select_service', 'select_doctors', 'appointment_date',
+                                                 'select_time') if not self.form.get(field)]
+        appointment_date = parse_date(self.form.get('appointment_date', ''))
+        doctor = self.find_user(self.form.get('select_doctors'), True)
+        patient = self.find_user(self.form.get('select_patient'), False) if user['doctor'] else user
+
+        if not errors:
+            if appointment_date is None or appointment_date <= date.today():
+                errors.append(WRONG_DATE_APPOINTMENT_TEXT)
+            if doctor is None or doctor['tel_no'] not in state['services'].get(self.form['select_service'], ()):
+                errors.append('Врач не оказывает выбранную услугу')
+            if patient is None or self.form['select_time'] not in APPOINTMENT_TIMES:
+                errors.append('Неверные данные записи')
+        if errors:
+            self.render_form_page('Новая запись', self.new_appointment_fields(user), 'Создать запись', errors)
+            return
+
+        hour, minute = self.form['select_time'].split(':')
+        state['appointments'].append({'id': self.app.new_id(), 'service': self.form['select_service'],
+                                      'doctor': doctor['tel_no'], 'patient': patient['tel_no'],
+                                      'datetime': datetime.combine(appointment_date, datetime.min.time()).replace(
+                                          hour=int(hour), minute=int(minute))})
+        self.redirect('appointment')
+
+    def visible_appointments(self, user):
+        key = 'doctor' if user['doctor'] else 'patient'
+        return [appointment for appointment in self.app.state['appointments'] if appointment[key] == user['tel_no']]
+
+    def get_appointment(self):
+        user = self.require_user()
+        if not user:
+            return
+
+        users = self.app.state['users']
+        rows = [[str(appointment['id']), appointment['datetime'].strftime(DATE_TIME_FORMAT),
+                 full_name(users[appointment['patient']]), full_name(users[appointment['doctor']]),
+                 appointment['service'],
+                 '<form method="post"><input name="appointment_id" type="hidden" value="{}">'
+                 '<input name="csrf_token" type="hidden" value="{}"><input type="submit" value="{}"></form>'.format(
+                     appointment['id'], self.session['csrf'], CANCEL_APPOINTMENT_TEXT)]
+                for appointment in self.visible_appointments(user)]
+        self.respond(200, self.page('Записи', table_html(['№', 'Дата', 'Пациент', 'Врач', 'Услуга', ''], rows,
+                                                         raw_columns=(5,))))
+
+    def post_appointment(self):
+        user = self.require_user()
+        if not user:
+            return
+
+        state = self.app.state
+        visible = {appointment['id'] for appointment in self.visible_appointments(user)}
+        state['appointments'] = [appointment for appointment in state['appointments']
+                                 if not (str(appointment['id']) == self.form.get('appointment_id')
+                                         and appointment['id'] in visible)]
+        self.redirect('appointment')
+
+    def bill_options(self, user):
+        users = self.app.state['users']
+        billed = {bill['appointment'] for bill in self.app.state['bills']}
+        return [(str(appointment['id']), '{} {} {}'.format(full_name(users[appointment['patient']]),
+                                                           appointment['datetime'].strftime(DATE_TIME_FORMAT),
+                                                           appointment['service']))
+                for appointment in self.visible_appointments(user) if appointment['id'] not in billed]
+
+    def bills_table(self, user):
+        users = self.app.state['users']
+        appointments = {appointment['id']: appointment for appointment in self.app.state['appointments']}
+        rows = []
+        for bill in self.app.state['bills']:
+            appointment = appointments.get(bill['appointment'])
+            if appointment is not None and user['tel_no'] in (appointment['doctor'], appointment['patient']):
+                rows.append([str(bill['id']), full_name(users[appointment['patient']]), appointment['service'],
+                             bill['date'].strftime(DATE_TIME_FORMAT)])
+        return table_html(['№', 'Пациент', 'Услуга', 'Дата'], rows)
+
+    def get_bills(self):
+        user = self.require_user()
+        if user:
+            self.render_bills(user)
+
+    def render_bills(self, user, errors=()):
+        if user['doctor']:
+            self.render_form_page('Счета', [select_html('select_appointments', 'Запись', self.bill_options(user))],
+                                  'Создать счет', errors, self.bills_table(user))
+        else:
+            self.respond(200, self.page('Счета', self.bills_table(user)))
+
+    def post_bills(self):
+        user = self.require_user(doctor=True)
+        if not user:
+            return
+
+        if self.form.get('select_appointments') not in {value for value, _ in self.bill_options(user)}:
+            self.render_bills(user, [EMPTY_FIELD_TEXT])
+            return
+        self.app.state['bills'].append({'id': self.app.new_id(), 'appointment': int(self.form['select_appointments']),
+                                        'date': datetime.now()})
+        self.redirect('bills')
+
+    def medical_history_table(self, user):
+        users = self.app.state['users']
+        rows = [[full_name(users[entry['author']]), full_name(users[entry['patient']]),
+                 entry['date'].strftime(DATE_TIME_FORMAT), entry['text']]
+                for entry in self.app.state['medical_history']
+                if user['doctor'] or entry['patient'] == user['tel_no']]
+        return table_html(['Автор', 'Пациент', 'Дата', 'Запись'], rows)
+
+    def render_medical_history(self, user, errors=()):
+        if user['doctor']:
+            fields = [select_html('select_patient', 'Пациент', [full_name(patient) for patient in self.patients()]),
+                      '<label for="history_text">Запись</label><textarea id="history_text" name="history_text">'
+                      '</textarea>']
+            self.render_form_page('Медицинская история', fields, 'Добавить запись', errors,
+                                  self.medical_history_table(user))
+        else:
+            self.respond(200, self.page('Медицинская история', self.medical_history_table(user)))
+
+    def get_medical_history(self):
+        user = self.require_user()
+        if user:
+            self.render_medical_history(user)
+
+    def post_medical_history(self):
+        user = self.require_user(doctor=True)
+        if not user:
+            return
+
+        patient = self.find_user(self.form.get('select_patient'), False)
+        text = self.form.get('history_text', '').strip()
+        if patient is None or not text:
+            self.render_medical_history(user, [EMPTY_FIELD_TEXT])
+            return
+        self.app.state['medical_history'].append({'author': user['tel_no'], 'patient': patient['tel_no'],
+                                                  'date': datetime.now(), 'text': text})
+        self.redirect('medical_history')
+
+    def render_cost_accounting(self, errors=()):
+        materials = self.app.state['materials']
+        fields = [select_html('select_material', 'Материал', list(materials)),
+                  input_html('amount', 'Количество', self.form_value('amount'))]
+        table = table_html(['№', 'Материал', 'Количество'],
+                           [[str(index), name, str(amount)] for index, (name, amount) in
+                            enumerate(materials.items(), 1)])
+        self.render_form_page('Учет расходов', fields, 'Списать', errors, table)
+
+    def get_cost_accounting(self):
+        if self.require_user(doctor=True):
+            self.render_cost_accounting()
+
+    def post_cost_accounting(self):
+        user = self.require_user(doctor=True)
+        if not user:
+            return
+
+        materials = self.app.state['materials']
+        name = self.form.get('select_material')
+        try:
+            amount = int(self.form.get('amount', ''))
+        except ValueError:
+            amount = 0
+        if name not in materials or not 0 < amount <= materials[name]:
+            self.render_cost_accounting([WRONG_COUNT_MATERIAL_ORDER_TEXT])
+            return
+
+        materials[name] -= amount
+        self.app.state['orders'].append({'id': self.app.new_id(), 'author': user['tel_no'], 'material': name,
+                                         'amount': amount, 'date': datetime.now()})
+        self.redirect('cost_accounting')
+
+    def get_orders(self):
+        if not self.require_user(doctor=True):
+            return
+
+        users = self.app.state['users']
+        rows = [[str(order['id']), full_name(users[order['author']]), order['material'], str(order['amount']),
+                 order['date'].strftime(DATE_TIME_FORMAT)] for order in self.app.state['orders']]
+        self.respond(200, self.page('Заказы', table_html(['№', 'Автор', 'Материал', 'Количество', 'Дата'], rows)))
+    # endregion
+
+    def form_value(self, field):
+        return getattr(self, 'form', {}).get(field, '')
+
+
+def errors_html(errors):
+    """
+    :param errors: Сообщения об ошибках.
+    :return: Разметка сообщений.
+    """
+    return ['<span class="error">{}</span>'.format(escape(error)) for error in errors]
+
+
+def input_html(field_id, label, value='', input_type='text'):
+    """
+    :param field_id: Идентификатор и имя поля.
+    :param label: Подпись поля.
+    :param value: Значение поля.
+    :param input_type: Тип поля.
+    :return: Разметка поля ввода.
+    """
+    return '<label for="{0}">{1}</label><input id="{0}" name="{0}" type="{2}" value="{3}">'.format(
+        field_id, escape(label), input_type, escape(value))
+
+
+def select_html(field_id, label, options):
+    """
+    :param field_id: Идентификатор и имя поля.
+    :param label: Подпись поля.
+    :param options: Варианты: строки или пары (значение, текст).
+    :return: Разметка поля выбора.
+    """
+    options = [option if isinstance(option, tuple) else (option, option) for option in options]
+    return '<label for="{0}">{1}</label><select id="{0}" name="{0}">{2}</select>'.format(
+        field_id, escape(label), ''.join('<option value="{}">{}</option>'.format(escape(value), escape(text))
+                                         for value, text in options))
+
+
+def table_html(header, rows, raw_columns=()):
+    """
+    :param header: Заголовки столбцов.
+    :param rows: Строки таблицы.
+    :param raw_columns: Номера столбцов с готовой разметкой.
+    :return: Разметка таблицы.
+    """
+    head = '<tr>{}</tr>'.format(''.join('<th>{}</th>'.format(escape(title)) for title in header))
+    body = ''.join('<tr>{}</tr>'.format(''.join('<td>{}</td>'.format(cell if index in raw_columns else escape(cell))
+                                                for index, cell in enumerate(row))) for row in rows)
+    return '<table><thead>{}</thead><tbody>{}</tbody></table>'.format(head, body)
+
+
+if __name__ == '__main__':
+    stand_in = DentistryStandIn().start(5000)
+    print('Заменитель dentistry-flask запущен: {}'.format(stand_in.base_url))
+    stand_in.thread.join()
@@ -0,0 +1,247 @@
+from datetime import datetime
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+import dentistry_selenium
+import dentistry_state
+
+# region Константы
+MANIFEST_NAME = 'manifest.json'
+"""Имя файла со списком шагов тестов."""
+
+OBJECTS_DIR = 'objects'
+"""Каталог сжатых снимков страниц внутри хранилища."""
+
+PARSER_HELPERS = ('count_material', 'find_order', 'find_medical_history')
+"""Помощники, разбирающие уже полученные страницы: при воспроизведении они выполняются по-настоящему."""
+# endregion
+
+
+class SnapshotStore:
+    """
+    Хранилище снимков страниц с адресацией по содержимому: каждая уникальная страница хранится один раз в сжатом виде,
+    а манифест связывает шаги тестов с хэшами страниц.
+    """
+
+    def __init__(self, root):
+        """
+        :param root: Каталог хранилища.
+        """
+        self.root = root
+        self.lock = threading.Lock()
+
+    def object_path(self, digest):
+        """
+        :param digest: Хэш содержимого страницы.
+        :return: Путь к файлу снимка.
+        """
+        return os.path.join(self.root, OBJECTS_DIR, digest[:2], digest[2:] + '.html.gz')
+
+    def put(self, html_text):
+        """
+        Сохраняет страницу, если такой страницы еще нет в хранилище.
+        :param html_text: Текст html документа.
+        :return: Хэш содержимого страницы.
+        """
+        data = html_text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+            with gzip.open(temporary_path, 'wb') as snapshot_file:
+                snapshot_file.write(data)
+            os.replace(temporary_path, path)
+
+        return digest
+
+    def get(self, digest):
+        """
+        :param digest: Хэш содержимого страницы.
+        :return: Текст html документа.
+        """
+        with gzip.open(self.object_path(digest), 'rb') as snapshot_file:
+            return snapshot_file.read().decode('utf-8')
+
+    def encode(self, value):
+        """
+        Преобразует результат помощника в JSON-совместимый вид, сохраняя страницы в хранилище.
+        :param value: Результат помощника.
+        :return: Закодированное значение.
+        """
+        if isinstance(value, (dentistry_selenium.PageSnapshot, str)):
+            return {'page': self.put(str(value))}
+        if isinstance(value, dentistry_selenium.CompactPage):
+            return {'compact': {'text': value.text,
+                                'rows': [[type(row).__name__] + [encode_cell(item) for item in row]
+                                         for row in value.rows]}}
+        if isinstance(value, dict):
+            return {'dict': {key: self.encode(item) for key, item in value.items()}}
+        if isinstance(value, datetime):
+            return {'datetime': value.isoformat()}
+        return {'value': value}
+
+    def decode(self, encoded):
+        """
+        Восстанавливает результат помощника.
+        :param encoded: Закодированное значение.
+        :return: Результат помощника, страницы - строками, результаты компактного получения - CompactPage.
+        """
+        if 'page' in encoded:
+            return self.get(encoded['page'])
+        if 'compact' in encoded:
+            record_types = {record_type.__name__: record_type
+                            for record_type in dentistry_selenium.Record.__subclasses__()}
+            return dentistry_selenium.CompactPage(
+                encoded['compact']['text'],
+                [decode_row(record_types[row[0]], row[1:]) for row in encoded['compact']['rows']])
+        if 'dict' in encoded:
+            return {key: self.decode(item) for key, item in encoded['dict'].items()}
+        if 'datetime' in encoded:
+            return datetime.fromisoformat(encoded['datetime'])
+        return encoded['value']
+
+    def write_manifest(self, tests, suffix=''):
+        """
+        Записывает шаги тестов.
+        :param tests: Словарь идентификатор теста -> список шагов.
+        :param suffix: Суффикс файла манифеста, например, идентификатор процесса pytest-xdist.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        name = MANIFEST_NAME if not suffix else MANIFEST_NAME.replace('.json', '.{}.json'.format(suffix))
+        with open(os.path.join(self.root, name), 'w', encoding='utf-8') as manifest_file:
+            json.dump(tests, manifest_file, ensure_ascii=False, indent=1)
+
+    def read_manifest(self):
+        """
+        Читает шаги тестов из всех манифестов хранилища.
+        :return: Словарь идентификатор теста -> список шагов.
+        """
+        tests = {}
+        for path in sorted(glob.glob(os.path.join(self.root, MANIFEST_NAME.replace('.json', '*.json')))):
+            with open(path, encoding='utf-8') as manifest_file:
+                tests.update(json.load(manifest_file))
+        return tests
+
+
+def encode_cell(value):
+    """
+    :param value: Разобранное значение ячейки строки таблицы: текст, число, дата или None.
+    :return: Значение JSON: даты - в формате ISO, остальные значения без изменений.
+    """
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def decode_row(record_type, cells):
+    """
+    :param record_type: Тип строки таблицы - подкласс Record.
+    :param cells: Значения ячеек, закодированные encode_cell.
+    :return: Строка таблицы. Даты восстанавливаются в столбцах, которые разбираются parse_date.
+    """
+    return record_type(*(datetime.fromisoformat(cell) if convert is dentistry_selenium.parse_date and cell is not None
+                         else cell for convert, cell in zip(record_type.converters, cells)))
+
+
+class SnapshotSession:
+    """
+    Запись или воспроизведение результатов помощников. Записываются только вызовы верхнего уровня: вложенные вызовы
+    (например, login внутри cached_login) при воспроизведении не выполняются. Вместе с шагами теста записывается,
+    восстанавливалось ли состояние веб-сервиса: от этого зависят шаги теста (например, отмена созданной записи).
+    """
+
+    def __init__(self, store, replay=False):
+        """
+        :param store: Хранилище снимков.
+        :param replay: Воспроизводить ли записанные результаты вместо выполнения помощников.
+        """
+        self.store = store
+        self.replay = replay
+        # В записях без признака восстановления состояния шаги хранятся списком.
+        self.tests = {name: test if isinstance(test, dict) else {'state': False, 'steps': test}
+                      for name, test in store.read_manifest().items()} if replay else {}
+        self.test = None
+        self.steps = None
+        self.depth = 0
+
+    def start_test(self, name, state=False):
+        """
+        Начинает запись или воспроизведение шагов теста.
+        :param name: Идентификатор теста.
+        :param state: Восстанавливается ли состояние веб-сервиса после теста (при воспроизведении не используется).
+        """
+        self.test = name
+        if self.replay:
+            if name not in self.tests:
+                raise LookupError('Для теста {} нет записанных снимков'.format(name))
+            self.steps = list(self.tests[name]['steps'])
+        else:
+            self.steps = []
+            self.tests[name] = {'state': state, 'steps': self.steps}
+
+    def replayed_state(self, name):
+        """
+        Возвращает значение фикстуры state при воспроизведении теста: тест должен выполнить те же шаги, что и при
+        записи, хотя веб-сервиса при воспроизведении нет.
+        :param name: Идентификатор теста.
+        :return: dentistry_state.REPLAYED_STATE, если при записи состояние восстанавливалось, иначе None.
+        """
+        test = self.tests.get(name)
+        return dentistry_state.REPLAYED_STATE if test is not None and test['state'] else None
+
+    def finish_test(self):
+        """
+        Завершает шаги теста.
+        """
+        self.test = None
+        self.steps = None
+
+    def hook(self, name, call):
+        """
+        Обработчик вызовов помощников для dentistry_selenium.HELPER_HOOKS.
+        :param name: Название помощника.
+        :param call: Вызов помощника.
+        :return: Результат помощника или записанный результат.
+        """
+        if self.steps is None or self.depth or name in PARSER_HELPERS:
+            return call()
+
+        if self.replay:
+            if not self.steps:
+                raise LookupError('В записи теста {} нет шага {}'.format(self.test, name))
+            step = self.steps.pop(0)
+            if step['helper'] != name:
+                raise LookupError('В записи теста {} ожидался шаг {}, вызван {}'.format(self.test, step['helper'],
+                                                                                       name))
+            return self.store.decode(step['value'])
+
+        self.depth += 1
+        try:
+            result = call()
+        finally:
+            self.depth -= 1
+        self.steps.append({'helper': name, 'value': self.store.encode(result)})
+        return result
+
+    def save(self, suffix=''):
+        """
+        Записывает манифест после записи.
+        :param suffix: Суффикс файла манифеста.
+        """
+        if not self.replay:
+            self.store.write_manifest(self.tests, suffix)
+
+
+def install(session):
+    """
+    Подключает запись или воспроизведение к помощникам dentistry_selenium.
+    :param session: Сессия записи или воспроизведения.
+    :return: Сессия.
+    """
+    # Воспроизведение должно срабатывать раньше остальных обработчиков, чтобы не вызывать помощники.
+    dentistry_selenium.HELPER_HOOKS.insert(0, session.hook)
+    return session
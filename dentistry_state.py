@@ -0,0 +1,147 @@
+import sqlite3
+import time
+
+# region Константы
+BACKUP_PAGES = -1
+"""Количество страниц базы данных, копируемых за один шаг sqlite3 backup: все страницы за один шаг."""
+# endregion
+
+
+class SqliteState:
+    """
+    Состояние dentistry-flask в базе данных SQLite. Снимок хранится в базе данных в памяти и копируется обратно
+    через sqlite3 backup API, поэтому восстановление не требует перезапуска веб-сервиса.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Путь к файлу базы данных dentistry-flask.
+        """
+        self.path = path
+        self.snapshot_connection = None
+
+    def snapshot(self):
+        """
+        Сохраняет снимок базы данных.
+        """
+        if self.snapshot_connection is not None:
+            self.snapshot_connection.close()
+        self.snapshot_connection = sqlite3.connect(':memory:', check_same_thread=False)
+        with sqlite3.connect(self.path) as source:
+            source.backup(self.snapshot_connection, pages=BACKUP_PAGES)
+
+    def restore(self):
+        """
+        Восстанавливает базу данных из снимка.
+        """
+        target = sqlite3.connect(self.path)
+        try:
+            self.snapshot_connection.backup(target, pages=BACKUP_PAGES)
+        finally:
+            target.close()
+
+    def close(self):
+        """
+        Освобождает снимок.
+        """
+        if self.snapshot_connection is not None:
+            self.snapshot_connection.close()
+            self.snapshot_connection = None
+
+
+class StandInState:
+    """
+    Состояние заменителя dentistry-flask, хранящееся в памяти его процесса.
+    """
+
+    def __init__(self, server):
+        """
+        :param server: Заменитель веб-сервиса dentistry_server.DentistryStandIn.
+        """
+        self.server = server
+        self.saved = None
+
+    def snapshot(self):
+        """
+        Сохраняет копию состояния.
+        """
+        self.saved = self.server.dump_state()
+
+    def restore(self):
+        """
+        Заменяет состояние сохраненной копией.
+        """
+        self.server.load_state(self.saved)
+
+    def close(self):
+        """
+        Освобождает копию состояния.
+        """
+        self.saved = None
+
+
+class StateManager:
+    """
+    Снимок состояния веб-сервиса после начального заполнения и его восстановление между тестами вместо удаления
+    созданных тестами данных через интерфейс.
+    """
+
+    def __init__(self, backend):
+        """
+        :param backend: Хранилище состояния: SqliteState или StandInState.
+        """
+        self.backend = backend
+        self.restore_hooks = []
+        self.restore_seconds = []
+
+    def on_restore(self, hook):
+        """
+        Добавляет обработчик, вызываемый после восстановления, например, для сброса соединений или кэшей веб-сервиса,
+        хранящих прежнее состояние.
+        :param hook: Функция без аргументов.
+        :return: Обработчик.
+        """
+        self.restore_hooks.append(hook)
+        return hook
+
+    def snapshot(self):
+        """
+        Сохраняет снимок текущего состояния.
+        :return: Менеджер состояния.
+        """
+        self.backend.snapshot()
+        return self
+
+    def restore(self):
+        """
+        Восстанавливает состояние из снимка и вызывает обработчики восстановления.
+        """
+        start = time.perf_counter()
+        self.backend.restore()
+        for hook in self.restore_hooks:
+            hook()
+        self.restore_seconds.append(time.perf_counter() - start)
+
+    def close(self):
+        """
+        Освобождает снимок.
+        """
+        self.backend.close()
+
+
+class ReplayedState:
+    """
+    Менеджер состояния при воспроизведении снимков теста, записанного с восстановлением состояния: веб-сервиса нет,
+    и восстанавливать нечего.
+    """
+
+    def restore(self):
+        """
+        Ничего не делает.
+        """
+
+
+# region Состояние при воспроизведении
+REPLAYED_STATE = ReplayedState()
+"""Значение фикстуры state при воспроизведении теста, записанного с восстановлением состояния."""
+# endregion
@@ -1,35 +1,62 @@
 import datetime
+import os
+import time
 
 import pytest
-from dentistry_selenium import login, registration, new_appointment_select_service, new_appointment_select_doctors, \
-    new_appointment_select_date, new_appointment_select_time, new_appointment_submit, cancel_appointment, \
-    new_cost_accounting_entry, count_material, find_order, new_medical_history, find_medical_history
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+from dentistry_selenium import login, cached_login, registration, new_appointment_select_service, \
+    new_appointment_select_doctors, new_appointment_select_date, new_appointment_select_time, new_appointment_submit, \
+    cancel_appointment, new_cost_accounting_entry, count_material, find_order, new_medical_history, \
+    find_medical_history, navigate, current_time
+from dentistry_data import APPOINTMENT_DATE_FORMAT, APPOINTMENT_DAYS_AHEAD, DOCTOR_DATA_LOGIN, \
+    DOCTORS_SERVICE_INSPECTIONS, DOCTORS_SERVICE_VENEER, EXISTING_PATIENT_DATA_LOGIN, MATERIAL_COUNT_GOOD_TEST, \
+    MATERIAL_TEST_NAME, SERVICE_INSPECTION, SERVICE_VENEER
+from dentistry_drivers import BLANK_PAGE, DriverPool, block_urls, blocked_urls, create_chrome_driver, \
+    create_remote_driver
+from dentistry_instrumentation import instrument_driver
+from dentistry_nodes import DriverLease, NodePool, is_driver_lost, parse_nodes
+from dentistry_scheduler import ANONYMOUS_ROLE, is_signed_in, requirements
+from dentistry_trace import trace_driver
+
+# region Параллельный запуск.
+WORKER_ID = os.environ.get('PYTEST_XDIST_WORKER', 'gw0')
+"""Идентификатор процесса pytest-xdist, выполняющего тесты."""
+
+WORKER_INDEX = int(WORKER_ID[2:]) if WORKER_ID[2:].isdigit() else 0
+"""Номер процесса, по которому разделяются тестовые данные параллельных процессов."""
+
+WORKER_COUNT = int(os.environ.get('PYTEST_XDIST_WORKER_COUNT', '1'))
+"""Количество процессов pytest-xdist, которые делят сессии узлов WebDriver."""
+
+WORKER_SUFFIX = str(WORKER_INDEX) if WORKER_INDEX else ''
+"""Суффикс тестовых данных процесса, у первого процесса данные совпадают с исходными."""
+
+RUN_NUMBER = int(os.environ.get('TEST_RUN_ID') or time.time()) % 10 ** 7
+"""Номер запуска тестов (по умолчанию - время запуска в секундах), по которому различаются данные, создаваемые при
+каждом запуске, чтобы повторный запуск против той же базы данных не создавал их повторно."""
+
+SHARED_MATERIAL_GROUP = 'shared_material'
+"""Группа тестов, изменяющих общий остаток материала и поэтому выполняющихся в одном процессе: материал должен уже
+существовать в веб-сервисе, создать свой материал для каждого процесса тесты не могут."""
+# endregion
+
+# region Роли тестов.
+PATIENT_ROLE = 'patient'
+"""Роль тестов, выполняемых после входа существующего пациента."""
+
+DOCTOR_ROLE = 'doctor'
+"""Роль тестов, выполняемых после входа лечащего врача."""
+# endregion
 
 # region Данные для тестирования.
 NEW_PATIENT_REGISTRATION_DATA = {'surname': 'Тестов', 'name': 'Тест', 'middle_name': 'Тестович',
-                                 'birthday': '01.01.1970', 'telno': '89000000001', 'email': 'test@test.com',
+                                 'birthday': '01.01.1970', 'telno': '89{:02d}{:07d}'.format(WORKER_INDEX, RUN_NUMBER),
+                                 'email': 'test{}.{}@test.com'.format(WORKER_INDEX, RUN_NUMBER),
                                  'password': 'qwerty', 'password_again': 'qwerty'}
-"""Данные для регистрации нового пациента."""
-
-DOCTOR_DATA_LOGIN = {'full_name': 'Николаевна Анна Михайловна', 'telno': '89023456781', 'password': 'qwerty'}
-"""Данные для входа лечащего врача."""
-
-EXISTING_PATIENT_DATA_LOGIN = {'full_name': 'Тестов Тест Тестович',
-                               'telno': '89127658910',
-                               'password': 'qwerty'}
-"""Данные для входа существующего пользователя."""
+"""Данные для регистрации нового пациента: номер телефона и почта различаются для каждого процесса и запуска."""
 
 # endregion
 
 # region Константы.
-CHROME_WEB_DRIVER_PATH = r'C:\\dentistry-selenium\chromedriver-win64\chromedriver.exe'
-"""Путь к веб драйверу."""
-
-DRIVER_TIME_WAITING = 10
-"""Время ожидания веб-драйвера в секундах."""
-
 LOGOUT_TEXT = 'Выход'
 """Текст кнопки выхода."""
 
@@ -48,22 +75,6 @@ WRONG_DATE_APPOINTMENT_TEXT = 'Дата записи должна быть по
 WRONG_COUNT_MATERIAL_ORDER_TEXT = '0 &lt; количество &lt;= максимальное значение в таблице'
 """Текст сообщения неверного количества материалоя для создания записи учета материалов."""
 
-SERVICE_INSPECTION = 'Осмотр'
-"""Название медицинского осмотра при записи."""
-
-SERVICE_VENEER = 'Винир'
-"""Название услуги для установки винира при записи."""
-
-DOCTORS_SERVICE_INSPECTIONS = ['Николаевна Анна Михайловна', 'Михайлов Станислав Александрович',
-                               'Сергеев Сергей Андреевич', 'Иванов Николай Александрович']
-"""Список врачей для медицинского осмотра."""
-
-DOCTORS_SERVICE_VENEER = ['Михайлов Станислав Александрович']
-"""Список врачей для установки винира."""
-
-DATE_TEST_APPOINTMENT_GOOD = '01.01.2025'
-"""Дата записи для корректного результата тестирования."""
-
 TIME_TEST_APPOINTMENT_GOOD = '8:00'
 """Время записи для корректного результата тестирования."""
 
@@ -74,32 +85,97 @@ TIME_TEST_CANCEL_APPOINTMENT = TIME_TEST_APPOINTMENT_GOOD if len(TIME_TEST_APPOI
     '0' + TIME_TEST_APPOINTMENT_GOOD
 """Время отмены записи."""
 
-MATERIAL_TEST_NAME = 'Иглы'
-"""Название материала для тестирования."""
-
-MATERIAL_COUNT_GOOD_TEST = 1
-"""Количество материала для корректного результата тестирования."""
-
 MATERIAL_COUNT_BAD_TEST = 10 ** 10
 """Количество для тестирования для некорректного результата тестирования."""
 
-DIAGNOSIS_MEDICAL_HISTORY = 'Тестовый диагноз.'
+DIAGNOSIS_MEDICAL_HISTORY = 'Тестовый диагноз{}.'.format(WORKER_SUFFIX)
 """Текст диагноза медицинской истории."""
 
 # endregion
 
 
-@pytest.fixture
-def setup_chrome_driver_fixture():
+def appointment_date_good():
+    """
+    Дата записи для корректного результата тестирования: через APPOINTMENT_DAYS_AHEAD дней после текущей даты, у
+    каждого процесса свой день. Текущая дата берется из current_time, поэтому при воспроизведении снимков дата
+    совпадает с датой записи снимков.
+    :return: Дата записи.
+    """
+    return (current_time().date() + datetime.timedelta(days=APPOINTMENT_DAYS_AHEAD + WORKER_INDEX)).strftime(
+        APPOINTMENT_DATE_FORMAT)
+
+
+@pytest.fixture(scope='session')
+def driver_pool(request):
     """
-    Установка настроек Chrome веб-драйвера.
-    :return: Веб-драйвер.
+    Пул заранее запущенных Chrome веб-драйверов на всю сессию тестирования или, если указан --driver-nodes, пул
+    сессий на удаленных серверах WebDriver.
+    :param request: Запрос фикстуры.
+    :return: Пул веб-драйверов.
     """
-    driver = webdriver.Chrome(service=Service(CHROME_WEB_DRIVER_PATH))
-    driver.implicitly_wait(DRIVER_TIME_WAITING)
-    return driver
+    def wrap(driver):
+        if request.config.getoption('--instrumentation'):
+            driver = instrument_driver(driver)
+        if not request.config.getoption('--no-trace'):
+            driver = trace_driver(driver)
+        return driver
+
+    nodes = parse_nodes(request.config.getoption('--driver-nodes'))
+    if nodes:
+        pool = NodePool(nodes, lambda url: wrap(create_remote_driver(url)), offset=WORKER_INDEX,
+                        workers=WORKER_COUNT).start()
+    else:
+        pool = DriverPool(lambda: wrap(create_chrome_driver())).start()
+    yield pool
+    pool.close()
+    if nodes:
+        request.config.node_stats.append(pool.stats())
 
 
+@pytest.fixture
+def setup_chrome_driver_fixture(request):
+    """
+    Выдача Chrome веб-драйвера из пула на время теста. При воспроизведении снимков браузер не запускается.
+    Тестам роли с входом из маркера requires выдается веб-драйвер, в котором уже открыта сессия этой роли, если он есть.
+    Маркер allow_resources('*.css', ...) разрешает тесту загрузку ресурсов, блокируемых облегченным профилем.
+    :param request: Запрос фикстуры.
+    :return: Веб-драйвер или None при воспроизведении снимков.
+    """
+    if request.config.getoption('--snapshots-replay'):
+        yield None
+        return
+
+    # Тесты одной роли выполняются подряд, поэтому веб-драйвер возвращается в пул без сброса сессии.
+    required = requirements(request.node)
+    warm = is_signed_in(required.role) and not request.config.getoption('--no-schedule')
+    # Тесту, которому нужны ресурсы, заблокированные облегченным профилем, они разрешаются только на время теста.
+    marker = request.node.get_closest_marker('allow_resources')
+    if marker is not None:
+        # Шаблоны проверяются до выдачи веб-драйвера: ошибка в маркере не должна оставить веб-драйвер вне пула.
+        blocked_urls(marker.args)
+    lease = DriverLease(request.getfixturevalue('driver_pool'), required.role if warm else None,
+                        (lambda driver: block_urls(driver, marker.args)) if marker is not None else None)
+    # Если браузер или узел упадет во время теста, conftest повторит тест на новом веб-драйвере.
+    request.node.driver_lease = lease
+
+    yield lease.driver
+
+    try:
+        if marker is not None:
+            block_urls(lease.driver)
+        if warm:
+            # Следующий тест начинает с загрузки своей страницы: текущая может показывать состояние до его
+            # восстановления и заполненные тестом поля.
+            navigate(lease.driver, BLANK_PAGE)
+    except Exception as error:
+        lease.release(broken=True)
+        if not is_driver_lost(error):
+            raise
+    else:
+        lease.release(tag=required.role if warm else None)
+
+
+@pytest.mark.requires(ANONYMOUS_ROLE, 'REGISTRATION_LINK', mutates=True)
 def test_registration_good_data(setup_chrome_driver_fixture):
     """
     Тестирование регистрации нового пользователя.
@@ -116,11 +192,12 @@ def test_registration_good_data(setup_chrome_driver_fixture):
                  NEW_PATIENT_REGISTRATION_DATA['password'],
                  NEW_PATIENT_REGISTRATION_DATA['password_again'])
 
-    assert LOGOUT_TEXT in login(setup_chrome_driver_fixture,
-                                NEW_PATIENT_REGISTRATION_DATA['telno'],
-                                NEW_PATIENT_REGISTRATION_DATA['password'],)
+    assert LOGOUT_TEXT in cached_login(setup_chrome_driver_fixture,
+                                       NEW_PATIENT_REGISTRATION_DATA['telno'],
+                                       NEW_PATIENT_REGISTRATION_DATA['password'])
 
 
+@pytest.mark.requires(ANONYMOUS_ROLE, 'LOGIN_LINK')
 def test_login_good_data(setup_chrome_driver_fixture):
     """
     Тестирование входа существующего пользователя с хорошими данными.
@@ -132,6 +209,7 @@ def test_login_good_data(setup_chrome_driver_fixture):
                                 EXISTING_PATIENT_DATA_LOGIN['password'])
 
 
+@pytest.mark.requires(ANONYMOUS_ROLE, 'LOGIN_LINK')
 def test_login_empty_data(setup_chrome_driver_fixture):
     """
     Тестирование входа с незаполненными данными.
@@ -141,6 +219,7 @@ def test_login_empty_data(setup_chrome_driver_fixture):
     assert login(setup_chrome_driver_fixture, '', '').count(EMPTY_FIELD_TEXT) == 2
 
 
+@pytest.mark.requires(ANONYMOUS_ROLE, 'LOGIN_LINK')
 def test_login_wrong_data(setup_chrome_driver_fixture):
     """
     Тестирования входа с неверными данными входа.
@@ -153,37 +232,46 @@ def test_login_wrong_data(setup_chrome_driver_fixture):
                                      NEW_PATIENT_REGISTRATION_DATA['password'])
 
 
-def test_new_appointment_good_data(setup_chrome_driver_fixture):
+@pytest.mark.requires(PATIENT_ROLE, 'NEW_APPOINTMENT_LINK', mutates=True)
+def test_new_appointment_good_data(setup_chrome_driver_fixture, state):
     """
     Тестирование создания новой записи на прием с корректными данными.
     :param setup_chrome_driver_fixture: Веб-драйвер.
+    :param state: Менеджер состояния веб-сервиса или None.
     :return: Результат тестирования.
     """
-    login(setup_chrome_driver_fixture, EXISTING_PATIENT_DATA_LOGIN['telno'], EXISTING_PATIENT_DATA_LOGIN['password'])
+    appointment_date = appointment_date_good()
+    cached_login(setup_chrome_driver_fixture, EXISTING_PATIENT_DATA_LOGIN['telno'],
+                 EXISTING_PATIENT_DATA_LOGIN['password'])
     new_appointment_select_service(setup_chrome_driver_fixture, SERVICE_INSPECTION)
     new_appointment_select_doctors(setup_chrome_driver_fixture, DOCTORS_SERVICE_INSPECTIONS[0])
-    new_appointment_select_date(setup_chrome_driver_fixture, DATE_TEST_APPOINTMENT_GOOD)
+    new_appointment_select_date(setup_chrome_driver_fixture, appointment_date)
 
     new_appointment_select_time(setup_chrome_driver_fixture, TIME_TEST_APPOINTMENT_GOOD)
     created_appointment = new_appointment_submit(setup_chrome_driver_fixture)
 
-    cancel_appointment(setup_chrome_driver_fixture, DATE_TEST_APPOINTMENT_GOOD + ' ' + TIME_TEST_CANCEL_APPOINTMENT,
-                       EXISTING_PATIENT_DATA_LOGIN['full_name'])
+    # Запись удаляется восстановлением состояния после теста, если оно включено.
+    if state is None:
+        cancel_appointment(setup_chrome_driver_fixture,
+                           appointment_date + ' ' + TIME_TEST_CANCEL_APPOINTMENT,
+                           EXISTING_PATIENT_DATA_LOGIN['full_name'])
 
     assert SERVICE_INSPECTION in created_appointment \
            and DOCTORS_SERVICE_INSPECTIONS[0] in created_appointment \
-           and DATE_TEST_APPOINTMENT_GOOD in created_appointment \
+           and appointment_date in created_appointment \
            and TIME_TEST_APPOINTMENT_GOOD in created_appointment \
            and CANCEL_APPOINTMENT_TEXT in created_appointment
 
 
+@pytest.mark.requires(PATIENT_ROLE, 'NEW_APPOINTMENT_LINK')
 def test_new_appointment_wrong_data(setup_chrome_driver_fixture):
     """
     Тестирование создания новой записи на прием с неверными данными.
     :param setup_chrome_driver_fixture: Веб-драйвер.
     :return: Результат тестирования.
     """
-    login(setup_chrome_driver_fixture, EXISTING_PATIENT_DATA_LOGIN['telno'], EXISTING_PATIENT_DATA_LOGIN['password'])
+    cached_login(setup_chrome_driver_fixture, EXISTING_PATIENT_DATA_LOGIN['telno'],
+                 EXISTING_PATIENT_DATA_LOGIN['password'])
 
     new_appointment_select_service(setup_chrome_driver_fixture, SERVICE_INSPECTION)
     new_appointment_select_doctors(setup_chrome_driver_fixture, DOCTORS_SERVICE_INSPECTIONS[0])
@@ -192,15 +280,17 @@ def test_new_appointment_wrong_data(setup_chrome_driver_fixture):
     assert WRONG_DATE_APPOINTMENT_TEXT in new_appointment_submit(setup_chrome_driver_fixture)
 
 
+@pytest.mark.requires(DOCTOR_ROLE, 'COST_ACCOUNTING_LINK', mutates=True)
+@pytest.mark.xdist_group(SHARED_MATERIAL_GROUP)
 def test_new_cost_accounting_good_data(setup_chrome_driver_fixture):
     """
     Тестирование создания новой записи учета расходных материалов с корректными данными.
     :param setup_chrome_driver_fixture: Веб-драйвер.
     :return: Результат тестирования.
     """
-    login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
+    cached_login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
 
-    new_cost_time = datetime.datetime.now()
+    new_cost_time = current_time()
     sources = new_cost_accounting_entry(setup_chrome_driver_fixture, MATERIAL_TEST_NAME, MATERIAL_COUNT_GOOD_TEST)
 
     before_material_count = count_material(sources['before_test'], MATERIAL_TEST_NAME)
@@ -211,15 +301,17 @@ def test_new_cost_accounting_good_data(setup_chrome_driver_fixture):
     assert before_material_count - after_test_count == MATERIAL_COUNT_GOOD_TEST and exist_order
 
 
+@pytest.mark.requires(DOCTOR_ROLE, 'COST_ACCOUNTING_LINK')
+@pytest.mark.xdist_group(SHARED_MATERIAL_GROUP)
 def test_new_cost_accounting_wrong_data(setup_chrome_driver_fixture):
     """
     Тестирование создания новой записи учета расходных материалов с некорректными данными.
     :param setup_chrome_driver_fixture: Веб-драйвер.
     :return: Результат тестирования.
     """
-    login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
+    cached_login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
 
-    new_cost_time = datetime.datetime.now()
+    new_cost_time = current_time()
     sources = new_cost_accounting_entry(setup_chrome_driver_fixture, MATERIAL_TEST_NAME, MATERIAL_COUNT_BAD_TEST)
 
     before_material_count = count_material(sources['before_test'], MATERIAL_TEST_NAME)
@@ -231,40 +323,42 @@ def test_new_cost_accounting_wrong_data(setup_chrome_driver_fixture):
            before_material_count == after_test_count
 
 
+@pytest.mark.requires(DOCTOR_ROLE, 'MEDICAL_HISTORY_LINK', mutates=True)
 def test_new_medical_history_good_data(setup_chrome_driver_fixture):
     """
     Тестирование создания новой записи медицинской истории с корректными данными.
     :param setup_chrome_driver_fixture: Веб-драйвер.
     :return: Результат тестирования.
     """
-    login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
+    cached_login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
 
-    now_medical_history = datetime.datetime.now()
-    new_medical_history(setup_chrome_driver_fixture,
-                        EXISTING_PATIENT_DATA_LOGIN['full_name'],
-                        DIAGNOSIS_MEDICAL_HISTORY)
+    now_medical_history = current_time()
+    medical_history = new_medical_history(setup_chrome_driver_fixture,
+                                          EXISTING_PATIENT_DATA_LOGIN['full_name'],
+                                          DIAGNOSIS_MEDICAL_HISTORY)
 
-    assert find_medical_history(setup_chrome_driver_fixture.page_source,
+    assert find_medical_history(medical_history,
                                 DOCTOR_DATA_LOGIN['full_name'],
                                 EXISTING_PATIENT_DATA_LOGIN['full_name'],
                                 DIAGNOSIS_MEDICAL_HISTORY,
                                 now_medical_history)
 
 
+@pytest.mark.requires(DOCTOR_ROLE, 'MEDICAL_HISTORY_LINK')
 def test_new_medical_history_wrong_data(setup_chrome_driver_fixture):
     """
     Тестирование создания новой записи медицинской истории с некорректными данными.
     :param setup_chrome_driver_fixture: Веб-драйвер.
     :return: Результат тестирования.
     """
-    login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
+    cached_login(setup_chrome_driver_fixture, DOCTOR_DATA_LOGIN['telno'], DOCTOR_DATA_LOGIN['password'])
 
-    now_medical_history = datetime.datetime.now()
-    new_medical_history(setup_chrome_driver_fixture,
-                        EXISTING_PATIENT_DATA_LOGIN['full_name'],
-                        '')
+    now_medical_history = current_time()
+    medical_history = new_medical_history(setup_chrome_driver_fixture,
+                                          EXISTING_PATIENT_DATA_LOGIN['full_name'],
+                                          '')
 
-    assert find_medical_history(setup_chrome_driver_fixture.page_source,
+    assert find_medical_history(medical_history,
                                 DOCTOR_DATA_LOGIN['full_name'],
                                 EXISTING_PATIENT_DATA_LOGIN['full_name'],
                                 '',
@@ -0,0 +1,231 @@
+from collections import deque
+import json
+import os
+import re
+import threading
+import time
+import weakref
+import zipfile
+
+from selenium.common.exceptions import WebDriverException
+
+import dentistry_selenium
+
+# region Константы
+TRACE_SIZE = int(os.environ.get('DRIVER_TRACE_SIZE', '256'))
+"""Количество последних команд веб-драйвера, хранящихся в трассировке."""
+
+RESULT_LIMIT = 200
+"""Количество символов результата команды, сохраняемых в трассировке."""
+
+FAILURE_LIMIT = 4000
+"""Количество последних символов текста ошибки теста, сохраняемых в архиве."""
+
+TRACE_DIR = 'trace_artifacts'
+"""Каталог архивов трассировки упавших тестов по умолчанию."""
+
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+"""Ключ идентификатора элемента в ответах и параметрах W3C WebDriver."""
+# endregion
+
+
+class CommandTrace:
+    """
+    Кольцевой буфер последних команд веб-драйвера. При выполнении команды в буфер добавляется кортеж без
+    форматирования, строки результата обрезаются срезом; записи разбираются только при сохранении архива упавшего
+    теста.
+    """
+
+    def __init__(self, size=TRACE_SIZE):
+        """
+        :param size: Количество хранимых команд.
+        """
+        self.entries = deque(maxlen=size)
+        self.local = threading.local()
+        self.driver = None
+        self.started = time.perf_counter()
+        self.enabled = False
+        self.paused = False
+
+    @property
+    def helpers(self):
+        """
+        :return: Стек активных вызовов помощников текущего потока.
+        """
+        if not hasattr(self.local, 'helpers'):
+            self.local.helpers = []
+        return self.local.helpers
+
+    def start_test(self):
+        """
+        Очищает буфер перед тестом.
+        """
+        self.entries.clear()
+        self.driver = None
+        self.started = time.perf_counter()
+
+    def hook(self, name, call):
+        """
+        Обработчик вызовов помощников для dentistry_selenium.HELPER_HOOKS: запоминает помощник, выдавший команду.
+        :param name: Название помощника.
+        :param call: Вызов помощника.
+        :return: Результат помощника.
+        """
+        self.helpers.append(name)
+        try:
+            return call()
+        finally:
+            self.helpers.pop()
+
+    def record(self, driver, command, params, start, seconds, value, error):
+        """
+        Добавляет выполненную команду в буфер.
+        :param driver: Слабая ссылка на веб-драйвер.
+        :param command: Название команды WebDriver.
+        :param params: Параметры команды.
+        :param start: Время начала команды по time.perf_counter.
+        :param seconds: Время выполнения в секундах.
+        :param value: Результат команды.
+        :param error: Исключение команды или None.
+        """
+        if not self.enabled or self.paused:
+            return
+        if isinstance(value, str):
+            value = value[:RESULT_LIMIT]
+        helpers = self.helpers
+        self.entries.append((start, helpers[-1] if helpers else None, command, params, seconds, value, error))
+        self.driver = driver
+
+    def to_list(self):
+        """
+        :return: Команды буфера в виде списка словарей для архива.
+        """
+        return [{'at_ms': round((start - self.started) * 1000, 3), 'helper': helper, 'command': command,
+                 'target': target(params), 'ms': round(seconds * 1000, 3), 'result': truncate(value),
+                 'error': None if error is None else truncate('{}: {}'.format(type(error).__name__, error))}
+                for start, helper, command, params, seconds, value, error in list(self.entries)]
+
+    def dump(self, path, test, failure):
+        """
+        Сохраняет архив трассировки: команды, снимок экрана и DOM текущей страницы веб-драйвера последней команды.
+        Команды получения снимков в трассировку не попадают.
+        :param path: Путь к архиву.
+        :param test: Идентификатор теста.
+        :param failure: Текст ошибки теста.
+        :return: Путь к архиву.
+        """
+        driver = self.driver() if self.driver is not None else None
+        artifacts = {}
+        self.paused = True
+        try:
+            if driver is not None:
+                for name, capture in (('screenshot.png', lambda: driver.get_screenshot_as_png()),
+                                      ('dom.html', lambda: driver.page_source.encode('utf-8'))):
+                    try:
+                        artifacts[name] = capture()
+                    except WebDriverException as error:
+                        artifacts[name + '.error.txt'] = str(error).encode('utf-8')
+        finally:
+            self.paused = False
+
+        trace = {'test': test, 'failure': failure[-FAILURE_LIMIT:], 'commands': self.to_list()}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('trace.json', json.dumps(trace, ensure_ascii=False, indent=1))
+            for name, data in artifacts.items():
+                # Снимок экрана уже сжат.
+                archive.writestr(name, data, zipfile.ZIP_STORED if name.endswith('.png') else zipfile.ZIP_DEFLATED)
+        return path
+
+
+def target(params):
+    """
+    Возвращает цель команды: локатор поиска элемента, ссылку, идентификатор элемента или первую строку скрипта.
+    :param params: Параметры команды.
+    :return: Текст цели или None.
+    """
+    if not params:
+        return None
+    if 'using' in params:
+        return '{}={}'.format(params['using'], params.get('value'))
+    if 'url' in params:
+        return params['url']
+    if 'id' in params:
+        return 'element={}'.format(params['id'])
+    if 'script' in params:
+        return truncate(params['script'].strip().split('\n', 1)[0])
+    return None
+
+
+def truncate(value):
+    """
+    :param value: Результат команды.
+    :return: Текст результата не длиннее RESULT_LIMIT символов.
+    """
+    if value is None:
+        return None
+    if isinstance(value, dict) and ELEMENT_KEY in value:
+        return 'element={}'.format(value[ELEMENT_KEY])
+    if isinstance(value, list) and value and all(isinstance(item, dict) and ELEMENT_KEY in item for item in value):
+        value = 'elements={}'.format(','.join(item[ELEMENT_KEY] for item in value))
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= RESULT_LIMIT else text[:RESULT_LIMIT] + '...'
+
+
+def artifact_path(root, test, worker=''):
+    """
+    :param root: Каталог архивов.
+    :param test: Идентификатор теста.
+    :param worker: Идентификатор процесса pytest-xdist.
+    :return: Путь к архиву трассировки теста.
+    """
+    name = re.sub(r'[^\w.-]+', '_', test).strip('_')
+    return os.path.join(root, '{}{}.zip'.format(name, '.' + worker if worker else ''))
+
+
+# region Текущая трассировка
+TRACE = CommandTrace()
+"""Трассировка, в которую пишут трассируемые веб-драйверы."""
+# endregion
+
+
+def enable():
+    """
+    Включает трассировку команд и запоминание помощников, выдающих команды.
+    """
+    TRACE.enabled = True
+    if TRACE.hook not in dentistry_selenium.HELPER_HOOKS:
+        dentistry_selenium.HELPER_HOOKS.append(TRACE.hook)
+
+
+def disable():
+    """
+    Отключает трассировку команд.
+    """
+    TRACE.enabled = False
+    if TRACE.hook in dentistry_selenium.HELPER_HOOKS:
+        dentistry_selenium.HELPER_HOOKS.remove(TRACE.hook)
+
+
+def trace_driver(driver):
+    """
+    Оборачивает выполнение команд веб-драйвера (и его элементов) записью в трассировку TRACE.
+    :param driver: Веб-драйвер.
+    :return: Веб-драйвер.
+    """
+    execute = driver.execute
+    driver_ref = weakref.ref(driver)
+
+    def traced_execute(driver_command, params=None):
+        start = time.perf_counter()
+        try:
+            response = execute(driver_command, params)
+        except Exception as error:
+            TRACE.record(driver_ref, driver_command, params, start, time.perf_counter() - start, None, error)
+            raise
+        TRACE.record(driver_ref, driver_command, params, start, time.perf_counter() - start,
+                     response.get('value') if response else None, None)
+        return response
+
+    driver.execute = traced_execute
+    return driver
@@ -0,0 +1,655 @@
+from datetime import datetime, timedelta
+import json
+import weakref
+import zipfile
+
+import pytest
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from dentistry_drivers import DriverPool
+import dentistry_nodes
+import dentistry_selenium
+from dentistry_nodes import NodePool, RemoteNode
+from dentistry_scheduler import ANONYMOUS_ROLE, Requirements, ScheduleReport, estimate, schedule
+from dentistry_selenium import DATE_TIME_FORMAT, SELECT_OPTION_SCRIPT, SELECT_OPTIONS_SCRIPT, CompactPage, \
+    MaterialRecord, MedicalHistoryRecord, OrderRecord, ParsedTable, capture_page, driver_state, find_medical_history, \
+    find_order, is_session_active, navigate, new_appointment_select_date, new_appointment_select_doctors, \
+    new_appointment_select_service, new_appointment_select_time, parse_table, select_by_visible_text, \
+    select_containing, select_index, submit_element
+from dentistry_server import table_html
+from dentistry_snapshots import OBJECTS_DIR, SnapshotSession, SnapshotStore, install
+from dentistry_state import REPLAYED_STATE
+import dentistry_test
+from dentistry_trace import CommandTrace
+from dentistry_wait import WAIT_LOG, WaitRecord, find_optional_element, row_count_stable, text_present, url_changed, \
+    wait_for
+
+# Тесты не используют браузер и не изменяют состояние веб-сервиса.
+pytestmark = pytest.mark.requires(None, None)
+
+# region Константы
+NOW = datetime(2030, 1, 1, 8, 0)
+"""Дата строк тестовых таблиц."""
+
+ORDERS_HEADER = ('№', 'Автор', 'Материал', 'Количество', 'Дата')
+"""Заголовки таблицы заказов."""
+
+ORDERS_ROWS = [['1', 'Иванов И. И.', 'Иглы', '10', NOW.strftime(DATE_TIME_FORMAT)],
+               ['2', 'Петров П. П.', 'Перчатки', '', ''],
+               ['3', 'Иванов И. И.', 'Бинты &amp; вата', '5', (NOW - timedelta(days=1)).strftime(DATE_TIME_FORMAT)]]
+"""Строки таблицы заказов: вторая - с пустыми количеством и датой, третья - с мнемоникой в названии."""
+
+MATERIALS_PAGE = '<html><body><h1>Учет расходов</h1>{}<input type="submit" value="Добавить"></body></html>'.format(
+    table_html(('№', 'Материал', 'Количество'), [['1', 'Иглы', '7'], ['2', 'Перчатки', '30']]))
+"""Страница учета расходов."""
+
+ORDERS_PAGE = '<html><body><script>var rows = "<tr>";</script>{}</body></html>'.format(
+    table_html(ORDERS_HEADER, ORDERS_ROWS, raw_columns=(2,)))
+"""Страница заказов."""
+# endregion
+
+
+class FakeElement:
+    """
+    Элемент страницы без браузера: поле выбора с вариантами или поле ввода.
+    """
+
+    def __init__(self, options=(), text=''):
+        """
+        :param options: Тексты вариантов поля выбора.
+        :param text: Видимый текст элемента.
+        """
+        self.options = list(options)
+        self.text = text
+        self.keys = []
+        self.stale = False
+
+    def send_keys(self, value):
+        self.keys.append(value)
+
+    def is_enabled(self):
+        if self.stale:
+            raise StaleElementReferenceException('element is not attached to the page document')
+        return True
+
+
+class FakeDriver:
+    """
+    Веб-драйвер без браузера: запоминает выполненные команды. Элементы страницы задаются словарем идентификатор ->
+    FakeElement или список FakeElement, поле выбора с идентификатором select создается из списка текстов вариантов.
+    """
+
+    def __init__(self, url=None, options=()):
+        """
+        :param url: Адрес узла, на котором открыта сессия.
+        :param options: Тексты вариантов поля выбора с идентификатором select.
+        """
+        self.url = url
+        self.elements = {'select': FakeElement(options)}
+        self.location = 'about:blank'
+        self.commands = []
+        self.selected = None
+        self.stale = False
+        self.quit_count = 0
+
+    def execute(self, driver_command, params=None):
+        self.commands.append(driver_command)
+        return {'value': None}
+
+    def find_elements(self, by, value):
+        self.commands.append('find_elements')
+        elements = self.elements.get(value, [])
+        return list(elements) if isinstance(elements, list) else [elements]
+
+    def execute_script(self, script, *args):
+        self.commands.append('execute_script')
+        if script == SELECT_OPTIONS_SCRIPT:
+            return [' '.join(text.split()) for text in args[0].options]
+        if script == SELECT_OPTION_SCRIPT:
+            if self.stale:
+                self.stale = False
+                raise StaleElementReferenceException('element is not attached to the page document')
+            element, position, text = args
+            if position >= len(element.options) or ' '.join(element.options[position].split()) != text:
+                return False
+            self.selected = position
+            return True
+        return None
+
+    def delete_all_cookies(self):
+        self.commands.append('delete_all_cookies')
+
+    def get(self, url):
+        self.commands.append('get')
+        self.location = url
+
+    @property
+    def current_url(self):
+        self.commands.append('current_url')
+        return self.location
+
+    def get_screenshot_as_png(self):
+        return b'png'
+
+    @property
+    def page_source(self):
+        self.commands.append('page_source')
+        return '<html><body>Страница</body></html>'
+
+    def quit(self):
+        self.quit_count += 1
+
+
+class FakeItem:
+    """
+    Тест pytest с маркером requires или без него.
+    """
+
+    def __init__(self, name, *args, **kwargs):
+        """
+        :param name: Название теста.
+        :param args: Аргументы маркера requires или ничего, если маркера нет.
+        :param kwargs: Именованные аргументы маркера requires.
+        """
+        self.name = name
+        self.marker = pytest.mark.requires(*args, **kwargs).mark if args or kwargs else None
+
+    def get_closest_marker(self, name):
+        return self.marker if name == 'requires' else None
+
+
+def test_page_snapshots_are_lazy():
+    """
+    Тестирование команд веб-драйвера в четырех шагах создания записи: переход на страницу выполняется один раз,
+    текущая ссылка запрашивается один раз, а содержимое страницы - только при чтении снимка.
+    """
+    driver = FakeDriver()
+    driver.elements = {'select_service': FakeElement(['Осмотр']), 'select_doctors': FakeElement(['Иванов И. И.']),
+                       'appointment_date': FakeElement(), 'select_time': FakeElement(['8:00', '9:00'])}
+
+    new_appointment_select_service(driver, 'Осмотр')
+    new_appointment_select_doctors(driver, 'Иванов И. И.')
+    new_appointment_select_date(driver, '01.01.2030')
+    snapshot = new_appointment_select_time(driver, '9:00')
+
+    # По одному current_url и get, затем поиск поля, тексты вариантов и выбор для каждого поля выбора и поиск поля
+    # даты - вместо current_url и page_source на каждом шаге.
+    assert driver.commands.count('current_url') == 1 and driver.commands.count('get') == 1
+    assert 'page_source' not in driver.commands
+    assert len(driver.commands) == 12
+    assert driver.elements['appointment_date'].keys == ['01.01.2030'] and driver.selected == 1
+
+    assert 'Страница' in snapshot and snapshot.count('Страница') == 1 and str(snapshot)[:6] == '<html>'
+    assert driver.commands.count('page_source') == 1
+
+
+def test_wait_conditions():
+    """
+    Тестирование условий ожидания: смена ссылки, появление текста, стабильное количество строк и их объединение.
+    """
+    driver = FakeDriver()
+    driver.location = '/login'
+    driver.elements = {'body': FakeElement(text='Вход'), 'tr': [FakeElement(), FakeElement()]}
+
+    assert not url_changed('/login')(driver)
+    driver.location = '/index'
+    assert url_changed('/login')(driver) == '/index'
+
+    assert not text_present((By.TAG_NAME, 'body'), 'Выход')(driver)
+    driver.elements['body'].text = 'Главная Выход'
+    assert text_present((By.TAG_NAME, 'body'), 'Выход')(driver) is driver.elements['body']
+
+    stable = row_count_stable((By.TAG_NAME, 'tr'))
+    assert not stable(driver)
+    driver.elements['tr'].append(FakeElement())
+    assert not stable(driver)
+    assert stable(driver)
+
+    assert (url_changed('/index') | text_present((By.TAG_NAME, 'body'), 'Выход'))(driver) is driver.elements['body']
+    assert (url_changed('/login') & text_present((By.TAG_NAME, 'body'), 'Вход'))(driver) is False
+
+
+def test_wait_for():
+    """
+    Тестирование ожидания: результат условия, журнал ожиданий, исключение по истечении времени и однократная проверка
+    отсутствующего элемента.
+    """
+    driver = FakeDriver()
+    driver.elements = {'tr': [FakeElement(), FakeElement()]}
+
+    assert wait_for(driver, row_count_stable((By.TAG_NAME, 'tr')), poll=0) is True
+    assert WAIT_LOG[-1].name == 'row_count_stable(tag name=tr)' and WAIT_LOG[-1].success
+
+    with pytest.raises(TimeoutException):
+        wait_for(driver, url_changed(driver.location), 0.01, poll=0)
+    assert WAIT_LOG[-1] == WaitRecord('url_changed(about:blank)', WAIT_LOG[-1].seconds, False)
+
+    driver.commands.clear()
+    assert find_optional_element(driver, By.ID, 'missing') is None
+    assert driver.commands == ['find_elements']
+
+
+def test_submit_element_page_change():
+    """
+    Тестирование отправки формы: новая ссылка запоминается после перенаправления, а при отправке на ту же ссылку
+    страница считается смененной по удалению элемента, и ссылка становится неизвестной.
+    """
+    driver = FakeDriver()
+    navigate(driver, '/login')
+    form = FakeElement()
+    form.submit = lambda: setattr(driver, 'location', '/index')
+
+    submit_element(driver, form)
+    assert driver_state(driver).url == '/index'
+
+    form = FakeElement()
+    form.submit = lambda: setattr(form, 'stale', True)
+
+    submit_element(driver, form)
+    assert driver_state(driver).url is None
+
+
+def test_session_check():
+    """
+    Тестирование проверки авторизации по видимому тексту страницы без запроса ее содержимого.
+    """
+    driver = FakeDriver()
+    driver.elements = {'body': FakeElement(text='Вход')}
+    assert not is_session_active(driver)
+
+    driver.elements['body'].text = 'Главная Выход'
+    assert is_session_active(driver)
+    assert 'page_source' not in driver.commands
+
+
+def test_parsed_table_rows():
+    """
+    Тестирование разбора таблицы: строки без заголовка, индекс столбца, количество материала и поиск строки по тексту
+    и дате.
+    """
+    table = ParsedTable(ORDERS_PAGE)
+
+    assert table.row_count == 3
+    assert table.row(0) == tuple(ORDERS_ROWS[0])
+    assert table.row(2)[2] == 'Бинты & вата'
+    assert table.index(1) == {'Иванов И. И.': (0, 2), 'Петров П. П.': (1,)}
+    assert table.rows_containing(1, 'Иванов') == (0, 2)
+    assert table.amount(2, 3, 'Иглы') == 10
+    assert table.amount(2, 3, 'Перчатки') == 0
+    assert table.amount(2, 3, 'Шприцы') == 0
+    assert [table.date(4, row) for row in range(3)] == [NOW, None, NOW - timedelta(days=1)]
+    assert table.find({1: 'Иванов', 2: 'Иглы'}, 4, NOW + timedelta(minutes=2))
+    assert not table.find({1: 'Иванов', 2: 'Иглы'}, 4, NOW + timedelta(minutes=10))
+    assert not table.find({1: 'Петров'}, 4, NOW)
+    assert not table.find({1: 'Сидоров'}, 4, NOW)
+
+
+def test_parse_table_cache():
+    """
+    Тестирование кэша разобранных таблиц: страница с тем же содержимым не разбирается повторно.
+    """
+    table = parse_table(ORDERS_PAGE)
+
+    assert parse_table(''.join(ORDERS_PAGE)) is table
+    assert parse_table(MATERIALS_PAGE) is not table
+
+
+@pytest.mark.parametrize('author, date_order, material_name, count, found', [
+    ('Иванов', NOW, 'Иглы', 10, True),
+    ('Иванов', NOW, 'Иглы', 1, True),
+    ('Иванов', NOW, 'Иглы', 2, False),
+    ('Петров', NOW, 'Перчатки', 1, False),
+    ('Иванов', NOW - timedelta(days=1), 'Бинты & вата', 5, True),
+    ('Иванов', NOW, 'Бинты', 5, False),
+])
+def test_find_order_capture_modes(author, date_order, material_name, count, found):
+    """
+    Тестирование поиска заказа по разобранной таблице и по результату компактного получения: результаты совпадают.
+    :param author: Автор заказа.
+    :param date_order: Дата заказа.
+    :param material_name: Название материала.
+    :param count: Количество материала.
+    :param found: Ожидаемый результат.
+    """
+    assert find_order(ORDERS_PAGE, author, date_order, material_name, count) is found
+    assert find_order(capture_page(ORDERS_PAGE, OrderRecord), author, date_order, material_name, count) is found
+
+
+def test_find_medical_history_capture_modes():
+    """
+    Тестирование поиска записи медицинской истории в строках с недостающими ячейками в обоих режимах получения.
+    """
+    html_text = table_html(('Автор', 'Пациент', 'Дата', 'Запись'),
+                           [['Иванов И. И.', 'Сидоров С. С.'],
+                            ['Иванов И. И.', 'Сидоров С. С.', NOW.strftime(DATE_TIME_FORMAT), 'Осмотр']])
+
+    for page in (html_text, capture_page(html_text, MedicalHistoryRecord)):
+        assert find_medical_history(page, 'Иванов', 'Сидоров', 'Осмотр', NOW)
+        assert not find_medical_history(page, 'Иванов', 'Сидоров', '', NOW - timedelta(hours=1))
+
+
+def test_capture_page_records():
+    """
+    Тестирование компактного получения страницы: текст вне таблиц и скриптов, разобранные строки и отбор строк.
+    """
+    page = capture_page(ORDERS_PAGE, OrderRecord, chunk_size=16)
+
+    assert page.text == ''
+    assert page.rows == (OrderRecord(1, 'Иванов И. И.', 'Иглы', 10, NOW),
+                         OrderRecord(2, 'Петров П. П.', 'Перчатки', None, None),
+                         OrderRecord(3, 'Иванов И. И.', 'Бинты & вата', 5, NOW - timedelta(days=1)))
+
+    page = capture_page(MATERIALS_PAGE, MaterialRecord, predicate=lambda record: record.amount > 10)
+    assert page.rows == (MaterialRecord(2, 'Перчатки', 30),)
+    assert 'Учет расходов' in page and 'Добавить' in page and 'Иглы' not in page
+
+    page = capture_page(MATERIALS_PAGE)
+    assert page.rows == () and page.count('Иглы') == 1
+
+
+def test_record_from_cells():
+    """
+    Тестирование разбора строки таблицы: пробелы вокруг текста, недостающие и неразборчивые ячейки.
+    """
+    record = MedicalHistoryRecord.from_cells((' Иванов И. И. ', 'Сидоров С. С.', ' 01.01.2030 08:00 '))
+
+    assert tuple(record) == ('Иванов И. И.', 'Сидоров С. С.', NOW, '')
+    assert MaterialRecord.from_cells(('x', 'Иглы', '')) == MaterialRecord(None, 'Иглы', None)
+    assert record != MedicalHistoryRecord('Иванов И. И.', 'Сидоров С. С.', NOW, 'Осмотр')
+    assert not hasattr(record, '__dict__')
+
+
+def test_snapshot_store_round_trip(tmp_path):
+    """
+    Тестирование хранилища снимков: страница хранится один раз, а результаты помощников восстанавливаются после
+    записи в JSON.
+    :param tmp_path: Временный каталог.
+    """
+    store = SnapshotStore(str(tmp_path))
+    digest = store.put(ORDERS_PAGE)
+    assert store.put(ORDERS_PAGE) == digest
+    assert len(list((tmp_path / OBJECTS_DIR).rglob('*.html.gz'))) == 1
+
+    compact = capture_page(ORDERS_PAGE, OrderRecord)
+    value = {'page': ORDERS_PAGE, 'compact': compact, 'date': NOW, 'count': 10, 'missing': None}
+    decoded = store.decode(json.loads(json.dumps(store.encode(value))))
+
+    assert decoded['page'] == ORDERS_PAGE
+    assert isinstance(decoded['compact'], CompactPage)
+    assert decoded['compact'].text == compact.text and decoded['compact'].rows == compact.rows
+    assert decoded['date'] == NOW and decoded['count'] == 10 and decoded['missing'] is None
+    assert len(list((tmp_path / OBJECTS_DIR).rglob('*.html.gz'))) == 1
+
+
+def test_snapshot_store_manifest(tmp_path):
+    """
+    Тестирование манифестов хранилища снимков нескольких процессов pytest-xdist.
+    :param tmp_path: Временный каталог.
+    """
+    store = SnapshotStore(str(tmp_path))
+    store.write_manifest({'a': [1]})
+    store.write_manifest({'b': [2]}, suffix='gw1')
+
+    assert store.read_manifest() == {'a': [1], 'b': [2]}
+
+
+@pytest.mark.parametrize('restored', [True, False])
+def test_snapshots_replay_appointment(tmp_path, monkeypatch, restored):
+    """
+    Тестирование записи и воспроизведения теста создания записи на прием: при воспроизведении тест выполняет те же
+    шаги, что и при записи, с восстановлением состояния и без него.
+    :param tmp_path: Временный каталог.
+    :param monkeypatch: Подмена атрибутов.
+    :param restored: Восстанавливалось ли состояние веб-сервиса при записи.
+    """
+    name = 'dentistry_test.py::test_new_appointment_good_data'
+    appointment_date = (NOW.date() + timedelta(days=dentistry_test.APPOINTMENT_DAYS_AHEAD +
+                                               dentistry_test.WORKER_INDEX)).strftime('%d.%m.%Y')
+    created_page = ' '.join((dentistry_test.SERVICE_INSPECTION, dentistry_test.DOCTORS_SERVICE_INSPECTIONS[0],
+                             appointment_date, dentistry_test.TIME_TEST_APPOINTMENT_GOOD,
+                             dentistry_test.CANCEL_APPOINTMENT_TEXT))
+    results = {'current_time': NOW, 'new_appointment_submit': created_page}
+
+    def run(session, state):
+        monkeypatch.setattr(dentistry_selenium, 'HELPER_HOOKS', [])
+        install(session)
+        if not session.replay:
+            # Помощники без браузера: результаты записываются вместо страниц веб-сервиса.
+            dentistry_selenium.HELPER_HOOKS.append(lambda helper_name, call: results.get(helper_name, ''))
+        session.start_test(name, state is not None)
+        dentistry_test.test_new_appointment_good_data(None, state)
+        steps = session.steps
+        session.finish_test()
+        return steps
+
+    recording = SnapshotSession(SnapshotStore(str(tmp_path)))
+    steps = run(recording, object() if restored else None)
+    recording.save()
+    helpers = [step['helper'] for step in steps]
+    assert ('cancel_appointment' in helpers) is not restored
+
+    replay = SnapshotSession(SnapshotStore(str(tmp_path)), replay=True)
+    state = replay.replayed_state(name)
+    assert state is (REPLAYED_STATE if restored else None)
+    assert run(replay, state) == []
+
+
+def test_driver_pool_reuses_drivers():
+    """
+    Тестирование пула веб-драйверов: повторная выдача без перезапуска, сброс, метки и замена упавшего веб-драйвера.
+    """
+    drivers = []
+    pool = DriverPool(factory=lambda: drivers.append(FakeDriver()) or drivers[-1], size=2, max_uses=3,
+                      timeout=0.1).start()
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert len(drivers) == 2
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+    pool.release(first, tag='patient')
+    pool.release(second)
+    assert 'delete_all_cookies' in second.commands
+    assert pool.acquire('patient') is first
+
+    replaced = pool.replace(first)
+    assert replaced is not first and first.quit_count == 1 and len(drivers) == 3
+
+    pool.close()
+    assert all(driver.quit_count == 1 for driver in drivers)
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+def test_driver_pool_max_uses():
+    """
+    Тестирование перезапуска веб-драйвера, израсходовавшего лимит выдач, и свободного места после неудачного запуска.
+    """
+    spawns = []
+
+    def factory():
+        spawns.append(None)
+        if len(spawns) == 2:
+            raise WebDriverException('session not created')
+        return FakeDriver()
+
+    pool = DriverPool(factory=factory, size=1, max_uses=1, timeout=0.1).start()
+    driver = pool.acquire()
+    with pytest.raises(WebDriverException):
+        pool.release(driver)
+    assert driver.quit_count == 1 and pool.vacant == 1
+
+    assert pool.acquire() is not driver
+    assert len(spawns) == 3 and pool.vacant == 0
+
+
+@pytest.fixture
+def node_health(monkeypatch):
+    """
+    Доступность узлов WebDriver без запросов /status.
+    :param monkeypatch: Подмена атрибутов.
+    :return: Словарь адрес узла -> доступен ли узел, по умолчанию доступен.
+    """
+    health = {}
+
+    def check(node, timeout=None):
+        node.healthy = health.get(node.url, True)
+        node.check_latency = 0.0
+        node.checked = dentistry_nodes.time.monotonic()
+        return node.healthy
+
+    monkeypatch.setattr(RemoteNode, 'check', check)
+    return health
+
+
+def test_node_pool_spreads_sessions(node_health):
+    """
+    Тестирование пула узлов: сессии распределяются по узлам, возвращаются с меткой и заменяются на другом узле, а
+    повторный возврат закрытой сессии пропускается.
+    :param node_health: Доступность узлов.
+    """
+    pool = NodePool([('http://a', 1), ('http://b', 1)], factory=FakeDriver).start()
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.url, second.url} == {'http://a', 'http://b'}
+
+    pool.release(first, tag='doctor')
+    pool.release(second)
+    assert pool.acquire('doctor') is first
+
+    node_health[first.url] = False
+    replaced = pool.replace(first, 'doctor')
+    assert replaced.url == second.url and first.quit_count == 1
+    assert pool.stats()['nodes'][first.url]['lost'] == 1
+
+    # Повторный возврат уже закрытой сессии пропускается.
+    tests = pool.stats()['nodes'][first.url]['tests']
+    pool.release(first)
+    assert first.quit_count == 1 and pool.stats()['nodes'][first.url]['tests'] == tests
+
+    pool.close()
+    assert second.quit_count == 1
+
+
+def test_node_pool_acquire_timeout(node_health, monkeypatch):
+    """
+    Тестирование ожидания узла, который не открывает сессии: ожидание ограничено, причина ошибки сохраняется.
+    :param node_health: Доступность узлов.
+    :param monkeypatch: Подмена атрибутов.
+    """
+    monkeypatch.setattr(dentistry_nodes, 'NODE_WAIT_TIMEOUT', 0.2)
+    spawns = []
+
+    def factory(url):
+        spawns.append(url)
+        raise WebDriverException('session not created')
+
+    pool = NodePool([('http://a', 1)], factory=factory).start()
+    with pytest.raises(RuntimeError) as error:
+        pool.acquire()
+
+    assert isinstance(error.value.__cause__, WebDriverException)
+    assert len(spawns) == dentistry_nodes.NODE_SPAWN_FAILURES
+
+
+def test_node_pool_worker_shares():
+    """
+    Тестирование деления сессий узлов между процессами pytest-xdist.
+    """
+    nodes = [('http://a', 3), ('http://b', 1)]
+    shares = [[node.capacity for node in NodePool(nodes, offset=worker, workers=2).nodes] for worker in range(2)]
+
+    assert shares == [[2, 0], [1, 1]]
+    with pytest.raises(ValueError):
+        NodePool([('http://a', 1)], offset=1, workers=2)
+
+
+def test_select_index():
+    """
+    Тестирование индекса вариантов поля выбора: один запрос текстов, поиск в памяти и перестроение устаревшего индекса.
+    """
+    driver = FakeDriver(options=['Пациент {}  01.01.2030 08:00 Осмотр'.format(number) for number in range(100)])
+
+    assert select_containing(driver, 'select', 'Пациент 42', 'Осмотр') and driver.selected == 42
+    select_by_visible_text(driver, 'select', 'Пациент 7 01.01.2030 08:00 Осмотр')
+    assert driver.selected == 7
+    assert driver.commands.count('find_elements') == 1
+    assert driver.commands.count('execute_script') == 3
+
+    # Скрипт страницы заменил варианты поля.
+    driver.elements['select'].options = ['Терапевт', 'Хирург']
+    select_by_visible_text(driver, 'select', 'Хирург')
+    assert driver.selected == 1
+    assert select_index(driver, 'select').texts == ['Терапевт', 'Хирург']
+
+    driver.stale = True
+    select_by_visible_text(driver, 'select', 'Терапевт')
+    assert driver.selected == 0 and driver.commands.count('find_elements') == 2
+    assert not select_containing(driver, 'select', 'Ортодонт')
+    assert 'select' in driver_state(driver).elements
+
+
+@pytest.mark.parametrize('required, logins, restores, navigations', [
+    ([('patient', 'A'), ('patient', 'B'), (ANONYMOUS_ROLE, 'C'), ('patient', 'A')], 1, 2, 10),
+    ([(ANONYMOUS_ROLE, 'C'), (None, None)], 0, 0, 1),
+])
+def test_estimate(required, logins, restores, navigations):
+    """
+    Тестирование оценки входов и переходов без сохранения сессии между тестами.
+    :param required: Роль и начальная страница тестов.
+    :param logins: Ожидаемое количество входов через форму.
+    :param restores: Ожидаемое количество восстановлений сессии.
+    :param navigations: Ожидаемое количество переходов.
+    """
+    assert estimate([Requirements(role, page, False) for role, page in required], warm=False) == \
+        (logins, restores, navigations)
+
+
+def test_schedule():
+    """
+    Тестирование упорядочивания тестов: роли и страницы по первому появлению, изменяющие тесты страницы - последними.
+    Отчет планировщика не нужен тестам без входа и начальной страницы.
+    """
+    items = [FakeItem('register', ANONYMOUS_ROLE, 'REGISTRATION_LINK', mutates=True),
+             FakeItem('appointment', 'patient', 'NEW_APPOINTMENT_LINK', mutates=True),
+             FakeItem('login', ANONYMOUS_ROLE, 'LOGIN_LINK'),
+             FakeItem('unknown'),
+             FakeItem('appointment_wrong', 'patient', 'NEW_APPOINTMENT_LINK'),
+             FakeItem('register_wrong', ANONYMOUS_ROLE, 'REGISTRATION_LINK')]
+    scheduled = schedule(items)
+
+    assert [item.name for item in scheduled] == ['register_wrong', 'register', 'login', 'appointment_wrong',
+                                                 'appointment', 'unknown']
+    assert estimate([Requirements('patient', 'NEW_APPOINTMENT_LINK', False)] * 2, warm=True) == (1, 0, 4)
+
+    assert ScheduleReport(items, scheduled).relevant
+    unit_items = [FakeItem('parse', None, None), FakeItem('pool', None, None)]
+    assert not ScheduleReport(unit_items, schedule(unit_items)).relevant
+
+
+def test_command_trace_dump(tmp_path):
+    """
+    Тестирование архива трассировки: команды с помощником, снимок экрана и DOM последнего веб-драйвера.
+    :param tmp_path: Временный каталог.
+    """
+    driver = FakeDriver()
+    trace = CommandTrace(size=2)
+    trace.enabled = True
+    for command in ('get', 'findElement', 'getTitle'):
+        trace.hook('login', lambda: trace.record(weakref.ref(driver), command, {'url': 'http://a/login'},
+                                                 trace.started, 0.001, 'x' * 1000, None))
+
+    path = trace.dump(str(tmp_path / 'trace' / 'test.zip'), 'test_login', 'AssertionError')
+    with zipfile.ZipFile(path) as archive:
+        trace_json = json.loads(archive.read('trace.json'))
+        assert archive.read('screenshot.png') == b'png'
+        assert 'Страница' in archive.read('dom.html').decode('utf-8')
+
+    assert trace_json['test'] == 'test_login' and trace_json['failure'] == 'AssertionError'
+    assert [command['command'] for command in trace_json['commands']] == ['findElement', 'getTitle']
+    assert all(command['helper'] == 'login' and command['target'] == 'http://a/login'
+               for command in trace_json['commands'])
+    assert len(trace_json['commands'][0]['result']) < 1000
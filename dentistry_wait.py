@@ -0,0 +1,246 @@
+from collections import deque, namedtuple
+import time
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException, \
+    WebDriverException
+
+# region Константы
+WAIT_TIMEOUT = 10
+"""Время ожидания условия по умолчанию в секундах."""
+
+POLL_FREQUENCY = 0.05
+"""Интервал проверки условия в секундах."""
+
+WAIT_LOG_SIZE = 1000
+"""Количество хранимых записей об ожиданиях."""
+
+NEGATIVE_WAIT_TIMEOUT = 0
+"""Время ожидания в проверках, для которых отсутствие элемента - ожидаемый результат, в секундах: страница уже
+загружена, и отсутствующий элемент на ней не появится, поэтому условие проверяется один раз."""
+
+ROW_COUNT_STABLE_POLLS = 2
+"""Количество проверок подряд с одинаковым количеством строк, после которого таблица считается заполненной."""
+
+IGNORED_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+"""Исключения, при которых условие считается еще не выполненным."""
+# endregion
+
+WaitRecord = namedtuple('WaitRecord', ['name', 'seconds', 'success'])
+"""Запись об ожидании: название условия, время блокировки в секундах, выполнилось ли условие."""
+
+# region Журнал ожиданий
+WAIT_LOG = deque(maxlen=WAIT_LOG_SIZE)
+"""Журнал последних ожиданий."""
+# endregion
+
+
+class Condition:
+    """
+    Условие ожидания: функция от веб-драйвера, возвращающая результат или ложное значение, пока условие не выполнено.
+    Условия объединяются операторами & и |.
+    """
+
+    def __init__(self, name, check):
+        """
+        :param name: Название условия для журнала ожиданий.
+        :param check: Функция проверки условия.
+        """
+        self.name = name
+        self.check = check
+
+    def __call__(self, driver):
+        return self.check(driver)
+
+    def __and__(self, other):
+        return all_of(self, other)
+
+    def __or__(self, other):
+        return any_of(self, other)
+
+    def __repr__(self):
+        return 'Condition({})'.format(self.name)
+
+
+def all_of(*conditions):
+    """
+    Условие, выполняющееся, когда выполнены все условия.
+    :param conditions: Условия.
+    :return: Условие, результат которого - список результатов условий.
+    """
+    def check(driver):
+        results = []
+        for condition in conditions:
+            result = condition(driver)
+            if not result:
+                return False
+            results.append(result)
+        return results
+
+    return Condition(' & '.join(condition.name for condition in conditions), check)
+
+
+def any_of(*conditions):
+    """
+    Условие, выполняющееся, когда выполнено хотя бы одно из условий.
+    :param conditions: Условия.
+    :return: Условие, результат которого - результат первого выполненного условия.
+    """
+    def check(driver):
+        for condition in conditions:
+            result = condition(driver)
+            if result:
+                return result
+        return False
+
+    return Condition(' | '.join(condition.name for condition in conditions), check)
+
+
+def element_present(by, value):
+    """
+    Условие наличия элемента в DOM.
+    :param by: Способ поиска элемента.
+    :param value: Значение для поиска.
+    :return: Условие, результат которого - первый найденный элемент.
+    """
+    def check(driver):
+        elements = driver.find_elements(by, value)
+        return elements[0] if elements else False
+
+    return Condition('element_present({}={})'.format(by, value), check)
+
+
+def url_changed(previous):
+    """
+    Условие смены текущей ссылки, например, после отправки формы с перенаправлением.
+    :param previous: Ссылка до действия.
+    :return: Условие, результат которого - новая ссылка.
+    """
+    def check(driver):
+        url = driver.current_url
+        return url if url != previous else False
+
+    return Condition('url_changed({})'.format(previous), check)
+
+
+def text_present(locator, text):
+    """
+    Условие появления текста в элементе страницы.
+    :param locator: Пара способ поиска, значение для поиска элемента.
+    :param text: Текст.
+    :return: Условие, результат которого - первый найденный элемент, видимый текст которого содержит текст.
+    """
+    def check(driver):
+        return next((element for element in driver.find_elements(*locator) if text in element.text), False)
+
+    return Condition('text_present({}={}, {})'.format(locator[0], locator[1], text), check)
+
+
+def row_count_stable(locator, polls=ROW_COUNT_STABLE_POLLS):
+    """
+    Условие заполнения таблицы: количество найденных элементов (например, строк таблицы) не меняется несколько
+    проверок подряд. Условие хранит результаты прежних проверок, поэтому для каждого ожидания создается заново.
+    :param locator: Пара способ поиска, значение для поиска элементов.
+    :param polls: Количество проверок подряд с одинаковым количеством элементов.
+    :return: Условие, результат которого - True (количество элементов может быть нулевым).
+    """
+    counts = deque(maxlen=polls)
+
+    def check(driver):
+        counts.append(len(driver.find_elements(*locator)))
+        return len(counts) == polls and len(set(counts)) == 1
+
+    return Condition('row_count_stable({}={})'.format(*locator), check)
+
+
+def staleness_of(element):
+    """
+    Условие удаления элемента из DOM, например, после перехода на другую страницу.
+    :param element: Элемент.
+    :return: Условие.
+    """
+    def check(driver):
+        try:
+            element.is_enabled()
+        except StaleElementReferenceException:
+            return True
+        return False
+
+    return Condition('staleness_of', check)
+
+
+def wait_for(driver, condition, timeout=WAIT_TIMEOUT, poll=POLL_FREQUENCY, raise_on_timeout=True):
+    """
+    Ожидает выполнения условия, проверяя его с заданным интервалом. Время блокировки записывается в журнал ожиданий.
+    :param driver: Веб-драйвер или элемент, относительно которого проверяется условие.
+    :param condition: Условие.
+    :param timeout: Время ожидания в секундах.
+    :param poll: Интервал проверки в секундах.
+    :param raise_on_timeout: Вызывать ли TimeoutException, если условие не выполнилось.
+    :return: Результат условия или False, если условие не выполнилось.
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+
+    while True:
+        try:
+            result = condition(driver)
+        except IGNORED_EXCEPTIONS:
+            result = False
+
+        if result or time.perf_counter() >= deadline:
+            break
+        time.sleep(poll)
+
+    WAIT_LOG.append(WaitRecord(getattr(condition, 'name', repr(condition)), time.perf_counter() - start, bool(result)))
+
+    if not result and raise_on_timeout:
+        raise TimeoutException('Условие {} не выполнилось за {} с'.format(getattr(condition, 'name', condition),
+                                                                         timeout))
+    return result
+
+
+def find_element(driver, by, value, timeout=WAIT_TIMEOUT):
+    """
+    Находит элемент, ожидая его появления не дольше указанного времени.
+    :param driver: Веб-драйвер или элемент, внутри которого выполняется поиск.
+    :param by: Способ поиска элемента.
+    :param value: Значение для поиска.
+    :param timeout: Время ожидания в секундах.
+    :return: Элемент.
+    """
+    try:
+        return wait_for(driver, element_present(by, value), timeout)
+    except TimeoutException as error:
+        raise NoSuchElementException('Элемент {}={} не найден'.format(by, value)) from error
+
+
+def find_optional_element(driver, by, value, timeout=NEGATIVE_WAIT_TIMEOUT):
+    """
+    Находит элемент, который может отсутствовать на странице. По умолчанию условие проверяется один раз, поэтому
+    отсутствие элемента не стоит времени ожидания.
+    :param driver: Веб-драйвер или элемент, внутри которого выполняется поиск.
+    :param by: Способ поиска элемента.
+    :param value: Значение для поиска.
+    :param timeout: Время ожидания в секундах.
+    :return: Элемент или None, если элемент не найден.
+    """
+    return wait_for(driver, element_present(by, value), timeout, raise_on_timeout=False) or None
+
+
+def wait_page_changed(driver, element, previous_url=None, timeout=WAIT_TIMEOUT):
+    """
+    Ожидает ухода со страницы, на которой находился элемент: смены текущей ссылки, если прежняя ссылка известна, или
+    удаления элемента из DOM (при отправке формы на ту же ссылку). Не вызывает исключение, если страница не
+    сменилась, например, если отправка формы была отменена.
+    :param driver: Веб-драйвер.
+    :param element: Элемент прежней страницы.
+    :param previous_url: Ссылка прежней страницы или None, если она неизвестна.
+    :param timeout: Время ожидания в секундах.
+    :return: Новая ссылка, если страница сменилась со сменой ссылки, True, если сменилась без нее или новая ссылка
+    не проверялась, иначе False.
+    """
+    condition = staleness_of(element) if previous_url is None else url_changed(previous_url) | staleness_of(element)
+    try:
+        return wait_for(driver, condition, timeout, raise_on_timeout=False)
+    except WebDriverException:
+        return False